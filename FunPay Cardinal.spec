@@ -9,7 +9,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['PIL', 'vk_api', 'aiohttp'],
+    hiddenimports=['PIL', 'vk_api', 'aiohttp', 'lxml', 'selectolax'],
     hookspath=['hooks'],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,5 +1,8 @@
 from . import utils
 from .types import *
+from .limiter import *
+from .transport import *
+from . import parser
 from .account import *
 from .runner import *
 from .users import *
@@ -1,5 +1,3 @@
-from bs4 import BeautifulSoup
-import requests
 import json
 import time
 import logging
@@ -7,6 +5,8 @@ import logging
 from . import types
 from . import exceptions
 from . import utils
+from . import parser
+from .transport import Transport
 
 
 logger = logging.getLogger("FunPayAPI.account")
@@ -15,9 +15,12 @@ logger = logging.getLogger("FunPayAPI.account")
 class Account:
     """
     Класс для работы с аккаунтом FunPay.
+
+    Каждый метод, отправляющий запрос, разбит на сборку запроса (_*_request / _*_headers), отправку и разбор
+    ответа (_parse_*), чтобы асинхронный FunPayAPI.aio.AsyncAccount использовал те же самые заголовки и парсеры.
     """
     def __init__(self, golden_key: str, user_agent: str = "", timeout: float | int = 10.0,
-                 proxy: dict | None = None):
+                 proxy: dict | None = None, transport: Transport | None = None):
         """
         :param golden_key: токен аккаунта.
 
@@ -26,6 +29,9 @@ class Account:
         :param timeout: тайм-аут ожидания ответа на запросы.
 
         :param proxy: HTTP/S прокси.
+
+        :param transport: HTTP транспорт (пул соединений). Если не передан - создается новый с параметрами
+        timeout и proxy.
         """
         self.golden_key: str = golden_key
         self.user_agent = user_agent
@@ -45,7 +51,10 @@ class Account:
         self.last_update: int | None = None
 
         self.saved_html_chats: str | None = None
+        self.chats_directory: dict[str, int] = {}  # {никнейм собеседника: node_id чата}
+        self.chats_directory_version = 0  # Увеличивается при каждом изменении chats_directory.
         self.proxy = proxy if proxy is not None else {}
+        self.transport = transport if transport is not None else Transport(timeout, self.proxy)
 
     def get(self, update_session_id: bool = False):
         """
@@ -53,60 +62,58 @@ class Account:
 
         :param update_session_id: обновить self.session_id или использовать старый.
         """
+        headers = self._account_headers(update_session_id)
+        response = self.transport.get(types.Links.BASE_URL, "account", headers=headers)
+        logger.debug(f"Статус-код получения данных об аккаунте: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+
+        self._parse_account_page(response.content.decode(), response.cookies.get_dict(), update_session_id)
+        return self
+
+    def _account_headers(self, update_session_id: bool) -> dict:
         headers = {
             "cookie": f"golden_key={self.golden_key}",
             "user-agent": self.user_agent
         }
         if self.session_id and not update_session_id:
             headers["cookie"] += f"; PHPSESSID={self.session_id}"
+        return headers
 
-        response = requests.get(types.Links.BASE_URL, headers=headers, timeout=self.timeout,
-                                proxies=self.proxy)
-        logger.debug(f"Статус-код получения данных об аккаунте: {response.status_code}.")
-        if response.status_code != 200:
-            raise exceptions.StatusCodeIsNot200(response.status_code)
-
-        html_response = response.content.decode()
-        # logger.debug(f"HTML аккаунта: {html_response}")
-        soup = BeautifulSoup(html_response, "html.parser")
-
-        username = soup.find("div", {"class": "user-link-name"})
-        if username is None:
-            raise exceptions.AccountDataNotfound()
+    def _parse_account_page(self, html_response: str, cookies: dict, update_session_id: bool) -> None:
+        """
+        Парсит главную страницу FunPay и обновляет данные аккаунта.
 
-        username = username.text
-        app_data = json.loads(soup.find("body")["data-app-data"])
-        userid = app_data["userId"]
-        csrf_token = app_data["csrf-token"]
+        :param html_response: HTML главной страницы.
 
-        active_orders = soup.find("span", {"class": "badge badge-trade"})
-        active_orders = int(active_orders.text) if active_orders else 0
+        :param cookies: cookies ответа.
 
-        balance_badge = soup.find("span", {"class": "badge badge-balance"})
-        balance = float(balance_badge.text.split(" ")[0]) if balance_badge else 0
-        currency = balance_badge.text.split(" ")[1] if balance_badge else ""
+        :param update_session_id: обновить self.session_id или использовать старый.
+        """
+        # logger.debug(f"HTML аккаунта: {html_response}")
+        data = parser.parse_account_page(html_response)
 
-        cookies = response.cookies.get_dict()
         if (update_session_id and self.session_id) or not self.session_id:
             session_id = cookies["PHPSESSID"]
             self.session_id = session_id
 
         self.html = html_response
-        self.app_data = app_data
-        self.id = userid
-        self.username = username
-        self.balance = balance
-        self.currency = currency
-        self.active_orders = active_orders
-        self.csrf_token = csrf_token
+        self.app_data = data["app_data"]
+        self.id = data["app_data"]["userId"]
+        self.username = data["username"]
+        self.balance = data["balance"]
+        self.currency = data["currency"]
+        self.active_orders = data["active_orders"]
+        self.csrf_token = data["app_data"]["csrf-token"]
         self.last_update = int(time.time())
         self.__authorized = True
-        return self
 
     def get_orders(self, include_outstanding: bool = True,
                    include_completed: bool = False,
                    include_refund: bool = False,
-                   exclude: list[str] | None = None) -> list[types.Order]:
+                   exclude: list[str] | None = None,
+                   stop_at: str | None = None,
+                   include_html: bool = False) -> list[types.Order]:
         """
         Получает список ордеров на аккаунте.
 
@@ -118,66 +125,84 @@ class Account:
 
         :param exclude: список ID заказов, которые нужно исключить из итогового списка.
 
+        :param stop_at: ID заказа, на котором нужно остановить парсинг (заказы на странице идут от новых к старым,
+        поэтому в список попадут только заказы новее stop_at).
+
+        :param include_html: сохранять ли HTML код заказов в Order.html.
+
         :return: Список с заказами.
         """
+        return self._parse_orders(self.get_orders_html(), include_outstanding, include_completed,
+                                  include_refund, exclude, stop_at, include_html)
+
+    def get_orders_html(self) -> str:
+        """
+        Получает HTML страницы заказов.
+
+        :return: HTML страницы заказов.
+        """
         if not self.is_authorized():
             raise exceptions.NotAuthorized()
 
-        exclude = [] if not exclude else exclude
-        headers = {"cookie": f"golden_key={self.golden_key}; PHPSESSID={self.session_id};",
-                   "user-agent": self.user_agent}
-
-        response = requests.get(types.Links.ORDERS, headers=headers, timeout=self.timeout,
-                                proxies=self.proxy)
+        response = self.transport.get(types.Links.ORDERS, "orders", headers=self._orders_headers())
         logger.debug(f"Статус-код получения ордеров: {response.status_code}.")
         if response.status_code != 200:
             raise exceptions.StatusCodeIsNot200(response.status_code)
+        return response.content.decode()
+
+    def get_orders_page(self, state: str | None = None,
+                        continue_token: str | None = None) -> tuple[list[types.Order], str | None]:
+        """
+        Получает одну страницу истории заказов.
+
+        :param state: фильтр по статусу заказов ("paid", "closed", "refunded" или None - все заказы).
+
+        :param continue_token: токен страницы (из предыдущей страницы). Если не передан - получает первую страницу.
+
+        :return: (заказы страницы, токен следующей страницы или None, если страница последняя).
+        """
+        if not self.is_authorized():
+            raise exceptions.NotAuthorized()
+
+        method, kwargs = self._orders_page_request(state, continue_token)
+        response = self.transport.request(method, types.Links.ORDERS, "orders", **kwargs)
+        logger.debug(f"Статус-код получения страницы заказов: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return parser.parse_orders_page(response.content.decode())
+
+    def _orders_page_request(self, state: str | None, continue_token: str | None) -> tuple[str, dict]:
+        """
+        Собирает запрос на получение страницы истории заказов.
+
+        :return: (HTTP метод, аргументы запроса).
+        """
+        filters = {"id": "", "buyer": "", "state": state or "", "game": ""}
+        headers = self._orders_headers()
+        if continue_token is None:
+            return "get", {"headers": headers, "params": filters}
+
+        headers.update({"accept": "*/*",
+                        "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+                        "x-requested-with": "XMLHttpRequest"})
+        return "post", {"headers": headers, "data": {"continue": continue_token, **filters}}
+
+    def _orders_headers(self) -> dict:
+        return {"cookie": f"golden_key={self.golden_key}; PHPSESSID={self.session_id};",
+                "user-agent": self.user_agent}
+
+    @staticmethod
+    def _parse_orders(html_response: str, include_outstanding: bool, include_completed: bool,
+                      include_refund: bool, exclude: list[str] | None, stop_at: str | None = None,
+                      include_html: bool = False) -> list[types.Order]:
+        """
+        Парсит страницу заказов (аргументы аналогичны Account.get_orders).
 
-        html_response = response.content.decode()
+        :return: Список с заказами.
+        """
         # logger.debug(f"Ответ от FunPay (информация об ордерах): {html_response}")
-        soup = BeautifulSoup(html_response, "html.parser")
-
-        check_user = soup.find("div", {"class": "user-link-name"})
-        if check_user is None:
-            raise exceptions.AccountDataNotfound()
-
-        order_divs = soup.find_all("a", {"class": "tc-item"})
-        if order_divs is None:
-            return []
-        orders_list = []
-
-        for div in order_divs:
-            classname = div.get("class")
-            if "warning" in classname:
-                if not include_refund:
-                    continue
-                status = types.OrderStatuses.REFUND
-            elif "info" in classname:
-                if not include_outstanding:
-                    continue
-                status = types.OrderStatuses.OUTSTANDING
-            else:
-                if not include_completed:
-                    continue
-                status = types.OrderStatuses.COMPLETED
-
-            order_id = div.find("div", {"class": "tc-order"}).text
-            if order_id in exclude:
-                continue
-
-            title = div.find("div", {"class": "order-desc"}).find("div").text
-            price = float(div.find("div", {"class": "tc-price"}).text.split(" ")[0])
-
-            buyer_div = div.find("div", {"class": "media-user-name"}).find("span")
-            buyer_username = buyer_div.text
-            buyer_id = int(buyer_div.get("data-href")[:-1].split("https://funpay.com/users/")[1])
-
-            order = types.Order(html=str(div), id_=order_id, title=title, price=price, buyer_username=buyer_username,
-                                buyer_id=buyer_id, status=status)
-            orders_list.append(order)
-        orders_log = "".join(f"{i.id} | {i.price} | {i.buyer_username} | {i.status} | {i.title}" for i in orders_list)
-        logger.debug(f"Список полученных заказов: {orders_log}")
-        return orders_list
+        return parser.parse_orders(html_response, include_outstanding, include_completed, include_refund, exclude,
+                                   stop_at, include_html)
 
     def send_message(self, message_obj: types.Message) -> dict:
         """
@@ -187,6 +212,22 @@ class Account:
 
         :return: ответ FunPay.
         """
+        headers, payload = self._message_request(message_obj)
+        response = self.transport.post(types.Links.RUNNER, "message", headers=headers, data=payload)
+        logger.debug(f"Статус-код отправления сообщения: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+
+        return self._parse_message_response(response.json())
+
+    def _message_request(self, message_obj: types.Message) -> tuple[dict, dict]:
+        """
+        Собирает заголовки и тело запроса на отправку сообщения.
+
+        :param message_obj: экземпляр класса, описывающий сообщение.
+
+        :return: (заголовки, тело запроса).
+        """
         headers = {
             "accept": "*/*",
             "cookie": f"golden_key={self.golden_key}; PHPSESSID={self.session_id}",
@@ -196,14 +237,7 @@ class Account:
             "referer": f"https://funpay.com/chat/?node={message_obj.node_id}",
             "origin": f"https://funpay.com"
         }
-        request = {
-            "action": "chat_message",
-            "data": {
-                "node": message_obj.node_id,
-                "last_message": -1,
-                "content": message_obj.text
-            }
-        }
+        request = self._message_action(message_obj)
         objects = [
             {"type": "chat_node",
              "id": message_obj.node_id,
@@ -219,13 +253,35 @@ class Account:
             "request": json.dumps(request),
             "csrf_token": self.csrf_token
         }
-        response = requests.post(types.Links.RUNNER, headers=headers, data=payload, timeout=self.timeout,
-                                 proxies=self.proxy)
-        logger.debug(f"Статус-код отправления сообщения: {response.status_code}.")
-        if response.status_code != 200:
-            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return headers, payload
 
-        json_response = response.json()
+    @staticmethod
+    def _message_action(message_obj: types.Message) -> dict:
+        """
+        Собирает действие отправки сообщения (поле request запроса к runner'у).
+
+        :param message_obj: экземпляр класса, описывающий сообщение.
+
+        :return: действие отправки сообщения.
+        """
+        return {
+            "action": "chat_message",
+            "data": {
+                "node": message_obj.node_id,
+                "last_message": -1,
+                "content": message_obj.text
+            }
+        }
+
+    @staticmethod
+    def _parse_message_response(json_response: dict) -> dict:
+        """
+        Проверяет ответ FunPay на запрос отправки сообщения.
+
+        :param json_response: ответ FunPay.
+
+        :return: ответ FunPay.
+        """
         logger.debug(f"Ответ от FunPay (отправление сообщения): {json_response}")
         if json_response.get("response"):
             if json_response.get("response").get("error") is not None:
@@ -236,22 +292,57 @@ class Account:
 
     def get_node_id_by_username(self, username: str, force_request: bool = False) -> int | None:
         """
-        Парсит self.chats_html и ищет node_id чата по username'у.
-        todo: Если self.chats_html is None -> делает запрос к FunPay.
+        Ищет node_id чата по username'у в справочнике чатов (self.chats_directory).
 
         :param username: никнейм пользователя (искомого чата).
 
-        :param force_request: todo: пропустить ли поиск в self.chats_html и отправить ли сразу запрос к FunPay.
+        :param force_request: если чата нет в справочнике - получить список чатов с FunPay и дополнить справочник.
 
-        :return: node_id чата или None, если чат не найден.
+        :return: node_id чата или None, если чат не найден (или не удалось получить список чатов).
         """
-        if not force_request and self.saved_html_chats is not None:
-            parser = BeautifulSoup(self.saved_html_chats, "html.parser")
-            user_box = parser.find("div", {"class": "media-user-name"}, text=username)
-            if user_box is not None:
-                node_id = user_box.parent["data-id"]
-                return int(node_id)
-        return None
+        node_id = self.chats_directory.get(username)
+        if node_id is None and force_request:
+            try:
+                self.update_chats_directory(self.get_chats())
+            except Exception as e:
+                logger.error(f"Не удалось получить список чатов: {e}")
+                logger.debug("------TRACEBACK------", exc_info=True)
+            node_id = self.chats_directory.get(username)
+        return node_id
+
+    def get_chats(self) -> list[tuple[int, str, str, bool]]:
+        """
+        Получает список чатов со страницы чатов FunPay.
+
+        :return: [(node_id, никнейм собеседника, текст последнего сообщения, есть ли непрочитанные сообщения)]
+        """
+        if not self.is_authorized():
+            raise exceptions.NotAuthorized()
+
+        headers = {
+            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "cookie": f"golden_key={self.golden_key}; PHPSESSID={self.session_id}",
+            "user-agent": self.user_agent
+        }
+        response = self.transport.get(types.Links.CHAT, "chat", headers=headers)
+        logger.debug(f"Статус-код получения списка чатов: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return parser.parse_chat_bookmarks(response.content.decode())
+
+    def update_chats_directory(self, chats: list[tuple[int, str, str, bool]]) -> None:
+        """
+        Дополняет справочник чатов.
+
+        :param chats: список чатов (как в parser.parse_chat_bookmarks).
+        """
+        changed = False
+        for node_id, username, *_ in chats:
+            if self.chats_directory.get(username) != node_id:
+                self.chats_directory[username] = node_id
+                changed = True
+        if changed:
+            self.chats_directory_version += 1
 
     def get_category_game_id(self, category: types.Category) -> int:
         """
@@ -261,34 +352,37 @@ class Account:
 
         :return: ID игры, к которой относится категория.
         """
-        if category.type == types.CategoryTypes.LOT:
-            link = f"{types.Links.BASE_URL}/lots/{category.id}/trade"
-        else:
-            link = f"{types.Links.BASE_URL}/chips/{category.id}/trade"
-
         headers = {"cookie": f"golden_key={self.golden_key}",
                    "user-agent": self.user_agent}
-        response = requests.get(link, headers=headers, timeout=self.timeout,
-                                proxies=self.proxy)
+        response = self.transport.get(self._category_link(category), "category", headers=headers)
         logger.debug(f"Статус-код получения ордеров: {response.status_code}.")
         if response.status_code == 404:
             raise Exception("Категория не найдена.")  # todo: создать кастомное исключение: категория не найдена.
         if response.status_code != 200:
             raise exceptions.StatusCodeIsNot200(response.status_code)
 
-        html_response = response.content.decode()
-        # logger.debug(f"Ответ от FunPay (запрос game_id категории): {html_response}")
-        parser = BeautifulSoup(html_response, "html.parser")
-
-        if parser.find("div", {"class": "user-link-name"}) is None:
-            raise exceptions.AccountDataNotfound()
+        return self._parse_category_game_id(response.content.decode(), category)
 
+    @staticmethod
+    def _category_link(category: types.Category) -> str:
         if category.type == types.CategoryTypes.LOT:
-            game_id = int(parser.find("div", {"class": "col-sm-6"}).find("button")["data-game"])
+            return f"{types.Links.BASE_URL}/lots/{category.id}/trade"
         else:
-            game_id = int(parser.find("input", {"name": "game"})["value"])
+            return f"{types.Links.BASE_URL}/chips/{category.id}/trade"
+
+    @staticmethod
+    def _parse_category_game_id(html_response: str, category: types.Category) -> int:
+        """
+        Парсит страницу редактирования лотов категории и достает из нее ID игры.
 
-        return game_id
+        :param html_response: HTML страницы.
+
+        :param category: экземпляр класса Category.
+
+        :return: ID игры, к которой относится категория.
+        """
+        # logger.debug(f"Ответ от FunPay (запрос game_id категории): {html_response}")
+        return parser.parse_category_game_id(html_response, category.type)
 
     def get_lot_info(self, lot_id: int, game_id: int) -> dict[str, str]:
         """
@@ -300,6 +394,19 @@ class Account:
 
         :return: словарь {"название поля": "значение поля"}.
         """
+        url, headers, payload = self._lot_info_request(lot_id, game_id)
+        response = self.transport.get(url, "lot", headers=headers, data=payload)
+        logger.debug(f"Статус-код получения данных о лоте: {response.status_code}")
+        if not response.status_code == 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_lot_info(response.json())
+
+    def _lot_info_request(self, lot_id: int, game_id: int) -> tuple[str, dict, dict]:
+        """
+        Собирает запрос на получение полей лота.
+
+        :return: (ссылка, заголовки, тело запроса).
+        """
         headers = {
             "accept": "*/*",
             "content-type": "application/json",
@@ -314,41 +421,19 @@ class Account:
             "node": game_id
         }
         query = f"?tag={tag}&offer={lot_id}&node={game_id}"
+        return f"{types.Links.BASE_URL}/lots/offerEdit{query}", headers, payload
 
-        response = requests.get(f"{types.Links.BASE_URL}/lots/offerEdit{query}", headers=headers, data=payload,
-                                proxies=self.proxy)
-        logger.debug(f"Статус-код получения данных о лоте: {response.status_code}")
-        if not response.status_code == 200:
-            raise exceptions.StatusCodeIsNot200(response.status_code)
-        json_response = response.json()
+    @staticmethod
+    def _parse_lot_info(json_response: dict) -> dict[str, str]:
+        """
+        Парсит форму редактирования лота.
+
+        :param json_response: ответ FunPay.
+
+        :return: словарь {"название поля": "значение поля"}.
+        """
         # logger.debug(f"Ответ от FunPay (получение данных о лоте): {json_response}")
-        parser = BeautifulSoup(json_response["html"], "html.parser")
-
-        input_fields = parser.find_all("input")
-        text_fields = parser.find_all("textarea")
-        selection_fields = parser.find_all("select")
-        result = {}
-
-        for field in input_fields:
-            name = field["name"]
-            value = field.get("value")
-            if value is None:
-                value = ""
-            result[name] = value
-
-        for field in text_fields:
-            name = field["name"]
-            value = field.text
-            if not value:
-                value = ""
-            result[name] = value
-
-        for field in selection_fields:
-            name = field["name"]
-            value = field.find("option", selected=True)["value"]
-            result[name] = value
-
-        return result
+        return parser.parse_lot_info(json_response["html"])
 
     def save_lot(self, lot_info: dict[str, str], active: bool = True) -> dict:
         """
@@ -360,6 +445,21 @@ class Account:
 
         :return: ответ FunPay.
         """
+        headers = self._save_lot_request(lot_info, active)
+        response = self.transport.post(f"{types.Links.BASE_URL}/lots/offerSave", "lot",
+                                       headers=headers, data=lot_info)
+        logger.debug(f"Статус-код изменения состояния лота: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+
+        return self._parse_save_lot_response(response.json())
+
+    def _save_lot_request(self, lot_info: dict[str, str], active: bool) -> dict:
+        """
+        Подготавливает поля лота к сохранению (изменяет lot_info).
+
+        :return: заголовки запроса.
+        """
         lot_info["location"] = "trade"
         if active:
             lot_info["active"] = "on"
@@ -367,20 +467,16 @@ class Account:
             if lot_info.get("active") is not None:
                 lot_info.pop("active")
 
-        headers = {
+        return {
             "accept": "*/*",
             "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
             "x-requested-with": "XMLHttpRequest",
             "cookie": f"golden_key={self.golden_key}; PHPSESSID={self.session_id}",
             "user-agent": self.user_agent
         }
-        response = requests.post(f"{types.Links.BASE_URL}/lots/offerSave", headers=headers, data=lot_info,
-                                 proxies=self.proxy)
-        logger.debug(f"Статус-код изменения состояния лота: {response.status_code}.")
-        if response.status_code != 200:
-            raise exceptions.StatusCodeIsNot200(response.status_code)
 
-        json_response = response.json()
+    @staticmethod
+    def _parse_save_lot_response(json_response: dict) -> dict:
         # logger.debug(f"Ответ от FunPay (сохранение лота): {json_response}")
         if json_response.get("error"):
             raise exceptions.LotNotUpdated(json_response)
@@ -397,20 +493,12 @@ class Account:
 
         :return: ответ FunPay.
         """
-        headers = {
-            "accept": "*/*",
-            "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "cookie": f"locale=ru; golden_key={self.golden_key}",
-            "x-requested-with": "XMLHttpRequest",
-            "user-agent": self.user_agent
-        }
         payload = {
             "game_id": category.game_id,
             "node_id": category.id
         }
 
-        response = requests.post(types.Links.RAISE, headers=headers, data=payload, timeout=self.timeout,
-                                 proxies=self.proxy)
+        response = self.transport.post(types.Links.RAISE, "raise", headers=self._raise_headers(), data=payload)
         logger.debug(f"Статус-код получения данных для поднятия лотов: {response.status_code}.")
         if response.status_code != 200:
             raise exceptions.StatusCodeIsNot200(response.status_code)
@@ -418,6 +506,15 @@ class Account:
         logger.debug(f"Ответ от FunPay (запрос modal-формы поднятия лотов): {json_response}")
         return json_response
 
+    def _raise_headers(self) -> dict:
+        return {
+            "accept": "*/*",
+            "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+            "cookie": f"locale=ru; golden_key={self.golden_key}",
+            "x-requested-with": "XMLHttpRequest",
+            "user-agent": self.user_agent
+        }
+
     def raise_game_categories(self, category: types.Category, exclude: list[int] | None = None) -> types.RaiseResponse:
         """
         Поднимает лоты всех категорий игры category.game_id.
@@ -429,7 +526,26 @@ class Account:
 
         :return: ответ FunPay.
         """
-        check = self.request_lots_raise(category)
+        check = self._parse_raise_check(self.request_lots_raise(category), category, exclude)
+        if isinstance(check, types.RaiseResponse):
+            return check
+
+        category_names, payload = check
+        response = self.transport.post(types.Links.RAISE, "raise", headers=self._raise_headers(), data=payload)
+        logger.debug(f"Статус-код поднятия лотов: {response.status_code}.")
+        if not response.status_code == 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_raise_response(response.json(), category_names, payload["node_ids[]"])
+
+    @staticmethod
+    def _parse_raise_check(check: dict, category: types.Category,
+                           exclude: list[int] | None) -> types.RaiseResponse | tuple[list[str], dict]:
+        """
+        Разбирает ответ FunPay на запрос modal-формы поднятия лотов.
+
+        :return: итоговый ответ (если второй запрос не нужен) или
+        (названия поднимаемых категорий, тело запроса на поднятие).
+        """
         if check.get("error") and check.get("msg") and "Подождите" in check.get("msg"):
             wait_time = utils.get_wait_time_from_raise_response(check.get("msg"))
             return types.RaiseResponse(False, wait_time, [], [], check)
@@ -443,40 +559,24 @@ class Account:
             # Если же появилась модалка,
             # то парсим все чекбоксы и отправляем запрос на поднятие всех категорий, кроме тех,
             # которые в exclude.
-            parser = BeautifulSoup(check.get("modal"), "html.parser")
-            category_ids = []
-            category_names = []
-            checkboxes = parser.find_all("div", {"class": "checkbox"})
-            for cb in checkboxes:
-                category_id = int(cb.find("input")["value"])
-                if exclude is None or category_id not in exclude:
-                    category_ids.append(category_id)
-                    category_name = cb.find("label").text
-                    category_names.append(category_name)
-
-            headers = {
-                "accept": "*/*",
-                "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
-                "cookie": f"locale=ru; golden_key={self.golden_key}",
-                "x-requested-with": "XMLHttpRequest",
-                "user-agent": self.user_agent
-            }
+            category_ids, category_names = parser.parse_raise_modal(check.get("modal"), exclude)
+
             payload = {
                 "game_id": category.game_id,
                 "node_id": category.id,
                 "node_ids[]": category_ids
             }
-            response = requests.post(types.Links.RAISE, headers=headers, data=payload, timeout=self.timeout,
-                                     proxies=self.proxy)
-            logger.debug(f"Статус-код поднятия лотов: {response.status_code}.")
-            if not response.status_code == 200:
-                raise exceptions.StatusCodeIsNot200(response.status_code)
-            json_response = response.json()
-            logger.debug(f"Ответ FunPay (поднятие категорий): {json_response}.")
-            if not json_response.get("error"):
-                return types.RaiseResponse(True, 3600, category_names, category_ids, json_response)
-            else:
-                return types.RaiseResponse(False, 10, [], [], json_response)
+            return category_names, payload
+        return types.RaiseResponse(False, 10, [], [], check)
+
+    @staticmethod
+    def _parse_raise_response(json_response: dict, category_names: list[str],
+                              category_ids: list[int]) -> types.RaiseResponse:
+        logger.debug(f"Ответ FunPay (поднятие категорий): {json_response}.")
+        if not json_response.get("error"):
+            return types.RaiseResponse(True, 3600, category_names, category_ids, json_response)
+        else:
+            return types.RaiseResponse(False, 10, [], [], json_response)
 
     def refund_order(self, order_id: str) -> None:
         """
@@ -484,7 +584,11 @@ class Account:
 
         :param order_id: ID заказа.
         """
+        headers, payload = self._refund_request(order_id)
+        response = self.transport.post(types.Links.REFUND, "refund", headers=headers, data=payload)
+        self._parse_refund_response(response.status_code, response.json())
 
+    def _refund_request(self, order_id: str) -> tuple[dict, dict]:
         headers = {
             "accept": "*/*",
             "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
@@ -497,13 +601,15 @@ class Account:
             "id": order_id,
             "csrf_token": self.csrf_token
         }
-        response = requests.post(types.Links.REFUND, headers=headers, data=payload, timeout=self.timeout,
-                                 proxies=self.proxy)
-        if response.json().get("error"):
-            logger.debug(response.json().get("msg"))
-            raise Exception(response.json().get("msg"))
-        if not response.status_code == 200:
-            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return headers, payload
+
+    @staticmethod
+    def _parse_refund_response(status_code: int, json_response: dict) -> None:
+        if json_response.get("error"):
+            logger.debug(json_response.get("msg"))
+            raise Exception(json_response.get("msg"))
+        if not status_code == 200:
+            raise exceptions.StatusCodeIsNot200(status_code)
 
     def get_user(self, user_id: int, include_currency: bool = False) -> types.UserInfo:
         """
@@ -515,13 +621,7 @@ class Account:
 
         :return: экземпляр класса с информацией о пользователе.
         """
-        headers = {
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-            "cookie": f"golden_key={self.golden_key}; PHPSESSID={self.session_id}",
-            "user-agent": self.user_agent
-        }
-        response = requests.get(f"{types.Links.USER}/{user_id}/",
-                                headers=headers, proxies=self.proxy, timeout=self.timeout)
+        response = self.transport.get(f"{types.Links.USER}/{user_id}/", "user", headers=self._user_headers())
 
         logger.debug(f"Статус-код получения страницы пользователя {user_id}: {response.status_code}.")
 
@@ -531,56 +631,39 @@ class Account:
         if response.status_code != 200:
             raise exceptions.StatusCodeIsNot200(response.status_code)
 
-        html_response = response.content.decode()
+        return self._parse_user(response.content.decode(), include_currency)
+
+    def _user_headers(self) -> dict:
+        return {
+            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+            "cookie": f"golden_key={self.golden_key}; PHPSESSID={self.session_id}",
+            "user-agent": self.user_agent
+        }
+
+    @staticmethod
+    def _parse_user(html_response: str, include_currency: bool) -> types.UserInfo:
+        """
+        Парсит страницу пользователя.
+
+        :param html_response: HTML страницы пользователя.
+
+        :param include_currency: включать ли в список категории / лоты, относящиеся к игровой валюте.
+
+        :return: экземпляр класса с информацией о пользователе.
+        """
         logger.debug(html_response)
-        parser = BeautifulSoup(html_response, "html.parser")
-        categories = []
-        lots = []
-
-        # Если категорий не найдено - возвращаем пустые списки
-        category_divs = parser.find_all("div", {"class": "offer-list-title-container"})
-        if category_divs is None:
-            return types.UserInfo([], [])
-
-        # Парсим категории
-        for div in category_divs:
-            info_div = div.find("div", {"class": "offer-list-title"})
-            category_link = info_div.find("a")
-            public_link = category_link["href"]
-            if "chips" in public_link:
-                # 'chips' в ссылке означает, что данная категория - игровая валюта.
-                # Например: https://funpay.com/chips/125/ - Серебро Black Desert Mobile.
-                if not include_currency:
-                    continue
-                category_type = types.CategoryTypes.CURRENCY
-            else:
-                category_type = types.CategoryTypes.LOT
-
-            edit_lots_link = public_link + "trade"
-            title = category_link.text
-            category_id = int(public_link.split("/")[-2])
-            category_object = types.Category(id_=category_id, game_id=None, title=title, edit_lots_link=edit_lots_link,
-                                             public_link=public_link, type_=category_type)
-            categories.append(category_object)
-
-            # Парсим лоты внутри текущей категории
-            lot_divs = div.parent.find_all("a", {"class": "tc-item"})
-            for lot_div in lot_divs:
-                lot_id = int(lot_div["href"].split("id=")[1])
-                lot_title = lot_div.find("div", {"class": "tc-desc-text"}).text
-                price = lot_div.find("div", {"class": "tc-price"})["data-s"]
-
-                lot_obj = types.Lot(category_id, None, lot_id, lot_title, price)
-                lots.append(lot_obj)
-        return types.UserInfo(lots, categories)
+        return parser.parse_user(html_response, include_currency)
 
     def is_authorized(self):
         return self.__authorized
 
-    def update_chats(self, chats_html: str):
+    def update_chats(self, chats_html: str, chats: list[tuple[int, str, str, bool]] | None = None):
         """
-        Обновляет сохраненный HTML чатов (для get_node_id_by_username)
+        Обновляет сохраненный HTML чатов и справочник чатов (для get_node_id_by_username).
 
         :param chats_html: HTML чатов.
+
+        :param chats: уже распарсенный список чатов (если не передан - HTML парсится заново).
         """
         self.saved_html_chats = chats_html
+        self.update_chats_directory(chats if chats is not None else parser.parse_chat_bookmarks(chats_html))
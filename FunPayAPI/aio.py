@@ -0,0 +1,589 @@
+"""
+В данном модуле написаны асинхронные (asyncio + aiohttp) версии классов Account и Runner, а также синхронный фасад,
+позволяющий использовать асинхронный аккаунт из обычного (синхронного) кода, например, из плагинов.
+
+Асинхронные классы используют те же заголовки, парсеры и типы, что и синхронные.
+"""
+
+from __future__ import annotations
+from typing import AsyncIterator, Generator, Any
+import threading
+import inspect
+import asyncio
+import logging
+import json
+import time
+
+import aiohttp
+
+from . import types
+from . import exceptions
+from . import parser
+from . import retry
+from .account import Account
+from .runner import Runner, AdaptiveDelay
+from .transport import Transport, get_retry_after
+
+
+logger = logging.getLogger("FunPayAPI.aio")
+
+
+class Response:
+    """
+    Класс, хранящий прочитанный ответ aiohttp (с интерфейсом, похожим на requests.Response).
+    """
+    def __init__(self, status_code: int, content: bytes, cookies: dict[str, str]):
+        """
+        :param status_code: статус-код ответа.
+
+        :param content: тело ответа.
+
+        :param cookies: cookies ответа.
+        """
+        self.status_code = status_code
+        self.content = content
+        self.cookies = cookies
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class AsyncAccount(Account):
+    """
+    Асинхронный класс для работы с аккаунтом FunPay. Методы, отправляющие запросы, являются корутинами,
+    остальные методы и поля аналогичны Account.
+    """
+    def __init__(self, golden_key: str, user_agent: str = "", timeout: float | int = 10.0,
+                 proxy: dict | None = None, transport: Transport | None = None, limit: int = 16):
+        """
+        :param golden_key: токен аккаунта.
+
+        :param user_agent: user-agent браузера, с которого был произведен вход в аккаунт.
+
+        :param timeout: тайм-аут ожидания ответа на запросы.
+
+        :param proxy: HTTP/S прокси.
+
+        :param transport: HTTP транспорт, из которого берутся тайм-ауты отдельных типов запросов.
+
+        :param limit: максимальное кол-во одновременно открытых соединений.
+        """
+        super(AsyncAccount, self).__init__(golden_key, user_agent, timeout, proxy, transport)
+        self.limit = limit
+        self.aio_session: aiohttp.ClientSession | None = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.aio_session is None or self.aio_session.closed:
+            # Куки передаются вручную в заголовках, поэтому cookie jar не нужен.
+            self.aio_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit),
+                                                     cookie_jar=aiohttp.DummyCookieJar())
+        return self.aio_session
+
+    async def request(self, method: str, url: str, endpoint: str | None = None, **kwargs) -> Response:
+        """
+        Отправляет запрос через общий пул соединений aiohttp.
+
+        :param method: HTTP метод.
+
+        :param url: ссылка.
+
+        :param endpoint: тип запроса (для выбора тайм-аута и лимита).
+
+        :param kwargs: аргументы для aiohttp.ClientSession.request (headers, data и т.д.), а также priority -
+        приоритет запроса (аналогично Transport.request).
+
+        :return: прочитанный ответ.
+        """
+        session = await self._get_session()
+        timeout = kwargs.pop("timeout", None) or self.transport.get_timeout(endpoint)
+        priority = kwargs.pop("priority", None)
+        proxy = self.proxy.get("https") or self.proxy.get("http")
+        breaker = self.transport.get_breaker(endpoint)
+        breaker.before_request()
+        try:
+            # Ограничитель частоты запросов общий с синхронным транспортом, поэтому ждем его в отдельном потоке.
+            await asyncio.get_running_loop().run_in_executor(None, self.transport.limiter.acquire, endpoint, priority)
+            async with session.request(method, url, timeout=aiohttp.ClientTimeout(total=timeout), proxy=proxy,
+                                       **kwargs) as response:
+                content = await response.read()
+                cookies = {name: morsel.value for name, morsel in response.cookies.items()}
+        except BaseException:
+            # В том числе asyncio.CancelledError: иначе пробный запрос полуоткрытого предохранителя так и останется
+            # "выполняющимся", и запросы этого типа больше не будут отправляться.
+            breaker.record_failure()
+            raise
+        if response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        self.transport.limiter.feedback(endpoint, response.status, get_retry_after(response.headers))
+        return Response(response.status, content, cookies)
+
+    async def close(self) -> None:
+        """
+        Закрывает сессию aiohttp.
+        """
+        if self.aio_session is not None and not self.aio_session.closed:
+            await self.aio_session.close()
+
+    async def get(self, update_session_id: bool = False):
+        """
+        Получает / обновляет данные об аккаунте.
+
+        :param update_session_id: обновить self.session_id или использовать старый.
+        """
+        response = await self.request("get", types.Links.BASE_URL, "account",
+                                      headers=self._account_headers(update_session_id))
+        logger.debug(f"Статус-код получения данных об аккаунте: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+
+        self._parse_account_page(response.content.decode(), response.cookies, update_session_id)
+        return self
+
+    async def get_orders(self, include_outstanding: bool = True,
+                         include_completed: bool = False,
+                         include_refund: bool = False,
+                         exclude: list[str] | None = None,
+                         stop_at: str | None = None,
+                         include_html: bool = False) -> list[types.Order]:
+        """
+        Получает список ордеров на аккаунте. Аргументы аналогичны Account.get_orders.
+        """
+        return self._parse_orders(await self.get_orders_html(), include_outstanding, include_completed,
+                                  include_refund, exclude, stop_at, include_html)
+
+    async def get_orders_html(self) -> str:
+        """
+        Получает HTML страницы заказов.
+        """
+        if not self.is_authorized():
+            raise exceptions.NotAuthorized()
+
+        response = await self.request("get", types.Links.ORDERS, "orders", headers=self._orders_headers())
+        logger.debug(f"Статус-код получения ордеров: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return response.content.decode()
+
+    async def get_orders_page(self, state: str | None = None,
+                              continue_token: str | None = None) -> tuple[list[types.Order], str | None]:
+        """
+        Получает одну страницу истории заказов. Аргументы аналогичны Account.get_orders_page.
+        """
+        if not self.is_authorized():
+            raise exceptions.NotAuthorized()
+
+        method, kwargs = self._orders_page_request(state, continue_token)
+        response = await self.request(method, types.Links.ORDERS, "orders", **kwargs)
+        logger.debug(f"Статус-код получения страницы заказов: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return parser.parse_orders_page(response.content.decode())
+
+    async def send_message(self, message_obj: types.Message) -> dict:
+        """
+        Отправляет сообщение.
+
+        :param message_obj: экземпляр класса, описывающий сообщение.
+
+        :return: ответ FunPay.
+        """
+        headers, payload = self._message_request(message_obj)
+        response = await self.request("post", types.Links.RUNNER, "message", headers=headers, data=payload)
+        logger.debug(f"Статус-код отправления сообщения: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_message_response(response.json())
+
+    async def get_category_game_id(self, category: types.Category) -> int:
+        """
+        Получает ID игры, к которой относится категория.
+
+        :param category: экземпляр класса Category.
+
+        :return: ID игры, к которой относится категория.
+        """
+        headers = {"cookie": f"golden_key={self.golden_key}",
+                   "user-agent": self.user_agent}
+        response = await self.request("get", self._category_link(category), "category", headers=headers)
+        logger.debug(f"Статус-код получения ордеров: {response.status_code}.")
+        if response.status_code == 404:
+            raise Exception("Категория не найдена.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_category_game_id(response.content.decode(), category)
+
+    async def get_lot_info(self, lot_id: int, game_id: int) -> dict[str, str]:
+        """
+        Получает значения всех полей лота (в окне редактирования лота).
+
+        :param lot_id: ID лота.
+
+        :param game_id: ID игры, к которой относится лот.
+
+        :return: словарь {"название поля": "значение поля"}.
+        """
+        url, headers, payload = self._lot_info_request(lot_id, game_id)
+        response = await self.request("get", url, "lot", headers=headers, data=payload)
+        logger.debug(f"Статус-код получения данных о лоте: {response.status_code}")
+        if not response.status_code == 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_lot_info(response.json())
+
+    async def save_lot(self, lot_info: dict[str, str], active: bool = True) -> dict:
+        """
+        Сохраняет лот.
+
+        :param lot_info: информация о полях лота, получаемая с помощью метода get_lot_info().
+
+        :param active: сделать ли лот активным.
+
+        :return: ответ FunPay.
+        """
+        headers = self._save_lot_request(lot_info, active)
+        response = await self.request("post", f"{types.Links.BASE_URL}/lots/offerSave", "lot",
+                                      headers=headers, data=lot_info)
+        logger.debug(f"Статус-код изменения состояния лота: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_save_lot_response(response.json())
+
+    async def request_lots_raise(self, category: types.Category) -> dict:
+        """
+        Отправляет запрос на получение modal-формы для поднятия лотов категории category.id.
+
+        :param category: экземпляр класса, описывающий поднимаемую категорию.
+
+        :return: ответ FunPay.
+        """
+        payload = {
+            "game_id": category.game_id,
+            "node_id": category.id
+        }
+        response = await self.request("post", types.Links.RAISE, "raise", headers=self._raise_headers(),
+                                      data=payload)
+        logger.debug(f"Статус-код получения данных для поднятия лотов: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        json_response = response.json()
+        logger.debug(f"Ответ от FunPay (запрос modal-формы поднятия лотов): {json_response}")
+        return json_response
+
+    async def raise_game_categories(self, category: types.Category,
+                                    exclude: list[int] | None = None) -> types.RaiseResponse:
+        """
+        Поднимает лоты всех категорий игры category.game_id.
+
+        :param category: экземпляр класса, описывающий поднимаемую категорию.
+
+        :param exclude: список ID категорий, которые не нужно поднимать.
+
+        :return: ответ FunPay.
+        """
+        check = self._parse_raise_check(await self.request_lots_raise(category), category, exclude)
+        if isinstance(check, types.RaiseResponse):
+            return check
+
+        category_names, payload = check
+        response = await self.request("post", types.Links.RAISE, "raise", headers=self._raise_headers(),
+                                      data=payload)
+        logger.debug(f"Статус-код поднятия лотов: {response.status_code}.")
+        if not response.status_code == 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_raise_response(response.json(), category_names, payload["node_ids[]"])
+
+    async def refund_order(self, order_id: str) -> None:
+        """
+        Оформляет возврат средств за заказ.
+
+        :param order_id: ID заказа.
+        """
+        headers, payload = self._refund_request(order_id)
+        response = await self.request("post", types.Links.REFUND, "refund", headers=headers, data=payload)
+        self._parse_refund_response(response.status_code, response.json())
+
+    async def get_user(self, user_id: int, include_currency: bool = False) -> types.UserInfo:
+        """
+        Получает полную информацию о лотах и категориях пользователя.
+
+        :param user_id: ID пользователя.
+
+        :param include_currency: включать ли в список категории / лоты, относящиеся к игровой валюте.
+
+        :return: экземпляр класса с информацией о пользователе.
+        """
+        response = await self.request("get", f"{types.Links.USER}/{user_id}/", "user", headers=self._user_headers())
+        logger.debug(f"Статус-код получения страницы пользователя {user_id}: {response.status_code}.")
+        if response.status_code == 404:
+            raise Exception("Пользователь не найден.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return self._parse_user(response.content.decode(), include_currency)
+
+
+class AsyncRunner(Runner):
+    """
+    Асинхронный класс для получения новых событий с FunPay.
+    """
+    def __init__(self, account_instance: AsyncAccount, timeout: float | int = 10.0,
+                 incremental_orders: bool = True, orders_pipeline: bool = True,
+                 legacy_initial_events: bool = False):
+        """
+        :param account_instance: экземпляр асинхронного класса аккаунта.
+
+        :param timeout: тайм-аут ожидания ответа на запросы.
+
+        :param incremental_orders: аналогично Runner.
+
+        :param orders_pipeline: аналогично Runner (список заказов обновляется в отдельной задаче asyncio).
+
+        :param legacy_initial_events: аналогично Runner.
+        """
+        super(AsyncRunner, self).__init__(account_instance, timeout, incremental_orders, orders_pipeline=False,
+                                          legacy_initial_events=legacy_initial_events)
+        self.account: AsyncAccount = account_instance
+        self.orders_refresher: AsyncOrdersRefresher | None = AsyncOrdersRefresher(self) if orders_pipeline else None
+
+    async def get_updates(self) -> list[types.Event]:
+        """
+        Получает и парсит список событий FunPay.
+
+        :return: список событий.
+        """
+        if not self.account.is_authorized():
+            raise exceptions.NotAuthorized()
+
+        headers, payload = self._updates_request()
+        response = await self.account.request("post", types.Links.RUNNER, "runner", headers=headers, data=payload,
+                                              timeout=self.timeout)
+        logger.debug(f"Статус-код получения данных о событиях: {response.status_code}.")
+        if response.status_code != 200:
+            raise exceptions.StatusCodeIsNot200(response.status_code)
+
+        json_response = response.json()
+        logger.debug(f"Получены данные о событиях: {json_response}")
+
+        events = []
+        chat_messages = self._parse_chat_nodes(json_response["objects"])
+        for obj in json_response["objects"]:
+            if obj.get("type") == "chat_bookmarks":
+                events.extend(self._parse_chat_bookmarks(obj, chat_messages))
+
+            elif obj.get("type") == "orders_counters":
+                events.extend(self._parse_orders_counters(obj))
+                mode, seller_delta = self._orders_sync_mode(obj)
+                if mode == "skip":
+                    logger.debug("Изменился только счетчик покупок, пропускаю обновление списка ордеров.")
+                    continue
+                if self.orders_refresher is not None and not self.first_request:
+                    self.orders_refresher.submit(mode, seller_delta)
+                    continue
+                events.extend(await self.refresh_orders(mode, seller_delta))
+
+        if self.orders_refresher is not None:
+            events.extend(self.orders_refresher.get_events())
+        if self.first_request:
+            events = self._pack_initial_events(events)
+            self.first_request = False
+        return events
+
+    async def refresh_orders(self, mode: str, seller_delta: int) -> list[types.Event]:
+        """
+        Асинхронный аналог Runner.refresh_orders.
+        """
+        try:
+            orders_html = await self.orders_retry.call_async(
+                self.account.get_orders_html, on_retry=retry.log_retry("обновить список ордеров", logger))
+        except Exception as e:
+            logger.error(f"Не удалось обновить список ордеров: {e}")
+            logger.debug("------TRACEBACK------", exc_info=True)
+            return []
+        return self._parse_orders_list(self._parse_orders_page(orders_html, mode, seller_delta))
+
+    async def listen(self, delay: float | int = 6.0, ignore_exceptions: bool = True,
+                     adaptive_delay: AdaptiveDelay | None = None) -> AsyncIterator[types.Event]:
+        """
+        "Слушает" FunPay в ожидании новых событий. Аргументы аналогичны Runner.listen.
+        """
+        if not self.account.is_authorized():
+            raise exceptions.NotAuthorized()
+
+        orders_events = []
+        while True:
+            started = time.monotonic()
+            updates = []
+            try:
+                updates = await self.get_updates()
+                for event in updates:
+                    yield event
+            except Exception as e:
+                if not ignore_exceptions:
+                    raise e
+                else:
+                    logger.error("Произошла ошибка при получении событий "
+                                 "(ничего страшного, если это сообщение появляется нечасто).")
+                    logger.debug("------TRACEBACK------", exc_info=True)
+
+            loop = asyncio.get_running_loop()
+            sleep_until = loop.time() + self._get_sleep_time(delay, adaptive_delay, orders_events + updates, started)
+            orders_events = []
+            if self.orders_refresher is None:
+                await asyncio.sleep(max(0.0, sleep_until - loop.time()))
+                continue
+            while loop.time() < sleep_until:
+                events = await self.orders_refresher.wait_events(sleep_until - loop.time())
+                orders_events.extend(events)
+                for event in events:
+                    yield event
+
+
+class AsyncOrdersRefresher:
+    """
+    Асинхронный аналог OrdersRefresher: список заказов обновляется в отдельной задаче asyncio.
+    """
+    def __init__(self, runner: AsyncRunner):
+        """
+        :param runner: экземпляр асинхронного Runner'а.
+        """
+        self.runner = runner
+        self.pending: tuple[str, int] | None = None  # (режим, изменение кол-ва активных продаж)
+        self.events: list[types.Event] = []
+        self.task: asyncio.Task | None = None
+        self.wakeup: asyncio.Event | None = None
+        self.ready: asyncio.Event | None = None
+
+    def submit(self, mode: str, seller_delta: int) -> None:
+        """
+        Аналогично OrdersRefresher.submit. Должен вызываться из event loop'а.
+        """
+        if self.pending is not None:
+            pending_mode, pending_delta = self.pending
+            mode = "full" if "full" in (mode, pending_mode) else "incremental"
+            seller_delta += pending_delta
+            logger.debug("Обновление списка ордеров уже запланировано, объединяю изменения счетчиков.")
+        self.pending = (mode, seller_delta)
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.ready = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.loop())
+        self.wakeup.set()
+
+    async def loop(self) -> None:
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            if self.pending is None:
+                continue
+            mode, seller_delta = self.pending
+            self.pending = None
+            try:
+                events = await self.runner.refresh_orders(mode, seller_delta)
+            except Exception:
+                logger.error("Произошла ошибка при обновлении списка ордеров.")
+                logger.debug("------TRACEBACK------", exc_info=True)
+                continue
+            if events:
+                self.events.extend(events)
+                self.ready.set()
+
+    def get_events(self) -> list[types.Event]:
+        """
+        Забирает события заказов, полученные задачей.
+        """
+        events, self.events = self.events, []
+        if self.ready is not None:
+            self.ready.clear()
+        return events
+
+    async def wait_events(self, timeout: float) -> list[types.Event]:
+        """
+        Ждет событий заказов не дольше timeout секунд и забирает их.
+        """
+        if not self.events:
+            if self.ready is None:
+                await asyncio.sleep(timeout)
+            else:
+                try:
+                    await asyncio.wait_for(self.ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return self.get_events()
+
+
+class LoopThread:
+    """
+    Класс, запускающий event loop в отдельном потоке.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coro, timeout: float | None = None) -> Any:
+        """
+        Выполняет корутину в event loop'е потока и ждет результат.
+
+        :param coro: корутина.
+
+        :param timeout: максимальное время ожидания.
+
+        :return: результат корутины.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class SyncFacade:
+    """
+    Синхронный фасад для асинхронного объекта (AsyncAccount / AsyncRunner).
+    Корутины объекта выполняются в event loop'е фонового потока, а вызывающий поток ждет их результат, поэтому
+    фасад можно передавать в код, который ожидает обычный Account (например, в плагины). Асинхронные генераторы
+    (например, AsyncRunner.listen) превращаются в обычные.
+    """
+    def __init__(self, obj: AsyncAccount | AsyncRunner, loop_thread: LoopThread | None = None):
+        """
+        :param obj: асинхронный объект.
+
+        :param loop_thread: поток с event loop'ом, в котором живет объект. Если не передан - создается новый.
+        """
+        object.__setattr__(self, "_obj", obj)
+        object.__setattr__(self, "_loop_thread", loop_thread if loop_thread is not None else LoopThread())
+
+    def __getattr__(self, item):
+        attr = getattr(self._obj, item)
+        if inspect.isasyncgenfunction(attr):
+            def iterator(*args, **kwargs):
+                return self._iterate(attr(*args, **kwargs))
+            return iterator
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            return self._loop_thread.run(attr(*args, **kwargs))
+        return wrapper
+
+    def _iterate(self, generator: AsyncIterator) -> Generator[Any, None, None]:
+        """
+        Превращает асинхронный генератор (например, AsyncRunner.listen) в обычный: каждый элемент получается в
+        event loop'е фонового потока. Если обычный генератор закрыт, асинхронный генератор тоже закрывается.
+        """
+        async def get_next():
+            return await generator.__anext__()
+
+        async def close():
+            await generator.aclose()
+
+        try:
+            while True:
+                try:
+                    yield self._loop_thread.run(get_next())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._loop_thread.run(close())
+
+    def __setattr__(self, key, value):
+        setattr(self._obj, key, value)
@@ -61,3 +61,21 @@ class LotNotUpdated(Exception):
 
     def __str__(self):
         return f"Не удалось обновить лот. Ответ сервера {self.response}"
+
+
+class CircuitBreakerOpen(Exception):
+    """
+    Исключение, которое райзится, если запросы данного типа временно не отправляются, т.к. FunPay не отвечает
+    (сработал circuit breaker).
+    """
+    def __init__(self, endpoint: str | None, retry_in: float):
+        """
+        :param endpoint: тип запроса.
+
+        :param retry_in: через сколько секунд будет разрешен пробный запрос.
+        """
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+    def __str__(self):
+        return f"FunPay не отвечает на запросы типа {self.endpoint}. Следующая попытка через {self.retry_in:.0f} сек."
@@ -0,0 +1,246 @@
+"""
+В данном модуле написан ограничитель частоты запросов к FunPay (token bucket) с классами приоритетов.
+"""
+
+from __future__ import annotations
+from enum import IntEnum
+import itertools
+import threading
+import logging
+import time
+
+
+logger = logging.getLogger("FunPayAPI.limiter")
+
+
+class Priority(IntEnum):
+    """
+    Классы приоритетов запросов. Чем меньше значение - тем раньше запрос получит токен.
+    """
+    DELIVERY = 0
+    """Отправка сообщений (выдача товара, ответы покупателям)."""
+
+    HIGH = 1
+    """Получение событий, заказов, возвраты."""
+
+    NORMAL = 2
+    """Получение данных аккаунта и пользователей."""
+
+    BACKGROUND = 3
+    """Поднятие лотов, сохранение лотов, получение game_id категорий."""
+
+
+ENDPOINT_PRIORITIES = {
+    "message": Priority.DELIVERY,
+    "runner": Priority.HIGH,
+    "orders": Priority.HIGH,
+    "refund": Priority.HIGH,
+    "account": Priority.NORMAL,
+    "user": Priority.NORMAL,
+    "chat": Priority.NORMAL,
+    "raise": Priority.BACKGROUND,
+    "lot": Priority.BACKGROUND,
+    "category": Priority.BACKGROUND
+}
+"""Приоритеты типов запросов по умолчанию (типы запросов перечислены в transport.ENDPOINTS)."""
+
+DEFAULT_ENDPOINT_RATES = {
+    "raise": (2.0, 1),
+    "lot": (2.0, 1),
+    "category": (5.0, 1)
+}
+"""Лимиты типов запросов по умолчанию {"тип запроса": (запросов в секунду, размер пачки)}."""
+
+
+class TokenBucket:
+    """
+    Ведро токенов. Не потокобезопасно: используется только внутри RateLimiter.
+    """
+    def __init__(self, rate: float, capacity: int, min_rate: float):
+        """
+        :param rate: скорость пополнения (токенов в секунду).
+
+        :param capacity: вместимость ведра (максимальный размер пачки запросов).
+
+        :param min_rate: минимальная скорость, до которой ведро может быть замедлено после 429.
+        """
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if now > self.paused_until:
+            self.tokens = min(self.capacity, self.tokens + (now - max(self.updated, self.paused_until)) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        :return: через сколько секунд в ведре появится токен (0 - токен есть).
+        """
+        self.refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now + max(0.0, 1 - self.tokens) / self.rate
+        return max(0.0, 1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def slow_down(self, now: float, pause: float) -> None:
+        """
+        Замедляет ведро после ответа 429: скорость уменьшается вдвое, токены сгорают, ведро ставится на паузу.
+        """
+        self.refill(now)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, now + pause)
+
+    def speed_up(self, step: float) -> None:
+        """
+        Постепенно возвращает скорость к изначальной после успешного ответа.
+        """
+        self.rate = min(self.base_rate, self.rate + step * self.base_rate)
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов. Общий для всех потоков: у каждого типа запроса свое ведро токенов, кроме того
+    все запросы берут токен из общего ведра аккаунта. Общие токены выдаются ожидающим запросам в порядке
+    приоритета (а при равных приоритетах - в порядке очереди).
+    """
+    def __init__(self, rate: float = 5.0, burst: int = 5,
+                 endpoint_rates: dict[str, tuple[float, int]] | None = None,
+                 min_rate: float = 0.2, penalty: float = 10.0, recovery: float = 0.05):
+        """
+        :param rate: общий лимит (запросов в секунду).
+
+        :param burst: максимальный размер пачки запросов (общий).
+
+        :param endpoint_rates: лимиты типов запросов {"тип запроса": (запросов в секунду, размер пачки)}.
+        Если не переданы - используются DEFAULT_ENDPOINT_RATES.
+
+        :param min_rate: минимальный лимит, до которого ведра замедляются после ответов 429.
+
+        :param penalty: пауза (в секундах) после ответа 429, если FunPay не прислал Retry-After. Ставится на паузу
+        ведро типа запроса, а если у типа запроса нет своего ведра - общее ведро.
+
+        :param recovery: доля изначального лимита, на которую лимит увеличивается после каждого успешного ответа.
+        """
+        self.min_rate = min_rate
+        self.penalty = penalty
+        self.recovery = recovery
+        self.bucket = TokenBucket(rate, burst, min_rate)
+        self.endpoint_rates = dict(DEFAULT_ENDPOINT_RATES if endpoint_rates is None else endpoint_rates)
+        self.buckets: dict[str, TokenBucket] = {}
+
+        self.condition = threading.Condition()
+        self.counter = itertools.count()
+        self.waiters: list[tuple[int, int, str | None]] = []  # (приоритет, номер в очереди, тип запроса)
+
+    def get_bucket(self, endpoint: str | None) -> TokenBucket | None:
+        if endpoint is None or endpoint not in self.endpoint_rates:
+            return None
+        if endpoint not in self.buckets:
+            rate, capacity = self.endpoint_rates[endpoint]
+            self.buckets[endpoint] = TokenBucket(rate, capacity, self.min_rate)
+        return self.buckets[endpoint]
+
+    def _endpoint_wait(self, endpoint: str | None, now: float) -> float:
+        bucket = self.get_bucket(endpoint)
+        return bucket.wait_time(now) if bucket is not None else 0.0
+
+    def acquire(self, endpoint: str | None = None, priority: Priority | int | None = None,
+                timeout: float | None = None) -> bool:
+        """
+        Ждет, пока запрос можно будет отправить, и забирает токены.
+
+        :param endpoint: тип запроса.
+
+        :param priority: приоритет запроса. Если не передан - берется из ENDPOINT_PRIORITIES.
+
+        :param timeout: максимальное время ожидания (None - без ограничения).
+
+        :return: True, если токены получены, False, если истек тайм-аут.
+        """
+        if priority is None:
+            priority = ENDPOINT_PRIORITIES.get(endpoint, Priority.NORMAL)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.condition:
+            entry = (int(priority), next(self.counter), endpoint)
+            self.waiters.append(entry)
+            self.waiters.sort()
+            try:
+                while True:
+                    now = time.monotonic()
+                    own_wait = self._endpoint_wait(endpoint, now)
+                    # Общий токен достается первому (по приоритету) запросу, у которого уже есть токен своего типа.
+                    first_ready = next((i for i in self.waiters if i is entry or
+                                        self._endpoint_wait(i[2], now) == 0), None)
+                    if own_wait == 0 and first_ready is entry:
+                        global_wait = self.bucket.wait_time(now)
+                        if global_wait == 0:
+                            self.bucket.consume()
+                            bucket = self.get_bucket(endpoint)
+                            if bucket is not None:
+                                bucket.consume()
+                            return True
+                        wait = global_wait
+                    elif own_wait == 0:
+                        # Ждем, пока запрос с большим приоритетом заберет токен.
+                        wait = max(self.bucket.wait_time(now), 0.01)
+                    else:
+                        wait = own_wait
+
+                    if deadline is not None:
+                        if now >= deadline:
+                            return False
+                        wait = min(wait, deadline - now)
+                    self.condition.wait(wait)
+            finally:
+                self.waiters.remove(entry)
+                self.condition.notify_all()
+
+    def get_interval(self, endpoint: str | None = None) -> float:
+        """
+        :return: минимальный интервал (в секундах) между запросами данного типа при текущих лимитах
+        (с учетом паузы после 429).
+        """
+        with self.condition:
+            now = time.monotonic()
+            interval = max(1 / self.bucket.rate, self.bucket.paused_until - now)
+            bucket = self.get_bucket(endpoint)
+            if bucket is not None:
+                interval = max(interval, 1 / bucket.rate, bucket.paused_until - now)
+            return interval
+
+    def feedback(self, endpoint: str | None, status_code: int, retry_after: float | None = None) -> None:
+        """
+        Корректирует лимиты по ответу FunPay: после 429 лимиты уменьшаются вдвое (и ведро типа запроса, а если его
+        нет - общее ведро, ставится на паузу), после успешных ответов - постепенно восстанавливаются.
+
+        :param endpoint: тип запроса.
+
+        :param status_code: статус-код ответа.
+
+        :param retry_after: значение заголовка Retry-After (в секундах), если он есть.
+        """
+        with self.condition:
+            bucket = self.get_bucket(endpoint)
+            if status_code == 429:
+                now = time.monotonic()
+                pause = retry_after if retry_after is not None else self.penalty
+                # У типов запросов без своего ведра (runner, сообщения, заказы) лимит есть только у общего ведра.
+                self.bucket.slow_down(now, 0 if bucket is not None else pause)
+                if bucket is not None:
+                    bucket.slow_down(now, pause)
+                logger.warning(f"FunPay ответил 429 на запрос типа {endpoint}. Лимит снижен до "
+                               f"{bucket.rate if bucket is not None else self.bucket.rate:.2f} запр./сек.")
+            elif status_code < 400:
+                self.bucket.speed_up(self.recovery)
+                if bucket is not None:
+                    bucket.speed_up(self.recovery)
+            self.condition.notify_all()
@@ -0,0 +1,601 @@
+"""
+В данном модуле написаны все парсеры страниц FunPay.
+
+Парсеры используют один набор CSS селекторов и работают поверх одного из бэкендов:
+selectolax (самый быстрый), BeautifulSoup + lxml, BeautifulSoup + html.parser (самый медленный, эталонный).
+По умолчанию используется эталонный бэкенд: бэкенды по-разному разбирают некорректную разметку, поэтому более быстрый
+бэкенд выбирается только после сверки его результатов с эталонными на сохраненных страницах (см. select_backend).
+Ускорение необязательное: selectolax и lxml не входят в обязательные зависимости (python setup.py --fast-parser),
+а страницы для сверки пользователь сохраняет сам.
+"""
+
+from __future__ import annotations
+from typing import Iterator
+from enum import Enum
+import logging
+import abc
+import json
+import os
+
+from bs4 import BeautifulSoup
+
+from . import types
+from . import exceptions
+from . import utils
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+
+logger = logging.getLogger("FunPayAPI.parser")
+
+
+REFERENCE_BACKEND = "html.parser"
+"""Эталонный бэкенд, с результатами которого сверяются остальные."""
+
+AVAILABLE_BACKENDS = tuple(name for name, available in (("selectolax", HTMLParser is not None),
+                                                       ("lxml", lxml is not None),
+                                                       ("html.parser", True)) if available)
+"""Установленные бэкенды (в порядке убывания скорости)."""
+
+_backend = REFERENCE_BACKEND
+
+
+class Node(abc.ABC):
+    """
+    Базовый класс узла HTML дерева. Скрывает различия между бэкендами.
+    """
+    @abc.abstractmethod
+    def css(self, selector: str) -> list[Node]:
+        """
+        :return: все узлы, подходящие под CSS селектор.
+        """
+        pass
+
+    @abc.abstractmethod
+    def css_first(self, selector: str) -> Node | None:
+        """
+        :return: первый узел, подходящий под CSS селектор, или None.
+        """
+        pass
+
+    @property
+    @abc.abstractmethod
+    def text(self) -> str:
+        """
+        Текст узла (вместе с текстом всех вложенных узлов).
+        """
+        pass
+
+    @abc.abstractmethod
+    def get(self, attr: str, default: str | None = None) -> str | None:
+        """
+        :return: значение атрибута узла.
+        """
+        pass
+
+    def __getitem__(self, attr: str) -> str:
+        value = self.get(attr)
+        if value is None:
+            raise KeyError(attr)
+        return value
+
+    @property
+    def classes(self) -> list[str]:
+        """
+        Список классов узла.
+        """
+        value = self.get("class")
+        return value.split() if value else []
+
+    @property
+    @abc.abstractmethod
+    def parent(self) -> Node | None:
+        pass
+
+    @property
+    @abc.abstractmethod
+    def html(self) -> str:
+        """
+        HTML код узла.
+        """
+        pass
+
+
+class _Bs4Node(Node):
+    def __init__(self, tag):
+        self._tag = tag
+
+    def css(self, selector: str) -> list[Node]:
+        return [_Bs4Node(i) for i in self._tag.select(selector)]
+
+    def css_first(self, selector: str) -> Node | None:
+        tag = self._tag.select_one(selector)
+        return _Bs4Node(tag) if tag is not None else None
+
+    @property
+    def text(self) -> str:
+        return self._tag.text
+
+    def get(self, attr: str, default: str | None = None) -> str | None:
+        value = self._tag.get(attr)
+        if value is None:
+            return default
+        # bs4 возвращает мульти-атрибуты (class) списком.
+        return " ".join(value) if isinstance(value, list) else value
+
+    @property
+    def parent(self) -> Node | None:
+        return _Bs4Node(self._tag.parent) if self._tag.parent is not None else None
+
+    @property
+    def html(self) -> str:
+        return str(self._tag)
+
+
+class _SelectolaxNode(Node):
+    def __init__(self, node):
+        self._node = node
+
+    def css(self, selector: str) -> list[Node]:
+        return [_SelectolaxNode(i) for i in self._node.css(selector)]
+
+    def css_first(self, selector: str) -> Node | None:
+        node = self._node.css_first(selector)
+        return _SelectolaxNode(node) if node is not None else None
+
+    @property
+    def text(self) -> str:
+        return self._node.text(deep=True)
+
+    def get(self, attr: str, default: str | None = None) -> str | None:
+        attributes = self._node.attributes
+        if attr not in attributes:
+            return default
+        # Атрибут без значения (например, <option selected>) в selectolax равен None.
+        value = attributes[attr]
+        return value if value is not None else ""
+
+    @property
+    def parent(self) -> Node | None:
+        return _SelectolaxNode(self._node.parent) if self._node.parent is not None else None
+
+    @property
+    def html(self) -> str:
+        return self._node.html
+
+
+def get_backend() -> str:
+    """
+    :return: название текущего бэкенда.
+    """
+    return _backend
+
+
+def set_backend(backend: str) -> None:
+    """
+    Устанавливает бэкенд для всех парсеров.
+
+    :param backend: название бэкенда (один из AVAILABLE_BACKENDS).
+    """
+    global _backend
+    if backend not in AVAILABLE_BACKENDS:
+        raise ValueError(f"Бэкенд {backend} не установлен. Доступные бэкенды: {AVAILABLE_BACKENDS}.")
+    _backend = backend
+    logger.debug(f"Установлен бэкенд парсера: {backend}.")
+
+
+def parse(html: str, backend: str | None = None) -> Node:
+    """
+    Строит HTML дерево.
+
+    :param html: HTML код.
+
+    :param backend: бэкенд. Если не передан - используется текущий.
+
+    :return: корневой узел дерева.
+    """
+    backend = backend or _backend
+    if backend == "selectolax":
+        return _SelectolaxNode(HTMLParser(html).root)
+    return _Bs4Node(BeautifulSoup(html, backend))
+
+
+# Парсеры страниц
+def parse_account_page(html: str, backend: str | None = None) -> dict:
+    """
+    Парсит главную страницу FunPay.
+
+    :return: {"username", "app_data", "active_orders", "balance", "currency"}
+    """
+    tree = parse(html, backend)
+    username = tree.css_first("div.user-link-name")
+    if username is None:
+        raise exceptions.AccountDataNotfound()
+
+    app_data = json.loads(tree.css_first("body")["data-app-data"])
+    active_orders = tree.css_first("span.badge.badge-trade")
+    balance_badge = tree.css_first("span.badge.badge-balance")
+    return {
+        "username": username.text,
+        "app_data": app_data,
+        "active_orders": int(active_orders.text) if active_orders else 0,
+        "balance": float(balance_badge.text.split(" ")[0]) if balance_badge else 0,
+        "currency": balance_badge.text.split(" ")[1] if balance_badge else ""
+    }
+
+
+def parse_order_row(div: Node, status: types.OrderStatuses, include_html: bool = False) -> types.Order:
+    """
+    Парсит строку (a.tc-item) таблицы заказов.
+
+    :param div: узел строки.
+
+    :param status: статус заказа.
+
+    :param include_html: сохранять ли HTML код строки в Order.html.
+
+    :return: экземпляр заказа.
+    """
+    order_id = div.css_first("div.tc-order").text
+    title = div.css_first("div.order-desc div").text
+    price = float(div.css_first("div.tc-price").text.split(" ")[0])
+
+    buyer_div = div.css_first("div.media-user-name span")
+    buyer_username = buyer_div.text
+    buyer_id = int(buyer_div.get("data-href")[:-1].split("https://funpay.com/users/")[1])
+    date_div = div.css_first("div.tc-date-time")
+    date = utils.parse_order_date(date_div.text) if date_div is not None else None
+    return types.Order(html=div.html if include_html else None, id_=order_id, title=title, price=price,
+                       buyer_username=buyer_username, buyer_id=buyer_id, status=status, date=date)
+
+
+def get_order_status(div: Node) -> types.OrderStatuses:
+    """
+    :return: статус заказа по классам строки таблицы заказов.
+    """
+    classes = div.classes
+    if "warning" in classes:
+        return types.OrderStatuses.REFUND
+    elif "info" in classes:
+        return types.OrderStatuses.OUTSTANDING
+    return types.OrderStatuses.COMPLETED
+
+
+def slice_orders_table(html: str, stop_at: str | None = None) -> str | None:
+    """
+    Вырезает из страницы заказов строки таблицы заказов (a.tc-item), чтобы не строить дерево всей страницы.
+
+    :param html: HTML страницы заказов.
+
+    :param stop_at: ID заказа, до строки которого нужно вырезать таблицу (сама строка не включается).
+    Если заказ не найден на странице - вырезаются все строки.
+
+    :return: HTML строк таблицы, пустая строка, если заказов нет, или None, если страница не похожа на страницу
+    заказов.
+    """
+    if "user-link-name" not in html:
+        return None
+
+    first_row = html.find('class="tc-item')
+    if first_row == -1:
+        return ""
+    start = html.rfind("<a", 0, first_row)
+    if start == -1:
+        return None
+
+    if stop_at is not None:
+        stop_row = html.find(f">{stop_at}<", start)
+        if stop_row != -1:
+            return html[start:html.rfind("<a", start, stop_row)]
+
+    last_row = html.rfind('class="tc-item')
+    end = html.find("</a>", last_row)
+    return html[start:end + 4] if end != -1 else html[start:]
+
+
+def parse_orders(html: str, include_outstanding: bool = True, include_completed: bool = False,
+                 include_refund: bool = False, exclude: list[str] | None = None, stop_at: str | None = None,
+                 include_html: bool = False, backend: str | None = None) -> list[types.Order]:
+    """
+    Парсит страницу заказов (аргументы аналогичны Account.get_orders).
+
+    :return: Список с заказами.
+    """
+    exclude = [] if not exclude else exclude
+    table = slice_orders_table(html, stop_at)
+    if table is None:
+        # Не удалось найти таблицу заказов по тексту страницы - парсим страницу целиком.
+        tree = parse(html, backend)
+        if tree.css_first("div.user-link-name") is None:
+            raise exceptions.AccountDataNotfound()
+    else:
+        tree = parse(table, backend)
+
+    included = {types.OrderStatuses.OUTSTANDING: include_outstanding,
+                types.OrderStatuses.COMPLETED: include_completed,
+                types.OrderStatuses.REFUND: include_refund}
+    orders_list = []
+    for div in tree.css("a.tc-item"):
+        order_id = div.css_first("div.tc-order").text
+        if order_id == stop_at:
+            break
+        status = get_order_status(div)
+        if not included[status]:
+            continue
+        if order_id in exclude:
+            continue
+        orders_list.append(parse_order_row(div, status, include_html))
+    return orders_list
+
+
+def parse_orders_page(html: str, backend: str | None = None) -> tuple[list[types.Order], str | None]:
+    """
+    Парсит страницу (или подгруженную часть) истории заказов.
+
+    :return: (все заказы страницы без HTML кода, токен следующей страницы или None, если страница последняя).
+    """
+    tree = parse(html, backend)
+    orders_list = [parse_order_row(div, get_order_status(div), False) for div in tree.css("a.tc-item")]
+    continue_input = tree.css_first("input[name=continue]")
+    continue_token = continue_input.get("value") if continue_input is not None else None
+    return orders_list, continue_token or None
+
+
+def parse_category_game_id(html: str, category_type: types.CategoryTypes, backend: str | None = None) -> int:
+    """
+    Парсит страницу редактирования лотов категории.
+
+    :return: ID игры, к которой относится категория.
+    """
+    tree = parse(html, backend)
+    if tree.css_first("div.user-link-name") is None:
+        raise exceptions.AccountDataNotfound()
+
+    if category_type == types.CategoryTypes.LOT:
+        return int(tree.css_first("div.col-sm-6").css_first("button")["data-game"])
+    return int(tree.css_first("input[name=game]")["value"])
+
+
+def parse_lot_info(html: str, backend: str | None = None) -> dict[str, str]:
+    """
+    Парсит форму редактирования лота.
+
+    :return: словарь {"название поля": "значение поля"}.
+    """
+    tree = parse(html, backend)
+    result = {}
+    for field in tree.css("input"):
+        result[field["name"]] = field.get("value") or ""
+
+    for field in tree.css("textarea"):
+        result[field["name"]] = field.text or ""
+
+    for field in tree.css("select"):
+        result[field["name"]] = field.css_first("option[selected]")["value"]
+    return result
+
+
+def parse_raise_modal(html: str, exclude: list[int] | None = None,
+                      backend: str | None = None) -> tuple[list[int], list[str]]:
+    """
+    Парсит modal-форму поднятия лотов.
+
+    :param exclude: список ID категорий, которые не нужно поднимать.
+
+    :return: (ID категорий, названия категорий).
+    """
+    category_ids = []
+    category_names = []
+    for cb in parse(html, backend).css("div.checkbox"):
+        category_id = int(cb.css_first("input")["value"])
+        if exclude is None or category_id not in exclude:
+            category_ids.append(category_id)
+            category_names.append(cb.css_first("label").text)
+    return category_ids, category_names
+
+
+def parse_user(html: str, include_currency: bool = False, backend: str | None = None) -> types.UserInfo:
+    """
+    Парсит страницу пользователя.
+
+    :param include_currency: включать ли в список категории / лоты, относящиеся к игровой валюте.
+
+    :return: экземпляр класса с информацией о пользователе.
+    """
+    categories = []
+    lots = []
+    for div in parse(html, backend).css("div.offer-list-title-container"):
+        category_link = div.css_first("div.offer-list-title a")
+        public_link = category_link["href"]
+        if "chips" in public_link:
+            # 'chips' в ссылке означает, что данная категория - игровая валюта.
+            # Например: https://funpay.com/chips/125/ - Серебро Black Desert Mobile.
+            if not include_currency:
+                continue
+            category_type = types.CategoryTypes.CURRENCY
+        else:
+            category_type = types.CategoryTypes.LOT
+
+        category_id = int(public_link.split("/")[-2])
+        categories.append(types.Category(id_=category_id, game_id=None, title=category_link.text,
+                                         edit_lots_link=public_link + "trade", public_link=public_link,
+                                         type_=category_type))
+
+        # Парсим лоты внутри текущей категории
+        for lot_div in div.parent.css("a.tc-item"):
+            lot_id = int(lot_div["href"].split("id=")[1])
+            lot_title = lot_div.css_first("div.tc-desc-text").text
+            price = lot_div.css_first("div.tc-price")["data-s"]
+            lots.append(types.Lot(category_id, None, lot_id, lot_title, price))
+    return types.UserInfo(lots, categories)
+
+
+def parse_chat_bookmarks(html: str, backend: str | None = None) -> list[tuple[int, str, str, bool]]:
+    """
+    Парсит HTML списка чатов (объект chat_bookmarks runner'а).
+
+    :return: [(node_id, никнейм собеседника, текст последнего сообщения, есть ли непрочитанные сообщения)]
+    """
+    result = []
+    for item in parse(html, backend).css("a.contact-item"):
+        result.append((int(item["data-id"]), item.css_first("div.media-user-name").text,
+                       item.css_first("div.contact-item-message").text, "unread" in item.classes))
+    return result
+
+
+def parse_chat_last_messages(html: str, backend: str | None = None) -> dict[int, int]:
+    """
+    Парсит ID последних сообщений чатов из HTML списка чатов (атрибут data-node-msg).
+
+    :return: {node_id: ID последнего сообщения}. Чаты без ID последнего сообщения не возвращаются.
+    """
+    result = {}
+    for item in parse(html, backend).css("a.contact-item"):
+        last_message = item.get("data-node-msg")
+        if last_message and last_message.isdigit():
+            result[int(item["data-id"])] = int(last_message)
+    return result
+
+
+def parse_chat_messages(messages: list[dict], backend: str | None = None) -> list[tuple[int, int, str]]:
+    """
+    Парсит сообщения чата (поле data.messages объекта chat_node runner'а).
+
+    :param messages: сообщения из объекта chat_node.
+
+    :return: [(ID сообщения, ID автора (0 - FunPay), текст сообщения)] в порядке возрастания ID.
+    Для изображений вместо текста возвращается ссылка на изображение.
+    """
+    result = []
+    for message in messages:
+        tree = parse(message["html"], backend)
+        text_div = tree.css_first("div.chat-msg-text")
+        if text_div is not None:
+            text = text_div.text
+        else:
+            image = tree.css_first("a.chat-img-link")
+            text = image.get("href", "") if image is not None else ""
+        result.append((int(message["id"]), int(message.get("author") or 0), text))
+    result.sort(key=lambda i: i[0])
+    return result
+
+
+def find_chat_node_id(html: str, username: str, backend: str | None = None) -> int | None:
+    """
+    Ищет node_id чата по никнейму собеседника в HTML списка чатов.
+
+    :return: node_id чата или None, если чат не найден.
+    """
+    for item in parse(html, backend).css("a.contact-item"):
+        if item.css_first("div.media-user-name").text == username:
+            return int(item["data-id"])
+    return None
+
+
+PAGE_PARSERS = {
+    "account": parse_account_page,
+    "orders": lambda html, backend: parse_orders(html, True, True, True, backend=backend),
+    "orders_page": parse_orders_page,
+    "category_lot": lambda html, backend: parse_category_game_id(html, types.CategoryTypes.LOT, backend),
+    "category_currency": lambda html, backend: parse_category_game_id(html, types.CategoryTypes.CURRENCY, backend),
+    "lot_info": parse_lot_info,
+    "raise_modal": lambda html, backend: parse_raise_modal(html, backend=backend),
+    "user": lambda html, backend: parse_user(html, True, backend),
+    "chat_bookmarks": parse_chat_bookmarks
+}
+"""Парсеры, результаты которых сверяются при проверке бэкенда {"тип страницы": парсер}."""
+
+
+def _comparable(obj):
+    """
+    Превращает результат парсера в структуру, которую можно сравнить оператором ==.
+    HTML код заказов не сравнивается (бэкенды по-разному сериализуют HTML).
+    """
+    if isinstance(obj, (list, tuple)):
+        return [_comparable(i) for i in obj]
+    if isinstance(obj, dict):
+        return {k: _comparable(v) for k, v in obj.items()}
+    if hasattr(obj, "to_tuple"):
+        return obj.to_tuple()
+    if hasattr(obj, "__dict__") and not isinstance(obj, Enum):
+        return {k: _comparable(v) for k, v in vars(obj).items() if k != "html"}
+    return obj
+
+
+def iter_saved_pages(pages_dir: str) -> Iterator[tuple[str, str, str]]:
+    """
+    Перебирает сохраненные страницы. Имя файла должно начинаться с типа страницы (ключа PAGE_PARSERS),
+    например: orders.html, orders_2.html, user_123.html.
+
+    :param pages_dir: папка с сохраненными страницами.
+
+    :return: (имя файла, тип страницы, HTML код)
+    """
+    if not os.path.isdir(pages_dir):
+        return
+    for file in sorted(os.listdir(pages_dir)):
+        page_type = next((i for i in sorted(PAGE_PARSERS, key=len, reverse=True) if file.startswith(i)), None)
+        if page_type is None:
+            continue
+        with open(os.path.join(pages_dir, file), "r", encoding="utf-8") as f:
+            yield file, page_type, f.read()
+
+
+def check_backend(backend: str, pages_dir: str) -> list[str]:
+    """
+    Сверяет результаты парсеров на бэкенде backend с результатами эталонного бэкенда на сохраненных страницах.
+
+    :param backend: проверяемый бэкенд.
+
+    :param pages_dir: папка с сохраненными страницами.
+
+    :return: список файлов, на которых результаты не совпали.
+    """
+    mismatches = []
+    for file, page_type, html in iter_saved_pages(pages_dir):
+        page_parser = PAGE_PARSERS[page_type]
+        try:
+            expected = _comparable(page_parser(html, REFERENCE_BACKEND))
+        except Exception:
+            # Если страницу не может разобрать даже эталонный бэкенд - сравнивать не с чем.
+            continue
+        try:
+            result = _comparable(page_parser(html, backend))
+        except Exception:
+            result = None
+        if result != expected:
+            mismatches.append(file)
+    return mismatches
+
+
+def select_backend(pages_dir: str | None = None) -> str:
+    """
+    Устанавливает самый быстрый из установленных бэкендов, результаты которого совпадают с эталонными на
+    сохраненных страницах. Если сохраненных страниц нет - устанавливает эталонный бэкенд.
+
+    :param pages_dir: папка с сохраненными страницами.
+
+    :return: название установленного бэкенда.
+    """
+    if not pages_dir or next(iter_saved_pages(pages_dir), None) is None:
+        set_backend(REFERENCE_BACKEND)
+        return REFERENCE_BACKEND
+    for backend in AVAILABLE_BACKENDS:
+        if backend != REFERENCE_BACKEND:
+            mismatches = check_backend(backend, pages_dir)
+            if mismatches:
+                logger.warning(f"Бэкенд парсера {backend} выдал результаты, отличные от {REFERENCE_BACKEND} "
+                               f"на страницах: {', '.join(mismatches)}. Пропускаю его.")
+                continue
+        set_backend(backend)
+        return backend
+    set_backend(REFERENCE_BACKEND)
+    return REFERENCE_BACKEND
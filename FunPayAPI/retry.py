@@ -0,0 +1,210 @@
+"""
+В данном модуле написаны политика повторных попыток (экспоненциальная задержка + jitter + дедлайн) и
+circuit breaker для запросов к FunPay.
+"""
+
+from __future__ import annotations
+from typing import Callable, Awaitable, TypeVar
+import threading
+import asyncio
+import logging
+import random
+import time
+
+from . import exceptions
+
+
+logger = logging.getLogger("FunPayAPI.retry")
+
+T = TypeVar("T")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker одного типа запросов. После failure_threshold ошибок подряд запросы этого типа не отправляются
+    reset_timeout секунд (сразу райзится CircuitBreakerOpen), после чего разрешается один пробный запрос: если он
+    успешен - запросы снова отправляются, если нет - пауза повторяется.
+    """
+    def __init__(self, endpoint: str | None, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        :param endpoint: тип запроса.
+
+        :param failure_threshold: кол-во ошибок подряд, после которого запросы перестают отправляться.
+
+        :param reset_timeout: пауза (в секундах) перед пробным запросом.
+        """
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_request(self) -> None:
+        """
+        Проверяет, можно ли отправить запрос.
+
+        :raises exceptions.CircuitBreakerOpen: если запросы временно не отправляются.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if retry_in > 0 or self.trial_running:
+                raise exceptions.CircuitBreakerOpen(self.endpoint, max(retry_in, 0.0))
+            self.trial_running = True
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"FunPay снова отвечает на запросы типа {self.endpoint}.")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    logger.warning(f"FunPay не отвечает на запросы типа {self.endpoint}. Запросы приостановлены на "
+                                   f"{self.reset_timeout:.0f} сек.")
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class RetryPolicy:
+    """
+    Политика повторных попыток: экспоненциальная задержка со случайным разбросом (jitter), ограничение по кол-ву
+    попыток и по общему времени (дедлайн). Если сработал circuit breaker, пустые попытки не делаются: политика либо
+    ждет пробного запроса (если это позволяют попытки и дедлайн), либо сразу райзит исключение.
+    """
+    def __init__(self, attempts: int | None = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 multiplier: float = 2.0, jitter: float = 0.5, deadline: float | None = None,
+                 retry_on: tuple[type[Exception], ...] = (Exception,),
+                 give_up_on: tuple[type[Exception], ...] = (exceptions.NotAuthorized,)):
+        """
+        :param attempts: максимальное кол-во попыток (None - без ограничения).
+
+        :param base_delay: задержка перед второй попыткой (в секундах).
+
+        :param max_delay: максимальная задержка между попытками (в секундах).
+
+        :param multiplier: во сколько раз увеличивается задержка после каждой попытки.
+
+        :param jitter: доля задержки, на которую она может быть случайно уменьшена (0 - без разброса).
+
+        :param deadline: максимальное общее время выполнения (в секундах, None - без ограничения).
+        Если следующая попытка не успевает до дедлайна - райзится последнее исключение.
+
+        :param retry_on: классы исключений, после которых делается повторная попытка.
+
+        :param give_up_on: классы исключений, после которых повторная попытка не делается.
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.give_up_on = give_up_on
+
+    def get_delay(self, attempt: int) -> float:
+        """
+        :param attempt: номер неудачной попытки (начиная с 1).
+
+        :return: задержка перед следующей попыткой.
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def _next_delay(self, error: Exception, attempt: int, started: float) -> float | None:
+        """
+        :return: задержка перед следующей попыткой или None, если повторять не нужно.
+        """
+        if isinstance(error, self.give_up_on):
+            return None
+        if isinstance(error, exceptions.CircuitBreakerOpen):
+            # retry_in == 0 - пробный запрос уже выполняется в другом потоке, его результат еще неизвестен: ждем
+            # обычную задержку, а не повторяем попытку сразу.
+            delay = error.retry_in if error.retry_in > 0 else self.get_delay(attempt)
+        elif isinstance(error, self.retry_on):
+            delay = self.get_delay(attempt)
+        else:
+            return None
+        if self.attempts is not None and attempt >= self.attempts:
+            return None
+        if self.deadline is not None and time.monotonic() - started + delay > self.deadline:
+            return None
+        return delay
+
+    def call(self, func: Callable[..., T], *args,
+             on_retry: Callable[[Exception, int, float], None] | None = None, **kwargs) -> T:
+        """
+        Выполняет функцию, повторяя ее согласно политике.
+
+        :param func: функция.
+
+        :param args: аргументы функции.
+
+        :param on_retry: функция, вызываемая перед каждой повторной попыткой (исключение, номер неудачной попытки,
+        задержка). Например, для логирования.
+
+        :param kwargs: именованные аргументы функции.
+
+        :return: результат функции. Если все попытки неудачны - райзится последнее исключение.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+                if on_retry is not None:
+                    on_retry(e, attempt, delay)
+                time.sleep(delay)
+
+    async def call_async(self, func: Callable[..., Awaitable[T]], *args,
+                         on_retry: Callable[[Exception, int, float], None] | None = None, **kwargs) -> T:
+        """
+        Асинхронный аналог RetryPolicy.call.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+                if on_retry is not None:
+                    on_retry(e, attempt, delay)
+                await asyncio.sleep(delay)
+
+
+def log_retry(action: str, log: logging.Logger = logger) -> Callable[[Exception, int, float], None]:
+    """
+    Создает функцию для RetryPolicy.call(on_retry=...), которая логирует неудачную попытку.
+
+    :param action: описание действия (например, "получить список ордеров").
+
+    :param log: логгер.
+    """
+    def on_retry(error: Exception, attempt: int, delay: float) -> None:
+        log.error(f"Не удалось {action} (попытка {attempt}): {error}")
+        log.debug("------TRACEBACK------", exc_info=error)
+        log.warning(f"Повторю попытку через {delay:.1f} сек...")
+    return on_retry
@@ -2,11 +2,14 @@
 В данном модуле написан класс Runner'а.
 """
 
-from bs4 import BeautifulSoup
-from typing import Iterator
-from copy import deepcopy
+from __future__ import annotations
+from typing import Iterator, Hashable
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import concurrent.futures
 import traceback
-import requests
+import threading
+import hashlib
 import logging
 import json
 import time
@@ -14,33 +17,89 @@ import time
 from . import utils
 from . import types
 from . import account
+from . import parser
+from . import retry
 from . import exceptions
+from .limiter import Priority
 
 
 logger = logging.getLogger("FunPayAPI.runner")
 
 
+MIN_SAVED_CHATS = 200
+"""Минимальный размер Runner.saved_messages (должен быть больше кол-ва чатов в списке чатов runner'а)."""
+
+MIN_SAVED_ORDERS = 1000
+"""Минимальный размер Runner.saved_orders (должен быть больше кол-ва заказов на странице заказов)."""
+
+
 class Runner:
     """
     Класс для получения новых событий с FunPay.
     """
-    def __init__(self, account_instance: account.Account, timeout: float | int = 10.0):
+    def __init__(self, account_instance: account.Account, timeout: float | int = 10.0,
+                 incremental_orders: bool = True, orders_pipeline: bool = True, max_saved_chats: int = 2000,
+                 max_saved_orders: int = 5000, legacy_initial_events: bool = False, piggyback_messages: bool = False,
+                 watched_chats: int = 20):
         """
         :param account_instance: экземпляр класса аккаунта.
 
         :param timeout: тайм-аут ожидания ответа на запросы.
+
+        :param incremental_orders: парсить только новые заказы (выше последнего известного заказа) и не запрашивать
+        список заказов, если изменился только счетчик покупок. Если False - при каждом изменении счетчиков
+        парсится вся страница заказов.
+
+        :param orders_pipeline: обновлять список заказов в отдельном потоке (OrdersRefresher), не задерживая события
+        сообщений. События заказов отдаются Runner.listen сразу после обновления. Если False - список заказов
+        обновляется внутри Runner.get_updates.
+
+        :param max_saved_chats: максимальное кол-во чатов, последние сообщения которых хранятся для сравнения
+        (не меньше MIN_SAVED_CHATS). Одна запись занимает ~200 байт.
+
+        :param max_saved_orders: максимальное кол-во заказов, статусы которых хранятся для сравнения
+        (не меньше MIN_SAVED_ORDERS). Одна запись занимает ~250 байт.
+
+        :param legacy_initial_events: при первом запросе создавать отдельные InitialMessageEvent / InitialOrderEvent
+        для каждого чата / заказа вместо одного InitialSnapshotEvent.
+
+        :param piggyback_messages: отправлять сообщения, переданные в Runner.send_message, вместе с запросами
+        runner'а (один запрос и отправляет сообщение, и получает события). Если в очереди есть сообщение,
+        Runner.listen отправляет запрос сразу, не дожидаясь задержки.
+
+        :param watched_chats: кол-во последних активных чатов, объекты chat_node которых добавляются в каждый запрос
+        runner'а. Для этих чатов FunPay в том же ответе присылает все новые сообщения, и Runner создает событие на
+        каждое сообщение, а не только на последнее (превью из списка чатов). 0 - не отслеживать чаты.
         """
         self.account = account_instance
         self.timeout = timeout
+        self.incremental_orders = incremental_orders
+        self.legacy_initial_events = legacy_initial_events
+        self.orders_refresher = OrdersRefresher(self) if orders_pipeline else None
+        self.outgoing = OutgoingMessages(self.orders_refresher) if piggyback_messages else None
+        # Политика повторных попыток получения списка заказов.
+        self.orders_retry = retry.RetryPolicy(attempts=3, base_delay=1.0, max_delay=4.0, deadline=15.0)
 
         self.last_message_event_tag = utils.gen_random_tag()
         self.last_order_event_tag = utils.gen_random_tag()
 
-        self.saved_messages: dict[int, types.Message] = {}
-        self.saved_orders: dict[str, types.Order] = {}
+        # {ID чата: (хэш текста последнего сообщения, временная метка)}
+        self.saved_messages = LRUStore(max(max_saved_chats, MIN_SAVED_CHATS))
+        # {ID заказа: (статус, ID покупателя, цена)}
+        self.saved_orders = LRUStore(max(max_saved_orders, MIN_SAVED_ORDERS))
+        # {ID чата: (тег объекта chat_node, ID последнего полученного сообщения)}
+        self.watched_chats = LRUStore(watched_chats) if watched_chats > 0 else None
+        self.orders_counters: tuple[int, int] | None = None  # (покупки, продажи)
+        self.last_order_id: str | None = None  # ID самого нового заказа на странице заказов
 
         self.first_request = True
-        self.session = requests.session()
+        # Удерживается, пока полученные события не отданы Runner.listen (и пока Runner.stop останавливает получение
+        # событий), чтобы состояние Runner'а не опережало обработанные события.
+        self.state_lock = threading.RLock()
+        self.listening = threading.Event()  # Сброшен после Runner.stop: Runner.listen не отправляет запросы.
+        self.listening.set()
+        self.transport = self.account.transport
+        self.session = self.transport.session
 
     def get_updates(self) -> list[types.NewMessageEvent | types.NewOrderEvent | types.OrderStatusChangedEvent]:
         """
@@ -51,6 +110,81 @@ class Runner:
         if not self.account.is_authorized():
             raise exceptions.NotAuthorized()
 
+        outgoing = self.outgoing.take() if self.outgoing is not None else None
+        headers, payload = self._updates_request(outgoing[0] if outgoing else None)
+        # Запрос с сообщением получает токен лимитера с приоритетом отправки сообщений.
+        priority = Priority.DELIVERY if outgoing else None
+        try:
+            response = self.transport.post(types.Links.RUNNER, "runner", priority=priority, headers=headers,
+                                           data=payload, timeout=self.timeout)
+            logger.debug(f"Статус-код получения данных о событиях: {response.status_code}.")
+            if response.status_code != 200:
+                raise exceptions.StatusCodeIsNot200(response.status_code)
+            json_response = response.json()
+        except Exception as e:
+            if outgoing:
+                outgoing[1].set_exception(e)
+            raise
+        logger.debug(f"Получены данные о событиях: {json_response}")
+
+        if outgoing:
+            try:
+                outgoing[1].set_result(self.account._parse_message_response(json_response))
+            except exceptions.MessageNotDelivered as e:
+                outgoing[1].set_exception(e)
+
+        events = []
+        chat_messages = self._parse_chat_nodes(json_response["objects"])
+
+        for obj in json_response["objects"]:
+            if obj.get("type") == "chat_bookmarks":
+                events.extend(self._parse_chat_bookmarks(obj, chat_messages))
+
+            elif obj.get("type") == "orders_counters":
+                events.extend(self._parse_orders_counters(obj))
+                mode, seller_delta = self._orders_sync_mode(obj)
+                if mode == "skip":
+                    logger.debug("Счетчики заказов не изменились, пропускаю обновление списка ордеров.")
+                    continue
+                # Первый запрос обрабатывается сразу, чтобы Initial-события заказов пришли вместе с остальными.
+                if self.orders_refresher is not None and not self.first_request:
+                    self.orders_refresher.submit(mode, seller_delta)
+                    continue
+                events.extend(self.refresh_orders(mode, seller_delta))
+
+        if self.orders_refresher is not None:
+            # События заказов, полученные стадией обновления заказов, но еще не отданные Runner.listen.
+            events.extend(self.orders_refresher.get_events())
+        if self.first_request:
+            events = self._pack_initial_events(events)
+            self.first_request = False
+
+        return events
+
+    def _pack_initial_events(self, events: list[types.Event]) -> list[types.Event]:
+        """
+        Заменяет InitialMessageEvent / InitialOrderEvent первого запроса одним InitialSnapshotEvent
+        (если не включен режим legacy_initial_events).
+
+        :param events: события первого запроса.
+
+        :return: список событий.
+        """
+        if self.legacy_initial_events:
+            return events
+        messages = [i.message for i in events if isinstance(i, types.InitialMessageEvent)]
+        orders = [i.order for i in events if isinstance(i, types.InitialOrderEvent)]
+        other = [i for i in events if not isinstance(i, (types.InitialMessageEvent, types.InitialOrderEvent))]
+        return [types.InitialSnapshotEvent(messages, orders, self.last_message_event_tag)] + other
+
+    def _updates_request(self, message_obj: types.Message | None = None) -> tuple[dict, dict]:
+        """
+        Собирает заголовки и тело запроса к runner'у.
+
+        :param message_obj: сообщение, которое нужно отправить вместе с запросом.
+
+        :return: (заголовки, тело запроса).
+        """
         orders = {
             "type": "orders_counters",
             "id": self.account.id,
@@ -63,9 +197,17 @@ class Runner:
             "tag": self.last_message_event_tag,
             "data": False
         }
+        objects = [orders, chats]
+        if self.watched_chats is not None:
+            objects.extend({"type": "chat_node",
+                            "id": node_id,
+                            "tag": tag,
+                            "data": {"node": node_id, "last_message": last_message if last_message is not None else -1,
+                                     "content": ""}}
+                           for node_id, (tag, last_message) in self.watched_chats.items())
         payload = {
-            "objects": json.dumps([orders, chats]),
-            "request": False,
+            "objects": json.dumps(objects),
+            "request": json.dumps(self.account._message_action(message_obj)) if message_obj is not None else False,
             "csrf_token": self.account.csrf_token
         }
         headers = {
@@ -75,101 +217,237 @@ class Runner:
             "x-requested-with": "XMLHttpRequest",
             "user-agent": self.account.user_agent
         }
-        response = self.session.post(types.Links.RUNNER, headers=headers, data=payload, timeout=self.timeout,
-                                     proxies=self.account.proxy)
-        logger.debug(f"Статус-код получения данных о событиях: {response.status_code}.")
-        if response.status_code != 200:
-            raise exceptions.StatusCodeIsNot200(response.status_code)
+        return headers, payload
 
-        json_response = response.json()
-        logger.debug(f"Получены данные о событиях: {json_response}")
+    def _parse_chat_nodes(self, objects: list[dict]) -> dict[int, list[tuple[int, int, str]]]:
+        """
+        Парсит объекты chat_node ответа runner'а (отслеживаемые чаты) и обновляет их теги.
+
+        :param objects: объекты из ответа runner'а.
 
+        :return: новые сообщения отслеживаемых чатов {ID чата: [(ID сообщения, ID автора, текст)]}. Чаты, сообщения
+        которых получены впервые (еще не известен ID последнего сообщения), не возвращаются.
+        """
+        result = {}
+        if self.watched_chats is None:
+            return result
+        for obj in objects:
+            if obj.get("type") != "chat_node" or not obj.get("data"):
+                continue
+            node_id = int(obj["id"])
+            watched = self.watched_chats.get(node_id)
+            if watched is None:
+                continue
+            last_message = watched[1]
+            messages = parser.parse_chat_messages(obj["data"].get("messages") or [])
+            if last_message is not None:
+                result[node_id] = [i for i in messages if i[0] > last_message]
+            if messages:
+                last_message = max(messages[-1][0], last_message or 0)
+            self.watched_chats.set(node_id, (obj.get("tag"), last_message))
+        return result
+
+    def _parse_chat_bookmarks(self, obj: dict, chat_messages: dict[int, list[tuple[int, int, str]]] | None = None) \
+            -> list[types.Event]:
+        """
+        Парсит объект chat_bookmarks ответа runner'а.
+
+        :param obj: объект из ответа runner'а.
+
+        :param chat_messages: новые сообщения отслеживаемых чатов из того же ответа (Runner._parse_chat_nodes).
+
+        :return: список событий.
+        """
         events = []
+        if not self.first_request:
+            events.append(types.MessagesListChangedEvent(self.last_message_event_tag))
+        self.last_message_event_tag = obj.get("tag")
+        chats = parser.parse_chat_bookmarks(obj["data"]["html"])
+        self.account.update_chats(obj["data"]["html"], chats)
+        last_messages = None
+        for node_id, chat_with, message_text, unread in chats:
+            text_hash = get_text_hash(message_text)
+            saved = self.saved_messages.get(node_id)
+            history = chat_messages.get(node_id) if chat_messages else None
+            if history:
+                # Все новые сообщения чата. Свои сообщения (кроме последнего, если его отправил не бот) пропускаются,
+                # как и при работе с превью.
+                messages = [types.Message(text, node_id, chat_with, unread, True, message_id, author_id)
+                            for message_id, author_id, text in history
+                            if author_id != self.account.id or (message_id == history[-1][0] and
+                                                                (saved is None or saved[0] != text_hash))]
+            elif saved is not None and saved[0] == text_hash:
+                # Если это старое сообщение (сохранено в self.saved_messages) -> пропускаем.
+                continue
+            else:
+                messages = [types.Message(message_text, node_id, chat_with, unread, True)]
 
-        for obj in json_response["objects"]:
-            if obj.get("type") == "chat_bookmarks":
-                if not self.first_request:
-                    events.append(types.MessagesListChangedEvent(self.last_message_event_tag))
-                self.last_message_event_tag = obj.get("tag")
-                self.account.update_chats(obj["data"]["html"])
-                soup = BeautifulSoup(obj["data"]["html"], "html.parser")
-                messages = soup.find_all("a", {"class": "contact-item"})
-
-                for msg in messages:
-                    unread = True if "unread" in msg.get("class") else False
-                    node_id = int(msg["data-id"])
-                    message_text = msg.find("div", {"class": "contact-item-message"}).text
-                    # Если это старое сообщение (сохранено в self.last_messages) -> пропускаем.
-                    if node_id in self.saved_messages:
-                        last_msg = self.saved_messages[node_id]
-                        if last_msg.text == message_text:
-                            continue
-
-                    chat_with = msg.find("div", {"class": "media-user-name"}).text
-                    message_obj = types.Message(message_text, node_id, chat_with, unread, True)
-                    if self.first_request:
-                        event = types.InitialMessageEvent(message_obj, self.last_message_event_tag)
-                    else:
-                        event = types.NewMessageEvent(message_obj, self.last_message_event_tag)
-                    events.append(event)
-                    self.saved_messages[message_obj.node_id] = message_obj
+            for message_obj in messages:
+                if self.first_request:
+                    event = types.InitialMessageEvent(message_obj, self.last_message_event_tag)
+                else:
+                    event = types.NewMessageEvent(message_obj, self.last_message_event_tag)
+                events.append(event)
+            self.saved_messages.set(node_id, (text_hash, int(time.time())))
+            if self.watched_chats is not None and not self.first_request and node_id not in self.watched_chats:
+                # Отслеживание начинается с последнего сообщения чата (оно уже получено из превью), поэтому первый
+                # ответ chat_node вернет все сообщения новее него.
+                if last_messages is None:
+                    last_messages = parser.parse_chat_last_messages(obj["data"]["html"])
+                self.watched_chats.set(node_id, ("00000000", last_messages.get(node_id)))
+        return events
 
-            elif obj.get("type") == "orders_counters":
-                self.last_order_event_tag = obj.get("tag")
-                if not self.first_request:
-                    events.append(types.OrdersListChangedEvent(obj["data"]["buyer"], obj["data"]["seller"],
-                                                               self.last_order_event_tag))
-                attempts = 3
-                while attempts:
-                    try:
-                        orders_list = self.account.get_orders(include_outstanding=True, include_refund=True,
-                                                              include_completed=True)
-                        break
-                    except exceptions.StatusCodeIsNot200 as e:
-                        logger.error(e)
-                        attempts -= 1
-                        time.sleep(1)
-                    except:
-                        logger.error("Не удалось обновить список ордеров.")
-                        logger.debug("------TRACEBACK------", exc_info=True)
-                        attempts -= 1
-                        time.sleep(1)
-                if not attempts:
-                    logger.error("Не удалось обновить список ордеров: превышено кол-во попыток.")
-                    return []
-
-                for order in orders_list:
-                    if order.id not in self.saved_orders:
-                        if self.first_request:
-                            event = types.InitialOrderEvent(order, self.last_order_event_tag)
-                            events.append(event)
-                        else:
-                            event = types.NewOrderEvent(order, self.last_order_event_tag)
-                            events.append(event)
-                            if order.status == types.OrderStatuses.COMPLETED:
-                                event2 = types.OrderStatusChangedEvent(order, self.last_order_event_tag)
-                                events.append(event2)
-                        self.update_saved_order(order)
-                    elif order.status != self.saved_orders[order.id].status:
-                        event = types.OrderStatusChangedEvent(order_obj=order, tag=self.last_order_event_tag)
-                        events.append(event)
-                        self.update_saved_order(order)
+    def _parse_orders_counters(self, obj: dict) -> list[types.Event]:
+        """
+        Парсит объект orders_counters ответа runner'а.
 
-        if self.first_request:
-            self.first_request = False
+        :param obj: объект из ответа runner'а.
+
+        :return: список событий.
+        """
+        self.last_order_event_tag = obj.get("tag")
+        if not self.first_request:
+            return [types.OrdersListChangedEvent(obj["data"]["buyer"], obj["data"]["seller"],
+                                                 self.last_order_event_tag)]
+        return []
+
+    def _orders_sync_mode(self, obj: dict) -> tuple[str, int]:
+        """
+        Определяет, как нужно обновить список заказов после изменения счетчиков заказов.
+
+        :param obj: объект orders_counters из ответа runner'а.
+
+        :return: (режим, изменение кол-ва активных продаж). Режимы: "skip" - счетчики не изменились,
+        "incremental" - парсятся только заказы новее self.last_order_id, "full" - парсится вся страница заказов.
+        """
+        data = obj.get("data")
+        previous = self.orders_counters
+        current = (int(data["buyer"]), int(data["seller"])) if data else None
+        self.orders_counters = current
+        if not self.incremental_orders or self.first_request or previous is None or current is None \
+                or self.last_order_id is None:
+            return "full", 0
+
+        seller_delta = current[1] - previous[1]
+        if seller_delta < 0:
+            # Какой-то из активных заказов закрыт / возвращен. Его строка может быть где угодно на странице.
+            return "full", seller_delta
+        if current == previous:
+            return "skip", 0
+        # Изменился только счетчик покупок: новая продажа могла быть сразу закрыта (счетчик продаж не изменился),
+        # поэтому заказы новее self.last_order_id все равно проверяются.
+        return "incremental", seller_delta
+
+    def refresh_orders(self, mode: str, seller_delta: int) -> list[types.Event]:
+        """
+        Получает страницу заказов и сравнивает заказы с сохраненными.
+
+        :param mode: режим обновления (Runner._orders_sync_mode).
+
+        :param seller_delta: изменение кол-ва активных продаж.
+
+        :return: список событий (пустой, если не удалось получить страницу заказов).
+        """
+        try:
+            orders_html = self.orders_retry.call(self.account.get_orders_html,
+                                                 on_retry=retry.log_retry("обновить список ордеров", logger))
+        except Exception as e:
+            logger.error(f"Не удалось обновить список ордеров: {e}")
+            logger.debug("------TRACEBACK------", exc_info=True)
+            return []
+        return self._parse_orders_list(self._parse_orders_page(orders_html, mode, seller_delta))
+
+    def _parse_orders_page(self, orders_html: str, mode: str, seller_delta: int) -> list[types.Order]:
+        """
+        Парсит страницу заказов в зависимости от режима (Runner._orders_sync_mode) и обновляет self.last_order_id.
+
+        :param orders_html: HTML страницы заказов.
+
+        :param mode: режим обновления.
+
+        :param seller_delta: изменение кол-ва активных продаж.
+
+        :return: список заказов.
+        """
+        if mode == "incremental":
+            orders_list = parser.parse_orders(orders_html, True, True, True, stop_at=self.last_order_id,
+                                              include_html=False)
+            new_outstanding = sum(1 for i in orders_list
+                                  if i.id not in self.saved_orders and i.status == types.OrderStatuses.OUTSTANDING)
+            # Если новых активных заказов столько же, на сколько вырос счетчик продаж - старые заказы не менялись.
+            # Иначе (например, одновременно пришел новый заказ и закрылся старый) парсим всю страницу.
+            if new_outstanding == seller_delta:
+                if orders_list:
+                    self.last_order_id = orders_list[0].id
+                return orders_list
+            logger.debug("Счетчик продаж не совпал с кол-вом новых заказов, парсю всю страницу заказов.")
+
+        orders_list = parser.parse_orders(orders_html, True, True, True)
+        if orders_list:
+            self.last_order_id = orders_list[0].id
+        return orders_list
+
+    def _parse_orders_list(self, orders_list: list[types.Order]) -> list[types.Event]:
+        """
+        Сравнивает полученный список заказов с сохраненным.
 
+        :param orders_list: список заказов (Account.get_orders).
+
+        :return: список событий.
+        """
+        events = []
+        for order in orders_list:
+            if order.id not in self.saved_orders:
+                if self.first_request:
+                    event = types.InitialOrderEvent(order, self.last_order_event_tag)
+                    events.append(event)
+                else:
+                    event = types.NewOrderEvent(order, self.last_order_event_tag)
+                    events.append(event)
+                    if order.status == types.OrderStatuses.COMPLETED:
+                        event2 = types.OrderStatusChangedEvent(order, self.last_order_event_tag)
+                        events.append(event2)
+                self.update_saved_order(order)
+            elif order.status.value != self.saved_orders.get(order.id)[0]:
+                event = types.OrderStatusChangedEvent(order_obj=order, tag=self.last_order_event_tag)
+                events.append(event)
+                self.update_saved_order(order)
         return events
 
+    def send_message(self, message_obj: types.Message, timeout: float | None = None) -> dict:
+        """
+        Отправляет сообщение вместе со следующим запросом runner'а (если включен piggyback_messages), иначе -
+        отдельным запросом (Account.send_message). Если за timeout секунд ни один запрос runner'а не забрал
+        сообщение (например, Runner.listen не запущен), оно отправляется отдельным запросом.
+
+        :param message_obj: экземпляр класса, описывающий сообщение.
+
+        :param timeout: сколько секунд ждать запроса runner'а (None - Runner.timeout).
+
+        :return: ответ FunPay.
+        """
+        if self.outgoing is None:
+            return self.account.send_message(message_obj)
+        future = self.outgoing.put(message_obj)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except concurrent.futures.CancelledError:
+            # Отправка вместе с запросами runner'а отключена (Runner.stop).
+            return self.account.send_message(message_obj)
+        except concurrent.futures.TimeoutError:
+            if self.outgoing.cancel(future):
+                logger.debug("Сообщение не было отправлено вместе с запросом runner'а, отправляю отдельно.")
+                return self.account.send_message(message_obj)
+            return future.result()
+
     def update_saved_message(self, message_obj: types.Message) -> None:
         """
         Обновляет последнее сохраненное сообщение.
 
         :param message_obj: экземпляр класса, описывающего сообщение.
         """
-        message_copy = deepcopy(message_obj)
-        message_copy.text = message_copy.text.replace("[a][/a]", "")
-        message_copy.text = message_copy.text[:250]
-        self.saved_messages[message_copy.node_id] = message_copy
+        text = message_obj.text.replace("[a][/a]", "")[:250]
+        self.saved_messages.set(message_obj.node_id, (get_text_hash(text), int(time.time())))
 
     def update_saved_order(self, order: types.Order) -> None:
         """
@@ -177,25 +455,80 @@ class Runner:
 
         :param order: экземпляр класса, описывающего заказа.
         """
-        self.saved_orders[order.id] = order
+        self.saved_orders.set(order.id, (order.status.value, order.buyer_id, order.price))
+
+    def get_state(self) -> dict:
+        """
+        Возвращает состояние Runner'а (теги, счетчики заказов, сохраненные чаты и заказы) в виде, пригодном для
+        сохранения в JSON (см. Runner.set_state).
+
+        :return: состояние Runner'а.
+        """
+        return {
+            "last_message_event_tag": self.last_message_event_tag,
+            "last_order_event_tag": self.last_order_event_tag,
+            "orders_counters": self.orders_counters,
+            "last_order_id": self.last_order_id,
+            "saved_messages": [[k, v] for k, v in self.saved_messages.items()],
+            "saved_orders": [[k, v] for k, v in self.saved_orders.items()]
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        Восстанавливает состояние Runner'а, полученное Runner.get_state. Первый запрос после восстановления не
+        считается первым: Initial-события не создаются, а события создаются только для изменений.
+
+        :param state: состояние Runner'а.
+        """
+        self.last_message_event_tag = state["last_message_event_tag"]
+        self.last_order_event_tag = state["last_order_event_tag"]
+        self.orders_counters = tuple(state["orders_counters"]) if state["orders_counters"] else None
+        self.last_order_id = state["last_order_id"]
+        for key, value in state["saved_messages"]:
+            self.saved_messages.set(key, tuple(value))
+        for key, value in state["saved_orders"]:
+            self.saved_orders.set(key, tuple(value))
+        self.first_request = False
 
-    def listen(self, delay: float | int = 6.0, ignore_exceptions: bool = True) \
-            -> Iterator[types.Event]:
+    def stop(self) -> None:
+        """
+        Останавливает получение событий (вызывается перед сохранением снимка состояния): Runner.listen больше не
+        отправляет запросы и не отдает события, но и не завершается. Сообщения, ожидающие отправки вместе с запросом
+        runner'а, и новые сообщения отправляются отдельными запросами.
+        """
+        with self.state_lock:
+            self.listening.clear()
+        if self.outgoing is not None:
+            self.outgoing.close()
+        if self.orders_refresher is not None:
+            self.orders_refresher.wake()
+
+    def listen(self, delay: float | int = 6.0, ignore_exceptions: bool = True,
+               adaptive_delay: AdaptiveDelay | None = None) -> Iterator[types.Event]:
         """
         "Слушает" FunPay в ожидании новых событий.
 
-        :param delay: задержка между запросами.
+        :param delay: задержка между запросами (если adaptive_delay не передан).
 
         :param ignore_exceptions: игнорировать ошибки при выполнении запросов.
+
+        :param adaptive_delay: адаптивная задержка между запросами. Если передана - delay игнорируется.
         """
         if not self.account.is_authorized():
             raise exceptions.NotAuthorized()
 
+        orders_events = []  # События заказов, отданные во время ожидания перед текущим запросом.
         while True:
+            self.listening.wait()
+            started = time.monotonic()
+            updates = []
             try:
-                updates = self.get_updates()
-                for event in updates:
-                    yield event
+                with self.state_lock:
+                    if not self.listening.is_set():
+                        continue
+                    updates = self.get_updates()
+                    for event in updates:
+                        yield event
             except Exception as e:
                 if not ignore_exceptions:
                     raise e
@@ -203,4 +536,307 @@ class Runner:
                     logger.error("Произошла ошибка при получении событий "
                                  "(ничего страшного, если это сообщение появляется нечасто).")
                     logger.debug("------TRACEBACK------", exc_info=True)
-            time.sleep(delay)
+
+            sleep_until = time.monotonic() + self._get_sleep_time(delay, adaptive_delay, orders_events + updates,
+                                                                  started)
+            orders_events = []
+            if self.orders_refresher is None:
+                if self.outgoing is not None:
+                    self.outgoing.wait(max(0.0, sleep_until - time.monotonic()))
+                else:
+                    time.sleep(max(0.0, sleep_until - time.monotonic()))
+                continue
+            # Во время ожидания отдаем события заказов, как только стадия обновления заказов их получит.
+            # Если появилось исходящее сообщение - ожидание прерывается.
+            while time.monotonic() < sleep_until and not (self.outgoing is not None and len(self.outgoing)):
+                self.orders_refresher.wait(sleep_until - time.monotonic())
+                with self.state_lock:
+                    if not self.listening.is_set():
+                        break
+                    events = self.orders_refresher.get_events()
+                    orders_events.extend(events)
+                    for event in events:
+                        yield event
+
+    def _get_sleep_time(self, delay: float | int, adaptive_delay: AdaptiveDelay | None, updates: list[types.Event],
+                        started: float) -> float:
+        """
+        Считает, сколько нужно спать до следующего запроса: задержка минус время, прошедшее с начала текущего
+        запроса (сам запрос, ожидание ограничителя и обработка событий).
+
+        :return: время сна (в секундах).
+        """
+        if adaptive_delay is not None:
+            delay = adaptive_delay.next(updates, self.transport.limiter.get_interval("runner"))
+        return max(0.0, delay - (time.monotonic() - started))
+
+
+def get_text_hash(text: str) -> int:
+    """
+    Считает хэш текста сообщения (стабильный между запусками, в отличие от hash()).
+
+    :param text: текст сообщения.
+
+    :return: 64-битный хэш.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+class LRUStore:
+    """
+    Ограниченное потокобезопасное хранилище: если записей больше capacity, удаляются записи, к которым дольше всего
+    не обращались (Runner хранит в нем компактные отпечатки чатов и заказов, а не сами объекты).
+    """
+    def __init__(self, capacity: int):
+        """
+        :param capacity: максимальное кол-во записей.
+        """
+        self.capacity = capacity
+        self.data: OrderedDict[Hashable, tuple] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, default: tuple | None = None) -> tuple | None:
+        """
+        :return: запись (запись становится самой "свежей") или default, если записи нет.
+        """
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key: Hashable, value: tuple) -> None:
+        """
+        Сохраняет запись и удаляет самые старые записи, если хранилище переполнено.
+        """
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.capacity:
+                self.data.popitem(last=False)
+
+    def items(self) -> list[tuple[Hashable, tuple]]:
+        """
+        :return: все записи (от старых к новым).
+        """
+        with self.lock:
+            return list(self.data.items())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+class OrdersRefresher:
+    """
+    Стадия обновления списка заказов. Работает в отдельном потоке, чтобы получение страницы заказов (вместе с
+    повторными попытками) не задерживало события сообщений. Изменения счетчиков заказов, пришедшие до начала
+    обновления, объединяются в одно обновление.
+    """
+    def __init__(self, runner: Runner):
+        """
+        :param runner: экземпляр Runner'а.
+        """
+        self.runner = runner
+        self.condition = threading.Condition()
+        self.pending: tuple[str, int] | None = None  # (режим, изменение кол-ва активных продаж)
+        self.events: list[types.Event] = []
+        self.woken = False
+        # Удерживается во время обновления списка заказов (см. Cardinal.save_snapshot).
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+
+    def submit(self, mode: str, seller_delta: int) -> None:
+        """
+        Планирует обновление списка заказов. Если обновление уже запланировано, но еще не началось - изменения
+        объединяются: изменения кол-ва активных продаж суммируются, а полное обновление важнее инкрементального.
+
+        :param mode: режим обновления (Runner._orders_sync_mode).
+
+        :param seller_delta: изменение кол-ва активных продаж.
+        """
+        with self.condition:
+            if self.pending is not None:
+                pending_mode, pending_delta = self.pending
+                mode = "full" if "full" in (mode, pending_mode) else "incremental"
+                seller_delta += pending_delta
+                logger.debug("Обновление списка ордеров уже запланировано, объединяю изменения счетчиков.")
+            self.pending = (mode, seller_delta)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.loop, daemon=True, name="OrdersRefresher")
+                self.thread.start()
+            self.condition.notify_all()
+
+    def loop(self) -> None:
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                mode, seller_delta = self.pending
+                self.pending = None
+            with self.lock:
+                try:
+                    events = self.runner.refresh_orders(mode, seller_delta)
+                except Exception:
+                    logger.error("Произошла ошибка при обновлении списка ордеров.")
+                    logger.debug("------TRACEBACK------", exc_info=True)
+                    continue
+                if events:
+                    with self.condition:
+                        self.events.extend(events)
+                        self.condition.notify_all()
+
+    def wake(self) -> None:
+        """
+        Прерывает ожидание OrdersRefresher.wait.
+        """
+        with self.condition:
+            self.woken = True
+            self.condition.notify_all()
+
+    def wait(self, timeout: float | None = None) -> None:
+        """
+        Ждет событий заказов (или вызова OrdersRefresher.wake).
+
+        :param timeout: максимальное время ожидания (None - без ограничения).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.events or self.woken, timeout)
+            self.woken = False
+
+    def get_events(self) -> list[types.Event]:
+        """
+        Забирает события заказов, полученные стадией.
+
+        :return: список событий.
+        """
+        with self.condition:
+            events, self.events = self.events, []
+        return events
+
+
+class OutgoingMessages:
+    """
+    Очередь сообщений, которые отправляются вместе с запросами runner'а (по одному сообщению на запрос).
+    """
+    def __init__(self, orders_refresher: OrdersRefresher | None = None):
+        """
+        :param orders_refresher: стадия обновления заказов, ожидание событий которой нужно прерывать при появлении
+        нового сообщения.
+        """
+        self.orders_refresher = orders_refresher
+        self.condition = threading.Condition()
+        self.queue: deque[tuple[types.Message, Future]] = deque()
+        self.closed = False
+
+    def put(self, message_obj: types.Message) -> Future:
+        """
+        Ставит сообщение в очередь и прерывает ожидание Runner.listen.
+
+        :return: future, результат которого - ответ FunPay (отмененный, если очередь закрыта).
+        """
+        future = Future()
+        with self.condition:
+            if self.closed:
+                future.cancel()
+                return future
+            self.queue.append((message_obj, future))
+            self.condition.notify_all()
+        if self.orders_refresher is not None:
+            self.orders_refresher.wake()
+        return future
+
+    def take(self) -> tuple[types.Message, Future] | None:
+        """
+        Забирает первое сообщение из очереди.
+
+        :return: (сообщение, future) или None, если очередь пуста.
+        """
+        with self.condition:
+            return self.queue.popleft() if self.queue else None
+
+    def cancel(self, future: Future) -> bool:
+        """
+        Убирает сообщение из очереди, если его еще не забрал запрос runner'а.
+
+        :return: True, если сообщение убрано из очереди.
+        """
+        with self.condition:
+            for i in self.queue:
+                if i[1] is future:
+                    self.queue.remove(i)
+                    return True
+            return False
+
+    def close(self) -> None:
+        """
+        Закрывает очередь: отменяет сообщения из очереди (их отправляют отдельными запросами, см. Runner.send_message)
+        и отменяет все новые сообщения.
+        """
+        with self.condition:
+            self.closed = True
+            queue, self.queue = self.queue, deque()
+            self.condition.notify_all()
+        for _, future in queue:
+            future.cancel()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Ждет появления сообщения в очереди.
+
+        :return: True, если в очереди есть сообщение.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: bool(self.queue), timeout)
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.queue)
+
+
+class AdaptiveDelay:
+    """
+    Адаптивная задержка между запросами runner'а: после нового сообщения / заказа runner опрашивается с минимальной
+    задержкой в течение active_window секунд, после чего задержка постепенно увеличивается до максимальной.
+    """
+    def __init__(self, min_delay: float = 0.5, max_delay: float = 30.0, active_window: float = 30.0,
+                 backoff: float = 1.5):
+        """
+        :param min_delay: задержка во время активности.
+
+        :param max_delay: максимальная задержка (при простое).
+
+        :param active_window: сколько секунд после последнего события опрашивать runner с минимальной задержкой.
+
+        :param backoff: во сколько раз задержка увеличивается после каждого запроса без событий (после окончания
+        active_window).
+        """
+        self.min_delay = min_delay
+        self.max_delay = max(max_delay, min_delay)
+        self.active_window = active_window
+        self.backoff = backoff
+
+        self.current = min_delay
+        self.last_activity: float | None = None
+
+    def next(self, updates: list[types.Event], min_interval: float = 0.0) -> float:
+        """
+        Считает задержку перед следующим запросом.
+
+        :param updates: события, полученные последним запросом.
+
+        :param min_interval: минимальный интервал между запросами, разрешенный ограничителем частоты запросов.
+
+        :return: задержка (в секундах).
+        """
+        now = time.monotonic()
+        if any(isinstance(i, (types.NewMessageEvent, types.NewOrderEvent)) for i in updates):
+            self.last_activity = now
+
+        if self.last_activity is not None and now - self.last_activity < self.active_window:
+            self.current = self.min_delay
+        else:
+            self.current = min(self.max_delay, self.current * self.backoff)
+        return max(self.current, min_interval)
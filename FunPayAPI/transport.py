@@ -0,0 +1,166 @@
+"""
+В данном модуле написан HTTP транспорт, через который FunPayAPI отправляет все запросы к FunPay.
+"""
+
+from requests.adapters import HTTPAdapter
+import requests
+import logging
+
+from .limiter import RateLimiter, Priority
+from .retry import CircuitBreaker
+
+
+logger = logging.getLogger("FunPayAPI.transport")
+
+
+ENDPOINTS = ("runner", "message", "account", "orders", "user", "chat", "category", "lot", "raise", "refund")
+"""Типы запросов, которые отправляет FunPayAPI (используются для выбора тайм-аута)."""
+
+
+def get_retry_after(headers) -> float | None:
+    """
+    :return: значение заголовка Retry-After (в секундах) или None, если заголовка нет / он не в секундах.
+    """
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Transport:
+    """
+    Класс HTTP транспорта. Держит пул keep-alive соединений (requests.Session), общий для Account, Runner'а и
+    плагинов, чтобы не устанавливать новое TCP+TLS соединение (через прокси) на каждый запрос.
+    """
+    def __init__(self, timeout: float | int = 10.0, proxy: dict | None = None,
+                 pool_connections: int = 4, pool_maxsize: int = 16, keep_alive: bool = True,
+                 endpoint_timeouts: dict[str, float] | None = None, limiter: RateLimiter | None = None,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        :param timeout: тайм-аут ожидания ответа на запросы, для которых не указан отдельный тайм-аут.
+
+        :param proxy: HTTP/S прокси.
+
+        :param pool_connections: кол-во хостов, для которых хранятся пулы соединений.
+
+        :param pool_maxsize: максимальное кол-во соединений в пуле одного хоста (должно быть не меньше кол-ва
+        потоков, одновременно отправляющих запросы).
+
+        :param keep_alive: переиспользовать ли соединения между запросами.
+
+        :param endpoint_timeouts: тайм-ауты для отдельных типов запросов {"тип запроса": тайм-аут}
+        (типы запросов перечислены в ENDPOINTS). Для остальных типов используется timeout.
+
+        :param limiter: ограничитель частоты запросов. Если не передан - создается ограничитель с лимитами по
+        умолчанию.
+
+        :param failure_threshold: кол-во ошибок подряд (нет ответа / статус-код 5xx), после которого запросы данного
+        типа временно не отправляются (см. retry.CircuitBreaker).
+
+        :param reset_timeout: пауза (в секундах) перед пробным запросом после срабатывания circuit breaker'а.
+        """
+        self.timeout = timeout
+        self.proxy = proxy if proxy is not None else {}
+        self.keep_alive = keep_alive
+        self.endpoint_timeouts = dict(endpoint_timeouts) if endpoint_timeouts else {}
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: dict[str | None, CircuitBreaker] = {}
+
+        self.session = requests.session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if not keep_alive:
+            self.session.headers["connection"] = "close"
+
+    def get_timeout(self, endpoint: str | None) -> float:
+        """
+        Возвращает тайм-аут для указанного типа запроса.
+
+        :param endpoint: тип запроса (один из ENDPOINTS).
+
+        :return: тайм-аут.
+        """
+        if endpoint is None:
+            return self.timeout
+        return self.endpoint_timeouts.get(endpoint, self.timeout)
+
+    def get_breaker(self, endpoint: str | None) -> CircuitBreaker:
+        """
+        :return: circuit breaker указанного типа запроса.
+        """
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+        return self.breakers[endpoint]
+
+    def request(self, method: str, url: str, endpoint: str | None = None, priority: Priority | None = None,
+                **kwargs) -> requests.Response:
+        """
+        Отправляет запрос через общий пул соединений (предварительно дождавшись разрешения ограничителя частоты
+        запросов).
+
+        :param method: HTTP метод.
+
+        :param url: ссылка.
+
+        :param endpoint: тип запроса (для выбора тайм-аута и лимита).
+
+        :param priority: приоритет запроса. Если не передан - определяется по типу запроса.
+
+        :param kwargs: аргументы для requests.Session.request (headers, data, params и т.д.).
+        Если не указаны timeout / proxies - используются значения транспорта.
+
+        :return: ответ сервера.
+
+        :raises exceptions.CircuitBreakerOpen: если запросы данного типа временно не отправляются.
+        """
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.get_timeout(endpoint)
+        if kwargs.get("proxies") is None:
+            kwargs["proxies"] = self.proxy
+        breaker = self.get_breaker(endpoint)
+        breaker.before_request()
+        try:
+            self.limiter.acquire(endpoint, priority)
+            response = self.session.request(method, url, **kwargs)
+        except BaseException:
+            # В том числе KeyboardInterrupt / SystemExit: иначе пробный запрос полуоткрытого предохранителя так и
+            # останется "выполняющимся".
+            breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        self.limiter.feedback(endpoint, response.status_code, get_retry_after(response.headers))
+        return response
+
+    def get(self, url: str, endpoint: str | None = None, **kwargs) -> requests.Response:
+        """
+        Отправляет GET запрос. Аргументы аналогичны Transport.request.
+        """
+        return self.request("get", url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str | None = None, **kwargs) -> requests.Response:
+        """
+        Отправляет POST запрос. Аргументы аналогичны Transport.request.
+        """
+        return self.request("post", url, endpoint, **kwargs)
+
+    def set_proxy(self, proxy: dict | None) -> None:
+        """
+        Меняет прокси транспорта. Старые соединения закрываются.
+
+        :param proxy: HTTP/S прокси.
+        """
+        self.proxy = proxy if proxy is not None else {}
+        self.session.close()
+
+    def close(self) -> None:
+        """
+        Закрывает все соединения пула.
+        """
+        self.session.close()
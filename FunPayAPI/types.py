@@ -5,6 +5,7 @@ from __future__ import annotations
 
 from enum import Enum
 import time
+import sys
 import re
 
 
@@ -17,6 +18,7 @@ class Links:
     USER = "https://funpay.com/users"
     RAISE = "https://funpay.com/lots/raise"
     RUNNER = "https://funpay.com/runner/"
+    CHAT = "https://funpay.com/chat/"
     REFUND = "https://funpay.com/orders/refund"
 
 
@@ -45,6 +47,9 @@ class EventTypes(Enum):
     ORDER_STATUS_CHANGED = 6
     """Статус заказа изменился."""
 
+    INITIAL_SNAPSHOT = 7
+    """Все чаты и заказы, обнаруженные при первом запросе Runner'а (одним событием)."""
+
 
 class SystemMessageTypes(Enum):
     """
@@ -93,49 +98,87 @@ class SystemMessageTypes(Enum):
     """Вы можете перейти в Discord. Внимание: общение за пределами сервера FunPay считается нарушением правил."""
 
 
-class SystemMessageRes(object):
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(cls, "instance"):
-            cls.instance = super(SystemMessageRes, cls).__new__(cls)
-        return getattr(cls, "instance")
+class SystemMessageRes:
+    """
+    Регулярные выражения системных сообщений (компилируются один раз, при импорте модуля).
+    """
+    ORDER_PURCHASED_RE_1 = re.compile(r"Покупатель [a-zA-Z0-9]+ оплатил заказ #[A-Z0-9]{8}\.")
 
-    def __init__(self):
-        self.ORDER_PURCHASED_RE_1 = re.compile(r"Покупатель [a-zA-Z0-9]+ оплатил заказ #[A-Z0-9]{8}\.")
+    ORDER_PURCHASED_RE_2 = re.compile(r"[a-zA-Z0-9]+, не забудьте потом нажать кнопку "
+                                      r"«Подтвердить выполнение заказа»\.")
 
-        self.ORDER_PURCHASED_RE_2 = re.compile(r"[a-zA-Z0-9]+, не забудьте потом нажать кнопку "
-                                               r"«Подтвердить выполнение заказа»\.")
+    ORDER_CONFIRMED_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ подтвердил успешное выполнение "
+                                    r"заказа #[A-Z0-9]{8} и отправил деньги продавцу [a-zA-Z0-9]+\.")
 
-        self.ORDER_CONFIRMED_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ подтвердил успешное выполнение "
-                                             r"заказа #[A-Z0-9]{8} и отправил деньги продавцу [a-zA-Z0-9]+\.")
+    NEW_FEEDBACK_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ написал отзыв к заказу #[A-Z0-9]{8}\.")
 
-        self.NEW_FEEDBACK_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ написал отзыв к заказу #[A-Z0-9]{8}\.")
+    FEEDBACK_CHANGED_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ изменил отзыв к заказу #[A-Z0-9]{8}\.")
 
-        self.FEEDBACK_CHANGED_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ изменил отзыв к заказу #[A-Z0-9]{8}\.")
+    FEEDBACK_DELETED_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ удалил отзыв к заказу #[A-Z0-9]{8}\.")
 
-        self.FEEDBACK_DELETED_RE = re.compile(r"Покупатель [a-zA-Z0-9]+ удалил отзыв к заказу #[A-Z0-9]{8}\.")
+    NEW_FEEDBACK_ANSWER_RE = re.compile(r"Продавец [a-zA-Z0-9]+ ответил на отзыв к заказу #[A-Z0-9]{8}\.")
 
-        self.NEW_FEEDBACK_ANSWER_RE = re.compile(r"Продавец [a-zA-Z0-9]+ ответил на отзыв к заказу #[A-Z0-9]{8}\.")
+    FEEDBACK_ANSWER_CHANGED_RE = re.compile(r"Продавец [a-zA-Z0-9]+ изменил ответ на отзыв к "
+                                            r"заказу #[A-Z0-9]{8}\.")
 
-        self.FEEDBACK_ANSWER_CHANGED_RE = re.compile(r"Продавец [a-zA-Z0-9]+ изменил ответ на отзыв к "
-                                                     r"заказу #[A-Z0-9]{8}\.")
+    FEEDBACK_ANSWER_DELETED_RE = re.compile(r"Продавец [a-zA-Z0-9]+ удалил ответ на отзыв к заказу "
+                                            r"#[A-Z0-9]{8}\.")
 
-        self.FEEDBACK_ANSWER_DELETED_RE = re.compile(r"Продавец [a-zA-Z0-9]+ удалил ответ на отзыв к заказу "
-                                                     r"#[A-Z0-9]{8}\.")
+    ORDER_REOPENED_RE = re.compile(r"Заказ #[A-Z0-9]{8} открыт повторно\.")
 
-        self.ORDER_REOPENED_RE = re.compile(r"Заказ #[A-Z0-9]{8} открыт повторно\.")
+    REFUND_RE = re.compile(r"Продавец [a-zA-Z0-9]+ вернул деньги покупателю [a-zA-Z0-9]+ "
+                           r"по заказу #[A-Z0-9]{8}\.")
 
-        self.REFUND_RE = re.compile(r"Продавец [a-zA-Z0-9]+ вернул деньги покупателю [a-zA-Z0-9]+ "
-                                    r"по заказу #[A-Z0-9]{8}\.")
+    PARTIAL_REFUND_RE = re.compile(r"Часть средств по заказу #[A-Z0-9]{8} возвращена покупателю\.")
 
-        self.PARTIAL_REFUND_RE = re.compile(r"Часть средств по заказу #[A-Z0-9]{8} возвращена покупателю\.")
+    ORDER_CONFIRMED_BY_ADMIN_RE = re.compile(r"Администратор [a-zA-Z0-9]+ подтвердил успешное выполнение "
+                                             r"заказа #[A-Z0-9]{8} и отправил деньги продавцу [a-zA-Z0-9]+\.")
 
-        self.ORDER_CONFIRMED_BY_ADMIN_RE = re.compile(r"Администратор [a-zA-Z0-9]+ подтвердил успешное выполнение "
-                                                      r"заказа #[A-Z0-9]{8} и отправил деньги продавцу [a-zA-Z0-9]+\.")
+    DISCORD = "Вы можете перейти в Discord. " \
+              "Внимание: общение за пределами сервера FunPay считается нарушением правил."
 
-        self.DISCORD = "Вы можете перейти в Discord. " \
-                       "Внимание: общение за пределами сервера FunPay считается нарушением правил."
+    ORDER_ID_RE = re.compile(r"#[A-Z0-9]{8}")
 
-        self.ORDER_ID_RE = re.compile(r"#[A-Z0-9]{8}")
+
+SYSTEM_MESSAGE_PREFIXES = ("Покупатель ", "Продавец ", "Администратор ", "Заказ ", "Часть ", "Вы можете ")
+"""Слова, с которых начинаются все системные сообщения. Остальные сообщения отсеиваются без регулярных выражений."""
+
+SYSTEM_MESSAGE_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in (
+    ("ORDER_PURCHASED", r"Покупатель [a-zA-Z0-9]+ оплатил заказ #[A-Z0-9]{8}\..*?[a-zA-Z0-9]+, не забудьте потом "
+                        r"нажать кнопку «Подтвердить выполнение заказа»\."),
+    ("ORDER_CONFIRMED", r"Покупатель [a-zA-Z0-9]+ подтвердил успешное выполнение заказа #[A-Z0-9]{8} и отправил "
+                        r"деньги продавцу [a-zA-Z0-9]+\."),
+    ("NEW_FEEDBACK", r"Покупатель [a-zA-Z0-9]+ написал отзыв к заказу #[A-Z0-9]{8}\."),
+    ("FEEDBACK_CHANGED", r"Покупатель [a-zA-Z0-9]+ изменил отзыв к заказу #[A-Z0-9]{8}\."),
+    ("FEEDBACK_DELETED", r"Покупатель [a-zA-Z0-9]+ удалил отзыв к заказу #[A-Z0-9]{8}\."),
+    ("NEW_FEEDBACK_ANSWER", r"Продавец [a-zA-Z0-9]+ ответил на отзыв к заказу #[A-Z0-9]{8}\."),
+    ("FEEDBACK_ANSWER_CHANGED", r"Продавец [a-zA-Z0-9]+ изменил ответ на отзыв к заказу #[A-Z0-9]{8}\."),
+    ("FEEDBACK_ANSWER_DELETED", r"Продавец [a-zA-Z0-9]+ удалил ответ на отзыв к заказу #[A-Z0-9]{8}\."),
+    ("REFUND", r"Продавец [a-zA-Z0-9]+ вернул деньги покупателю [a-zA-Z0-9]+ по заказу #[A-Z0-9]{8}\."),
+    ("ORDER_CONFIRMED_BY_ADMIN", r"Администратор [a-zA-Z0-9]+ подтвердил успешное выполнение заказа #[A-Z0-9]{8} "
+                                 r"и отправил деньги продавцу [a-zA-Z0-9]+\."),
+    ("ORDER_REOPENED", r"Заказ #[A-Z0-9]{8} открыт повторно\."),
+    ("PARTIAL_REFUND", r"Часть средств по заказу #[A-Z0-9]{8} возвращена покупателю\."),
+    ("DISCORD", re.escape(SystemMessageRes.DISCORD) + r"\Z")
+)), re.DOTALL)
+"""Общее регулярное выражение всех системных сообщений. Имя сработавшей группы - имя типа в SystemMessageTypes."""
+
+
+def get_system_message_type(text: str | None) -> SystemMessageTypes:
+    """
+    Определяет тип системного сообщения за один проход: сообщения, не начинающиеся с SYSTEM_MESSAGE_PREFIXES,
+    сразу считаются обычными, остальные сверяются с SYSTEM_MESSAGE_RE.
+
+    :param text: текст сообщения.
+
+    :return: тип системного сообщения.
+    """
+    if not text or not text.startswith(SYSTEM_MESSAGE_PREFIXES):
+        return SystemMessageTypes.NON_SYSTEM
+    match = SYSTEM_MESSAGE_RE.match(text)
+    if match is None:
+        return SystemMessageTypes.NON_SYSTEM
+    return SystemMessageTypes[match.lastgroup]
 
 
 class CategoryTypes(Enum):
@@ -167,15 +210,18 @@ class Order:
     """
     Класс, хранящий информацию о заказе.
     """
-    def __init__(self, html: str,
+    __slots__ = ("html", "id", "title", "price", "buyer_username", "buyer_id", "status", "date")
+
+    def __init__(self, html: str | None,
                  id_: str,
                  title: str,
                  price: float,
                  buyer_username: str,
                  buyer_id: int,
-                 status: OrderStatuses):
+                 status: OrderStatuses,
+                 date: int | None = None):
         """
-        :param html: HTML код заказа.
+        :param html: HTML код заказа (None, если заказ получен без HTML).
 
         :param id_: ID заказа.
 
@@ -188,22 +234,41 @@ class Order:
         :param buyer_id: ID покупателя.
 
         :param status: статус заказа.
+
+        :param date: временная метка создания заказа (None, если неизвестна).
         """
         self.html = html
         self.id = id_
-        self.title = title
+        self.title = sys.intern(title) if isinstance(title, str) else title
         self.price = price
-        self.buyer_username = buyer_username
+        self.buyer_username = sys.intern(buyer_username) if isinstance(buyer_username, str) else buyer_username
         self.buyer_id = buyer_id
         self.status = status
+        self.date = date
+
+    def to_tuple(self) -> tuple:
+        """
+        :return: заказ в виде кортежа (без HTML; статус - значением): (id, title, price, buyer_username, buyer_id,
+        status, date).
+        """
+        return self.id, self.title, self.price, self.buyer_username, self.buyer_id, self.status.value, self.date
+
+    @classmethod
+    def from_tuple(cls, data: tuple | list) -> Order:
+        """
+        Создает заказ из кортежа, полученного Order.to_tuple.
+        """
+        return cls(None, data[0], data[1], data[2], data[3], data[4], OrderStatuses(data[5]), data[6])
 
 
 class Message:
     """
     Класс, хранящий информацию о сообщении.
     """
+    __slots__ = ("node_id", "text", "chat_with", "unread", "_sys_type", "id", "author_id")
+
     def __init__(self, text: str, node_id: int, chat_with: str | None, unread: bool = False,
-                 set_sys_type: bool = False):
+                 set_sys_type: bool = False, id_: int | None = None, author_id: int | None = None):
         """
         :param text: текст сообщения.
 
@@ -213,54 +278,64 @@ class Message:
 
         :param unread: установлен ли флаг "unread" у чата, в котором получено сообщение (на момент получения сообщения)
 
-        :param set_sys_type: устанавливать ли тип системного сообщения (не нужно, если сообщение отправляется ботом)
+        :param set_sys_type: определять ли тип системного сообщения (не нужно, если сообщение отправляется ботом).
+        Тип определяется лениво - при первом обращении к Message.sys_type.
+
+        :param id_: ID сообщения (None, если сообщение получено из превью списка чатов).
+
+        :param author_id: ID автора сообщения (0 - FunPay, None - неизвестен).
         """
         self.node_id: int = node_id
         self.text: str = text
-        self.chat_with: str = chat_with
+        self.chat_with: str = sys.intern(chat_with) if isinstance(chat_with, str) else chat_with
         self.unread: bool = unread
-        self.sys_type: SystemMessageTypes | None = self.get_system_type() if set_sys_type else None
+        self._sys_type: SystemMessageTypes | None | bool = set_sys_type or None
+        self.id: int | None = id_
+        self.author_id: int | None = author_id
+
+    @property
+    def sys_type(self) -> SystemMessageTypes | None:
+        """
+        Тип системного сообщения (None, если тип не определялся).
+        """
+        if self._sys_type is True:
+            self._sys_type = self.get_system_type()
+        return self._sys_type
+
+    @sys_type.setter
+    def sys_type(self, value: SystemMessageTypes | None) -> None:
+        self._sys_type = value
+
+    def to_tuple(self) -> tuple:
+        """
+        :return: сообщение в виде кортежа (тип системного сообщения - значением или None):
+        (text, node_id, chat_with, unread, sys_type, id, author_id).
+        """
+        return self.text, self.node_id, self.chat_with, self.unread, \
+            self.sys_type.value if self.sys_type is not None else None, self.id, self.author_id
+
+    @classmethod
+    def from_tuple(cls, data: tuple | list) -> Message:
+        """
+        Создает сообщение из кортежа, полученного Message.to_tuple.
+        """
+        message = cls(data[0], data[1], data[2], data[3], id_=data[5], author_id=data[6])
+        message.sys_type = SystemMessageTypes(data[4]) if data[4] is not None else None
+        return message
 
     def get_system_type(self) -> SystemMessageTypes:
         """
         Определяет тип системного сообщения.
         """
-        res = SystemMessageRes()
-        if self.text == res.DISCORD:
-            return SystemMessageTypes.DISCORD
-
-        if res.ORDER_PURCHASED_RE_1.findall(self.text) and res.ORDER_PURCHASED_RE_2.findall(self.text):
-            return SystemMessageTypes.ORDER_PURCHASED
-
-        if res.ORDER_ID_RE.search(self.text) is None:
-            return SystemMessageTypes.NON_SYSTEM
-
-        # регулярки выставлены в порядке от самых часто-используемых до самых редко-используемых
-        sys_msg_types = {
-            SystemMessageTypes.ORDER_CONFIRMED: res.ORDER_CONFIRMED_RE,
-            SystemMessageTypes.NEW_FEEDBACK: res.NEW_FEEDBACK_RE,
-            SystemMessageTypes.NEW_FEEDBACK_ANSWER: res.NEW_FEEDBACK_ANSWER_RE,
-            SystemMessageTypes.FEEDBACK_CHANGED: res.FEEDBACK_CHANGED_RE,
-            SystemMessageTypes.FEEDBACK_DELETED: res.FEEDBACK_DELETED_RE,
-            SystemMessageTypes.REFUND: res.REFUND_RE,
-            SystemMessageTypes.FEEDBACK_ANSWER_CHANGED: res.FEEDBACK_ANSWER_CHANGED_RE,
-            SystemMessageTypes.FEEDBACK_ANSWER_DELETED: res.FEEDBACK_ANSWER_DELETED_RE,
-            SystemMessageTypes.ORDER_CONFIRMED_BY_ADMIN: res.ORDER_CONFIRMED_BY_ADMIN_RE,
-            SystemMessageTypes.PARTIAL_REFUND: res.PARTIAL_REFUND_RE,
-            SystemMessageTypes.ORDER_REOPENED: res.ORDER_REOPENED_RE
-        }
-
-        for i in sys_msg_types:
-            if sys_msg_types[i].search(self.text):
-                return i
-        else:
-            return SystemMessageTypes.NON_SYSTEM
+        return get_system_message_type(self.text)
 
 
 class Lot:
     """
     Класс, описывающий лот.
     """
+    __slots__ = ("category_id", "game_id", "id", "title", "price")
+
     def __init__(self,
                  category_id: int,
                  game_id: int | None,
@@ -282,14 +357,29 @@ class Lot:
         self.category_id = category_id
         self.game_id = game_id
         self.id = id_
-        self.title = title
+        self.title = sys.intern(title) if isinstance(title, str) else title
         self.price = price
 
+    def to_tuple(self) -> tuple:
+        """
+        :return: лот в виде кортежа: (category_id, game_id, id, title, price).
+        """
+        return self.category_id, self.game_id, self.id, self.title, self.price
+
+    @classmethod
+    def from_tuple(cls, data: tuple | list) -> Lot:
+        """
+        Создает лот из кортежа, полученного Lot.to_tuple.
+        """
+        return cls(*data)
+
 
 class Category:
     """
     Класс, описывающий категорию.
     """
+    __slots__ = ("id", "game_id", "title", "edit_lots_link", "public_link", "type")
+
     def __init__(self, id_: int, game_id: int | None, title: str, edit_lots_link: str, public_link: str,
                  type_: CategoryTypes):
         """
@@ -312,11 +402,26 @@ class Category:
         self.public_link = public_link
         self.type = type_
 
+    def to_tuple(self) -> tuple:
+        """
+        :return: категория в виде кортежа (тип - значением): (id, game_id, title, edit_lots_link, public_link, type).
+        """
+        return self.id, self.game_id, self.title, self.edit_lots_link, self.public_link, self.type.value
+
+    @classmethod
+    def from_tuple(cls, data: tuple | list) -> Category:
+        """
+        Создает категорию из кортежа, полученного Category.to_tuple.
+        """
+        return cls(data[0], data[1], data[2], data[3], data[4], CategoryTypes(data[5]))
+
 
 class Event:
     """
     Базовый класс события.
     """
+    __slots__ = ("type", "time", "tag")
+
     def __init__(self, event_type: EventTypes, event_time: int, tag: str | None):
         """
         :param event_type: тип события.
@@ -334,6 +439,8 @@ class InitialMessageEvent(Event):
     """
     Класс события: обнаружено новое сообщение (при первом запросе Runner'а).
     """
+    __slots__ = ("message",)
+
     def __init__(self, message_obj: Message, tag: str):
         """
         :param message_obj: экземпляр класса, описывающий сообщение.
@@ -348,6 +455,8 @@ class MessagesListChangedEvent(Event):
     """
     Класс события: список чатов и/или содержимое одного/нескольких чатов изменилось.
     """
+    __slots__ = ()
+
     def __init__(self, tag: str):
         """
         :param tag: тэг runner'а.
@@ -359,6 +468,8 @@ class NewMessageEvent(Event):
     """
     Класс события: в чате обнаружено новое сообщение.
     """
+    __slots__ = ("message",)
+
     def __init__(self, message_obj: Message, tag: str | None):
         """
         :param message_obj: экземпляр класса, описывающий сообщение.
@@ -373,6 +484,8 @@ class InitialOrderEvent(Event):
     """
     Класс события: обнаружен новый заказ (при первом запросе Runner'а).
     """
+    __slots__ = ("order",)
+
     def __init__(self, order_obj: Order, tag: str):
         """
         :param order_obj: экземпляр класса, описывающий заказ.
@@ -383,10 +496,32 @@ class InitialOrderEvent(Event):
         self.order = order_obj
 
 
+class InitialSnapshotEvent(Event):
+    """
+    Класс события: все чаты и заказы, обнаруженные при первом запросе Runner'а. Заменяет отдельные
+    InitialMessageEvent / InitialOrderEvent (если Runner не переведен в режим legacy_initial_events).
+    """
+    __slots__ = ("messages", "orders")
+
+    def __init__(self, messages: list[Message], orders: list[Order], tag: str | None):
+        """
+        :param messages: последние сообщения всех чатов.
+
+        :param orders: все заказы.
+
+        :param tag: тег runner'а.
+        """
+        super(InitialSnapshotEvent, self).__init__(EventTypes.INITIAL_SNAPSHOT, int(time.time()), tag)
+        self.messages = messages
+        self.orders = orders
+
+
 class OrdersListChangedEvent(Event):
     """
     Класс события: список заказов и/или статус одного/нескольких заказов изменился.
     """
+    __slots__ = ("buyer", "seller")
+
     def __init__(self, buyer: int, seller: int, tag: str):
         """
         :param buyer: кол-во активных покупок.
@@ -404,6 +539,8 @@ class NewOrderEvent(Event):
     """
     Класс события: в списке заказов обнаружен новый заказ.
     """
+    __slots__ = ("order",)
+
     def __init__(self, order_obj: Order, tag: str | None):
         """
         :param order_obj: экземпляр класса, описывающий заказ.
@@ -418,6 +555,8 @@ class OrderStatusChangedEvent(Event):
     """
     Класс события: статус заказа изменился.
     """
+    __slots__ = ("order",)
+
     def __init__(self, order_obj: Order, tag: str | None):
         """
         :param order_obj: экземпляр класса, описывающий заказ.
@@ -2,19 +2,20 @@
 В данном модуле написаны функции, которые позволяют получать информацию о пользователях без использования golden_key
 """
 
-from bs4 import BeautifulSoup
 import requests
 import logging
 
 from . import exceptions
 from . import types
+from . import parser
+from .transport import Transport
 
 
 logger = logging.getLogger("FunPayAPI.users")
 
 
 def get_user(user_id: int, include_currency: bool = False, user_agent: str = "", timeout: float = 10.0,
-             proxy: dict | None = None) -> types.UserInfo:
+             proxy: dict | None = None, transport: Transport | None = None) -> types.UserInfo:
     """
     Получает полную информацию о лотах и категориях пользователя.
 
@@ -28,6 +29,9 @@ def get_user(user_id: int, include_currency: bool = False, user_agent: str = "",
 
     :param proxy: HTTP/S прокси.
 
+    :param transport: HTTP транспорт (например, Account.transport), через который нужно отправить запрос.
+    Если не передан - запрос отправляется без пула соединений.
+
     :return: экземпляр класса с информацией о пользователе.
     """
     headers = {
@@ -35,7 +39,11 @@ def get_user(user_id: int, include_currency: bool = False, user_agent: str = "",
         "user-agent": user_agent
     }
     proxy = proxy if proxy is not None else {}
-    response = requests.get(f"{types.Links.USER}/{user_id}/", headers=headers, proxies=proxy, timeout=timeout)
+    if transport is not None:
+        response = transport.get(f"{types.Links.USER}/{user_id}/", "user", headers=headers, timeout=timeout,
+                                 proxies=proxy or None)
+    else:
+        response = requests.get(f"{types.Links.USER}/{user_id}/", headers=headers, proxies=proxy, timeout=timeout)
     logger.debug(f"Статус-код получения страницы пользователя {user_id}: {response.status_code}.")
     if response.status_code == 404:
         raise Exception("Пользователь не найден.")  # todo: создать и добавить кастомное исключение: пользователя не существует.
@@ -44,44 +52,4 @@ def get_user(user_id: int, include_currency: bool = False, user_agent: str = "",
 
     html_response = response.content.decode()
     logger.debug(html_response)
-    parser = BeautifulSoup(html_response, "html.parser")
-    categories = []
-    lots = []
-
-    # Если категорий не найдено - возвращаем пустые списки
-    category_divs = parser.find_all("div", {"class": "offer-list-title-container"})
-    if category_divs is None:
-        return types.UserInfo([], [])
-
-    # Парсим категории
-    for div in category_divs:
-        info_div = div.find("div", {"class": "offer-list-title"})
-        category_link = info_div.find("a")
-        public_link = category_link["href"]
-        if "chips" in public_link:
-            # 'chips' в ссылке означает, что данная категория - игровая валюта.
-            # Например: https://funpay.com/chips/125/ - Серебро Black Desert Mobile.
-            if not include_currency:
-                continue
-            category_type = types.CategoryTypes.CURRENCY
-        else:
-            category_type = types.CategoryTypes.LOT
-
-        edit_lots_link = public_link + "trade"
-        title = category_link.text
-        category_id = int(public_link.split("/")[-2])
-        category_object = types.Category(id_=category_id, game_id=None, title=title, edit_lots_link=edit_lots_link,
-                                         public_link=public_link, type_=category_type)
-        categories.append(category_object)
-
-        # Парсим лоты внутри текущей категории
-        lot_divs = div.parent.find_all("a", {"class": "tc-item"})
-        for lot_div in lot_divs:
-            lot_id = int(lot_div["href"].split("id=")[1])
-            lot_title = lot_div.find("div", {"class": "tc-desc-text"}).text
-            price = lot_div.find("div", {"class": "tc-price"})["data-s"]
-
-            lot_obj = types.Lot(category_id, None, lot_id, lot_title, price)
-            lots.append(lot_obj)
-
-    return types.UserInfo(lots, categories)
+    return parser.parse_user(html_response, include_currency)
@@ -2,10 +2,18 @@
 В данном модуле написаны вспомогательные функции.
 """
 
+from datetime import datetime, timedelta, timezone
 import string
 import random
 
 
+MONTHS = {"января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6, "июля": 7, "августа": 8,
+          "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12}
+
+FUNPAY_TZ = timezone(timedelta(hours=3), "MSK")
+"""Часовой пояс дат на страницах FunPay (московское время)."""
+
+
 def gen_random_tag() -> str:
     """
     Генерирует случайный тег для запроса (для runner'а).
@@ -43,3 +51,36 @@ def get_wait_time_from_raise_response(response: str) -> int:
         return (int(response[1])) * 3600
     else:
         return 10
+
+
+def parse_order_date(text: str, now: datetime | None = None) -> int | None:
+    """
+    Парсит дату заказа со страницы заказов ("сегодня, 12:34", "вчера, 12:34", "8 января, 12:34",
+    "8 января 2022, 12:34"). Даты на FunPay указаны по московскому времени (FUNPAY_TZ), независимо от часового пояса
+    системы.
+
+    :param text: текст даты.
+
+    :param now: текущее время (для дат без года / "сегодня" / "вчера"; naive - по местному времени системы).
+
+    :return: временная метка заказа или None, если дату не удалось распознать.
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(FUNPAY_TZ)
+    try:
+        date_text, time_text = text.strip().lower().rsplit(",", 1)
+        hour, minute = map(int, time_text.strip().split(":"))
+        date_text = date_text.strip()
+        if date_text == "сегодня":
+            date = now
+        elif date_text == "вчера":
+            date = now - timedelta(days=1)
+        else:
+            parts = date_text.split()
+            year = int(parts[2]) if len(parts) > 2 else now.year
+            date = datetime(year, MONTHS[parts[1]], int(parts[0]), tzinfo=FUNPAY_TZ)
+            # Дата без года из будущего - значит заказ был в прошлом году.
+            if len(parts) == 2 and date > now + timedelta(days=1):
+                date = date.replace(year=year - 1)
+        return int(datetime(date.year, date.month, date.day, hour, minute, tzinfo=FUNPAY_TZ).timestamp())
+    except (ValueError, KeyError, IndexError):
+        return None
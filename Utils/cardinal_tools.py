@@ -1,33 +1,32 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Generator, Callable, Iterable
 if TYPE_CHECKING:
     import FunPayAPI.account
     import FunPayAPI.types
 
 from datetime import datetime
-import Utils.exceptions
-import itertools
+from Utils import products as products_store
+from Utils import products_index
 import psutil
 import json
+import time
 import sys
 import os
 
 
 def count_products(products_file_path: str) -> int:
     """
-    Считает кол-во товара в указанном файле.
+    Считает кол-во товара в указанном файле (кол-во хранится в состоянии файла и кэшируется в памяти,
+    см. Utils.products.ProductStore).
 
     :param products_file_path: путь до файла с товарами.
 
     :return: кол-во товара в указанном файле.
     """
-    if not os.path.exists(products_file_path):
+    try:
+        return products_store.get_store(products_file_path).get_count()
+    except FileNotFoundError:
         return 0
-    with open(products_file_path, "r", encoding="utf-8") as f:
-        products = f.read()
-    products = products.split("\n")
-    products = list(itertools.filterfalse(lambda el: not el, products))
-    return len(products)
 
 
 def cache_categories(category_list: list[FunPayAPI.types.Category], cached_categories: dict | None = None) -> None:
@@ -87,6 +86,78 @@ def load_cached_categories() -> dict:
     return cached_categories
 
 
+def cache_snapshot(snapshot: dict) -> None:
+    """
+    Сохраняет снимок состояния кардинала в файл storage/cache/snapshot.json (для быстрого перезапуска).
+
+    :param snapshot: снимок состояния.
+    """
+    if not os.path.exists("storage/cache"):
+        os.makedirs("storage/cache")
+
+    snapshot["time"] = int(time.time())
+    with open("storage/cache/snapshot.json.tmp", "w", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot, ensure_ascii=False))
+    os.replace("storage/cache/snapshot.json.tmp", "storage/cache/snapshot.json")
+
+
+def load_snapshot(max_age: int) -> dict | None:
+    """
+    Загружает снимок состояния кардинала из файла storage/cache/snapshot.json и удаляет файл (снимок можно
+    использовать только один раз: после сбоя устаревший снимок не должен быть загружен повторно).
+
+    :param max_age: максимальный возраст снимка (в секундах).
+
+    :return: снимок состояния или None, если снимка нет, он устарел или поврежден.
+    """
+    if not os.path.exists("storage/cache/snapshot.json"):
+        return None
+
+    with open("storage/cache/snapshot.json", "r", encoding="utf-8") as f:
+        snapshot = f.read()
+    os.remove("storage/cache/snapshot.json")
+
+    try:
+        snapshot = json.loads(snapshot)
+    except json.decoder.JSONDecodeError:
+        return None
+    if int(time.time()) - snapshot.get("time", 0) > max_age:
+        return None
+    return snapshot
+
+
+def cache_chats_directory(chats_directory: dict[str, int]) -> None:
+    """
+    Кэширует справочник чатов {никнейм собеседника: node_id чата} в файл storage/cache/chats.json.
+
+    :param chats_directory: справочник чатов.
+    """
+    if not os.path.exists("storage/cache"):
+        os.makedirs("storage/cache")
+
+    with open("storage/cache/chats.json.tmp", "w", encoding="utf-8") as f:
+        f.write(json.dumps(chats_directory, ensure_ascii=False))
+    os.replace("storage/cache/chats.json.tmp", "storage/cache/chats.json")
+
+
+def load_chats_directory() -> dict[str, int]:
+    """
+    Загружает справочник чатов из файла storage/cache/chats.json.
+
+    :return: справочник чатов {никнейм собеседника: node_id чата}.
+    """
+    if not os.path.exists("storage/cache/chats.json"):
+        return {}
+
+    with open("storage/cache/chats.json", "r", encoding="utf-8") as f:
+        chats_directory = f.read()
+
+    try:
+        return json.loads(chats_directory)
+    except json.decoder.JSONDecodeError:
+        return {}
+
+
 def cache_block_list(block_list: list[str]) -> None:
     """
     Кэширует черный список.
@@ -227,7 +298,7 @@ def get_month_name(month_number: int) -> str:
 
 def get_product(path: str, amount: int = 1) -> list[list[str] | int] | None:
     """
-    Берет из товарного файла товар/-ы, удаляет их из товарного файла.
+    Берет из товарного файла товар/-ы, удаляет их из товарного файла (см. Utils.products.ProductStore).
 
     :param path: путь до файла с товарами.
 
@@ -235,48 +306,131 @@ def get_product(path: str, amount: int = 1) -> list[list[str] | int] | None:
 
     :return: [[Товар/-ы], оставшееся кол-во товара]
     """
-    with open(path, "r", encoding="utf-8") as f:
-        products = f.read()
+    got_products, amount = products_store.get_store(path).get(amount)
+    return [got_products, amount]
 
-    products = products.split("\n")
 
-    # Убираем пустые элементы
-    products = list(itertools.filterfalse(lambda el: not el, products))
+def add_products(path: str, products: list[str]) -> None:
+    """
+    Добавляет товары в файл с товарами.
 
-    if not products:
-        raise Utils.exceptions.NoProductsError(path)
+    :param path: путь до файла с товарами.
 
-    elif len(products) < amount:
-        raise Utils.exceptions.NotEnoughProductsError(path, len(products), amount)
+    :param products: товары.
 
-    got_products = products[:amount]
-    save_products = products[amount:]
-    amount = len(save_products)
+    :return:
+    """
+    products_store.get_store(path).add(products)
 
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("\n".join(save_products))
 
-    return [got_products, amount]
+def reserve_products(path: str, order_id: str, amount: int = 1) -> products_store.Reservation:
+    """
+    Резервирует товар/-ы из товарного файла за заказом (см. Utils.products.ProductStore.reserve). После отправки
+    товара резерв необходимо подтвердить (Reservation.commit) или отменить (Reservation.rollback).
 
+    :param path: путь до файла с товарами.
 
-def add_products(path: str, products: list[str]) -> None:
+    :param order_id: ID заказа.
+
+    :param amount: кол-во товара.
+
+    :return: резерв.
     """
-    Добавляет товары в файл с товарами.
+    return products_store.get_store(path).reserve(order_id, amount)
+
+
+def get_unfinished_reservations() -> dict[str, dict[str, list[str]]]:
+    """
+    Получает незавершенные резервы всех файлов с товарами (например, оставшиеся после падения бота посреди выдачи).
+
+    :return: {имя файла с товарами: {ID заказа: товары}}.
+    """
+    result = {}
+    if not os.path.exists(products_store.PRODUCTS_DIR):
+        return result
+    for file_name in sorted(os.listdir(products_store.PRODUCTS_DIR)):
+        if not file_name.endswith(".txt"):
+            continue
+        reservations = products_store.get_store(f"{products_store.PRODUCTS_DIR}/{file_name}").get_reservations()
+        if reservations:
+            result[file_name] = reservations
+    return result
+
+
+def commit_reservation(path: str, order_id: str) -> None:
+    """
+    Подтверждает выдачу зарезервированных товаров (удаляет резерв из журнала).
 
     :param path: путь до файла с товарами.
 
-    :param products: товары.
+    :param order_id: ID заказа.
+    """
+    products_store.get_store(path).commit(order_id)
 
-    :return:
+
+def rollback_reservation(path: str, order_id: str) -> None:
+    """
+    Возвращает зарезервированные товары в файл с товарами.
+
+    :param path: путь до файла с товарами.
+
+    :param order_id: ID заказа.
+    """
+    products_store.get_store(path).rollback(order_id)
+
+
+def invalidate_products_count(path: str) -> None:
     """
-    with open(path, "r", encoding="utf-8") as f:
-        old_products = f.read()
+    Сбрасывает кэш кол-ва товара файла. Необходимо вызывать после перезаписи файла с товарами в обход
+    Utils.products (уведомление об изменении может прийти не сразу).
 
-    old_products = old_products.split("\n")
-    old_products.extend(products)
+    :param path: путь до файла с товарами.
+    """
+    products_store.get_store(path).invalidate()
+
+
+def import_products(path: str, lines: Iterable[bytes | str], deduplicate: bool = False, bloom: bool = False,
+                    on_progress: Callable[[products_index.ImportReport], None] | None = None) \
+        -> products_index.ImportReport:
+    """
+    Импортирует товары в файл с товарами (см. Utils.products_index.import_products).
+
+    :param path: путь до файла с товарами.
+
+    :param lines: строки с товарами.
+
+    :param deduplicate: пропускать ли товары, которые уже есть в наличии, и повторы внутри загрузки.
+
+    :param bloom: использовать ли фильтр Блума при поиске дубликатов.
+
+    :param on_progress: функция, периодически вызываемая с отчетом об импорте.
+
+    :return: отчет об импорте.
+    """
+    return products_index.import_products(path, lines, deduplicate, bloom, on_progress)
 
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("\n".join(old_products))
+
+def iter_products_file(path: str, part_size: int = products_store.CHUNK_SIZE) -> Generator[bytes, None, None]:
+    """
+    Читает невыданные товары из файла частями по ~part_size байт, не разрывая строки (файл не загружается в память
+    целиком). Если файл не удалось уплотнить, уже выданные строки в начале файла пропускаются.
+
+    :param path: путь до файла с товарами.
+
+    :param part_size: размер части.
+    """
+    f, start = products_store.get_store(path).open_unsold()
+    with f:
+        yield from products_store.iter_chunks(f, start, chunk_size=part_size)
+
+
+def compact_products(path: str) -> None:
+    """
+    Удаляет из файла с товарами уже выданные товары (чтобы файл можно было отправить / отредактировать).
+
+    :param path: путь до файла с товарами.
+    """
+    products_store.get_store(path).compact()
 
 
 def format_msg_text(text: str, msg: FunPayAPI.types.Message) -> str:
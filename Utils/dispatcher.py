@@ -0,0 +1,250 @@
+"""
+В данном модуле написан диспетчер событий FunPay: пул потоков, обрабатывающий события разных чатов параллельно,
+а события одного чата (покупателя) - строго по очереди. Свободный поток берет событие с наибольшим приоритетом
+(с учетом времени ожидания). Хэндлеры плагинов, не объявивших CONCURRENT_HANDLERS = True, выполняются по очереди
+(см. Cardinal.add_handlers_from_plugin).
+"""
+
+from __future__ import annotations
+from typing import Callable, Hashable
+from collections import deque
+from enum import IntEnum
+import threading
+import logging
+import time
+
+from FunPayAPI import types
+
+
+logger = logging.getLogger("FPC.dispatcher")
+
+
+class EventPriority(IntEnum):
+    """
+    Классы приоритетов событий. Чем меньше значение - тем раньше событие будет обработано.
+    """
+    ORDER = 0
+    """Новые заказы и изменения статусов заказов."""
+
+    COMMAND = 1
+    """Сообщения-команды (автоответ, !автовыдача)."""
+
+    MESSAGE = 2
+    """Остальные сообщения."""
+
+    LIST_CHANGED = 3
+    """Изменения списков чатов / заказов."""
+
+
+def get_event_priority(event: types.Event, is_command: Callable[[str], bool] | None = None) -> EventPriority:
+    """
+    Определяет класс приоритета события.
+
+    :param event: событие.
+
+    :param is_command: функция, определяющая, является ли текст сообщения командой.
+
+    :return: класс приоритета.
+    """
+    if isinstance(event, (types.InitialOrderEvent, types.NewOrderEvent, types.OrderStatusChangedEvent)):
+        return EventPriority.ORDER
+    if isinstance(event, (types.InitialMessageEvent, types.NewMessageEvent)):
+        if is_command is not None and event.message.text and is_command(event.message.text):
+            return EventPriority.COMMAND
+        return EventPriority.MESSAGE
+    return EventPriority.LIST_CHANGED
+
+
+def get_event_key(event: types.Event) -> Hashable:
+    """
+    Возвращает ключ очереди события. События с одинаковым ключом обрабатываются по очереди, в порядке получения.
+
+    Сообщения и заказы одного покупателя попадают в одну очередь (по никнейму), чтобы, например, ответ на команду не
+    обогнал выдачу товара. События изменения списков обрабатываются в своих очередях.
+
+    :param event: событие.
+
+    :return: ключ очереди.
+    """
+    if isinstance(event, (types.InitialMessageEvent, types.NewMessageEvent)):
+        return "chat", event.message.chat_with or event.message.node_id
+    if isinstance(event, (types.InitialOrderEvent, types.NewOrderEvent, types.OrderStatusChangedEvent)):
+        return "chat", event.order.buyer_username
+    return "list", event.type
+
+
+class EventDispatcher:
+    """
+    Диспетчер событий. Каждое событие передается в handler в одном из потоков пула.
+
+    Очереди чатов выбираются по приоритету: приоритет очереди - лучший класс среди ее событий (чтобы заказ, стоящий
+    за сообщением того же покупателя, не ждал наравне с сообщениями). Чтобы события низких классов не ждали вечно,
+    за каждые aging секунд ожидания первое событие очереди поднимается на один класс.
+    """
+    def __init__(self, handler: Callable[[types.Event], None], workers: int = 4, max_queue: int = 1000,
+                 is_command: Callable[[str], bool] | None = None, aging: float = 5.0):
+        """
+        :param handler: функция, обрабатывающая событие.
+
+        :param workers: кол-во потоков-обработчиков.
+
+        :param max_queue: максимальное кол-во необработанных событий. Если очередь заполнена, EventDispatcher.submit
+        ждет, пока обработчики освободят место (тем самым приостанавливая получение новых событий).
+
+        :param is_command: функция, определяющая, является ли текст сообщения командой (см. get_event_priority).
+
+        :param aging: за сколько секунд ожидания событие поднимается на один класс приоритета.
+        """
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.is_command = is_command
+        self.aging = aging
+
+        self.condition = threading.Condition()
+        # {ключ: очередь (событие, время добавления, класс приоритета)}
+        self.queues: dict[Hashable, deque[tuple[types.Event, float, EventPriority]]] = {}
+        self.ready: list[Hashable] = []  # Ключи, у которых есть события и которые не обрабатываются.
+        self.busy: set[Hashable] = set()  # Ключи, события которых сейчас обрабатываются.
+        self.size = 0
+        self.threads: list[threading.Thread] = []
+
+        self.submitted = 0
+        self.processed = 0
+        self.max_size = 0
+        self.total_wait = 0.0
+        self.total_handling = 0.0
+        # Статистика по классам приоритетов.
+        self.class_size = {i: 0 for i in EventPriority}
+        self.class_taken = {i: 0 for i in EventPriority}
+        self.class_wait = {i: 0.0 for i in EventPriority}
+        self.class_max_wait = {i: 0.0 for i in EventPriority}
+
+    def start(self) -> None:
+        """
+        Запускает потоки-обработчики.
+        """
+        with self.condition:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.loop, daemon=True, name=f"EventDispatcher-{len(self.threads)}")
+                self.threads.append(thread)
+                thread.start()
+
+    def submit(self, event: types.Event) -> None:
+        """
+        Добавляет событие в очередь.
+
+        :param event: событие.
+        """
+        if not self.threads:
+            self.start()
+        key = get_event_key(event)
+        priority = get_event_priority(event, self.is_command)
+        with self.condition:
+            while self.size >= self.max_queue:
+                self.condition.wait()
+            if key not in self.queues:
+                self.queues[key] = deque()
+                if key not in self.busy:
+                    self.ready.append(key)
+            self.queues[key].append((event, time.monotonic(), priority))
+            self.size += 1
+            self.class_size[priority] += 1
+            self.submitted += 1
+            self.max_size = max(self.max_size, self.size)
+            self.condition.notify_all()
+
+    def _get_rank(self, key: Hashable, now: float) -> tuple[float, float]:
+        """
+        :return: ранг очереди (чем меньше - тем раньше она будет обработана): (класс приоритета с учетом времени
+        ожидания, время добавления первого события).
+        """
+        events = self.queues[key]
+        submitted = events[0][1]
+        priority = min(i[2] for i in events)
+        return priority - (now - submitted) / self.aging, submitted
+
+    def _take(self) -> tuple[Hashable, types.Event]:
+        """
+        Ждет и забирает первое событие из свободной очереди с наибольшим приоритетом.
+
+        :return: (ключ, событие).
+        """
+        with self.condition:
+            while not self.ready:
+                self.condition.wait()
+            now = time.monotonic()
+            key = min(self.ready, key=lambda k: self._get_rank(k, now))
+            self.ready.remove(key)
+            events = self.queues[key]
+            event, submitted, priority = events.popleft()
+            if not events:
+                del self.queues[key]
+            self.busy.add(key)
+            self.size -= 1
+
+            wait = now - submitted
+            self.total_wait += wait
+            self.class_size[priority] -= 1
+            self.class_taken[priority] += 1
+            self.class_wait[priority] += wait
+            self.class_max_wait[priority] = max(self.class_max_wait[priority], wait)
+            self.condition.notify_all()
+            return key, event
+
+    def _release(self, key: Hashable, handling_time: float) -> None:
+        with self.condition:
+            self.busy.discard(key)
+            if key in self.queues:
+                self.ready.append(key)
+            self.processed += 1
+            self.total_handling += handling_time
+            self.condition.notify_all()
+
+    def loop(self) -> None:
+        while True:
+            key, event = self._take()
+            started = time.monotonic()
+            try:
+                self.handler(event)
+            except:
+                logger.error("Произошла ошибка при обработке события. Подробнее в файле logs/log.log.")
+                logger.debug("------TRACEBACK------", exc_info=True)
+            finally:
+                self._release(key, time.monotonic() - started)
+
+    def join(self, timeout: float | None = None) -> bool:
+        """
+        Ждет, пока все события будут обработаны.
+
+        :param timeout: максимальное время ожидания (None - без ограничения).
+
+        :return: True, если все события обработаны, False, если истек тайм-аут.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.size and not self.busy, timeout)
+
+    def get_metrics(self) -> dict[str, int | float | dict]:
+        """
+        :return: метрики диспетчера: кол-во потоков, глубина очереди (текущая, максимальная, предел), кол-во
+        обрабатываемых чатов, кол-во полученных / обработанных событий, среднее время ожидания и обработки (сек.),
+        а также метрики классов приоритетов {"classes": {класс: {"queue_size", "taken", "avg_wait", "max_wait"}}}.
+        """
+        with self.condition:
+            taken = self.submitted - self.size
+            return {
+                "workers": self.workers,
+                "queue_size": self.size,
+                "max_queue_size": self.max_size,
+                "queue_limit": self.max_queue,
+                "busy": len(self.busy),
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "avg_wait": self.total_wait / taken if taken else 0.0,
+                "avg_handling": self.total_handling / self.processed if self.processed else 0.0,
+                "classes": {i: {"queue_size": self.class_size[i],
+                                "taken": self.class_taken[i],
+                                "avg_wait": self.class_wait[i] / self.class_taken[i] if self.class_taken[i] else 0.0,
+                                "max_wait": self.class_max_wait[i]}
+                            for i in EventPriority}
+            }
@@ -0,0 +1,297 @@
+"""
+В данном модуле написаны локальное хранилище заказов (SQLite) и краулер истории заказов FunPay.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from FunPayAPI.account import Account
+
+from concurrent.futures import ThreadPoolExecutor
+from FunPayAPI.types import Order, OrderStatuses
+import threading
+import logging
+import sqlite3
+import time
+import os
+
+
+logger = logging.getLogger("FPC.orders_history")
+
+
+STATES = {"paid": OrderStatuses.OUTSTANDING, "closed": OrderStatuses.COMPLETED, "refunded": OrderStatuses.REFUND}
+"""Фильтры страницы заказов {"значение фильтра state": статус заказов}."""
+
+
+class OrdersStore:
+    """
+    Локальное хранилище заказов. Заказы индексированы по ID, покупателю, статусу и дате.
+    """
+    def __init__(self, path: str = "storage/cache/orders.sqlite"):
+        """
+        :param path: путь до файла базы данных.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS orders (
+                    id TEXT PRIMARY KEY,
+                    buyer_id INTEGER,
+                    buyer_username TEXT,
+                    title TEXT,
+                    price REAL,
+                    status INTEGER,
+                    date INTEGER,
+                    updated INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS orders_buyer_id ON orders (buyer_id);
+                CREATE INDEX IF NOT EXISTS orders_buyer_username ON orders (buyer_username);
+                CREATE INDEX IF NOT EXISTS orders_status_date ON orders (status, date);
+                CREATE INDEX IF NOT EXISTS orders_date ON orders (date);
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    state TEXT PRIMARY KEY,
+                    order_id TEXT,
+                    updated INTEGER
+                );
+            """)
+
+    def save_orders(self, orders: list[Order]) -> None:
+        """
+        Сохраняет заказы (обновляет уже сохраненные).
+
+        :param orders: список заказов.
+        """
+        now = int(time.time())
+        rows = [(i.id, i.buyer_id, i.buyer_username, i.title, i.price, i.status.value, i.date, now) for i in orders]
+        with self.lock, self.connection:
+            self.connection.executemany("""
+                INSERT INTO orders (id, buyer_id, buyer_username, title, price, status, date, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    buyer_id = excluded.buyer_id,
+                    buyer_username = excluded.buyer_username,
+                    title = excluded.title,
+                    price = excluded.price,
+                    status = excluded.status,
+                    date = COALESCE(excluded.date, orders.date),
+                    updated = excluded.updated
+            """, rows)
+
+    def get_order(self, order_id: str) -> Order | None:
+        """
+        :param order_id: ID заказа.
+
+        :return: сохраненный заказ или None, если заказ не найден.
+        """
+        result = self.find(order_id=order_id)
+        return result[0] if result else None
+
+    def find(self, order_id: str | None = None, buyer_username: str | None = None, buyer_id: int | None = None,
+             status: OrderStatuses | None = None, date_from: int | None = None, date_to: int | None = None,
+             limit: int | None = None) -> list[Order]:
+        """
+        Ищет заказы. Все переданные условия объединяются через И. Заказы без даты (дату не удалось распознать)
+        подходят под любые условия по дате.
+
+        :param order_id: ID заказа.
+
+        :param buyer_username: никнейм покупателя.
+
+        :param buyer_id: ID покупателя.
+
+        :param status: статус заказа.
+
+        :param date_from: минимальная временная метка заказа.
+
+        :param date_to: максимальная временная метка заказа.
+
+        :param limit: максимальное кол-во заказов.
+
+        :return: список заказов (от новых к старым).
+        """
+        conditions = []
+        args = []
+        for condition, value in (("id = ?", order_id), ("buyer_username = ?", buyer_username),
+                                 ("buyer_id = ?", buyer_id), ("status = ?", status.value if status else None),
+                                 ("(date >= ? OR date IS NULL)", date_from), ("(date <= ? OR date IS NULL)", date_to)):
+            if value is not None:
+                conditions.append(condition)
+                args.append(value)
+
+        query = "SELECT id, buyer_id, buyer_username, title, price, status, date FROM orders"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+
+        with self.lock:
+            rows = self.connection.execute(query, args).fetchall()
+        return [Order.from_tuple((i[0], i[3], i[4], i[2], i[1], i[5], i[6])) for i in rows]
+
+    def get_ids(self, status: OrderStatuses) -> set[str]:
+        """
+        :return: ID всех сохраненных заказов с указанным статусом.
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT id FROM orders WHERE status = ?", (status.value,)).fetchall()
+        return {i[0] for i in rows}
+
+    def delete_orders(self, order_ids: set[str] | list[str]) -> None:
+        """
+        Удаляет заказы из хранилища.
+
+        :param order_ids: ID заказов.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM orders WHERE id = ?", [(i,) for i in order_ids])
+
+    def count(self) -> int:
+        """
+        :return: кол-во сохраненных заказов.
+        """
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def get_checkpoint(self, state: str) -> str | None:
+        """
+        :param state: фильтр страницы заказов (ключ STATES).
+
+        :return: ID самого нового заказа, полученного при последнем успешном обходе, или None.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT order_id FROM checkpoints WHERE state = ?", (state,)).fetchone()
+        return row[0] if row else None
+
+    def set_checkpoint(self, state: str, order_id: str) -> None:
+        """
+        Сохраняет ID самого нового заказа, полученного при обходе.
+
+        :param state: фильтр страницы заказов (ключ STATES).
+
+        :param order_id: ID заказа.
+        """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO checkpoints (state, order_id, updated) VALUES (?, ?, ?)",
+                                    (state, order_id, int(time.time())))
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+class OrdersCrawler:
+    """
+    Краулер истории заказов. Обходит страницы заказов по токену продолжения и сохраняет все заказы в OrdersStore.
+
+    Активные заказы ("paid") обходятся полностью (их немного). Закрытые и возвращенные заказы обходятся
+    параллельно и только до чекпоинта - самого нового заказа, полученного при прошлом обходе. Если какие-то заказы
+    пропали из активных, обход продолжается, пока не будут найдены их новые статусы.
+    """
+    def __init__(self, account: Account, store: OrdersStore, workers: int = 2, min_interval: float = 1.0):
+        """
+        :param account: экземпляр аккаунта.
+
+        :param store: хранилище заказов.
+
+        :param workers: кол-во одновременно обходимых фильтров.
+
+        :param min_interval: минимальный интервал между запросами страниц (в секундах).
+        """
+        self.account = account
+        self.store = store
+        self.workers = workers
+        self.min_interval = min_interval
+
+        self.sync_lock = threading.Lock()
+        self.rate_lock = threading.Lock()
+        self.last_request = 0.0
+
+    def get_page(self, state: str, continue_token: str | None) -> tuple[list[Order], str | None]:
+        """
+        Получает страницу заказов, соблюдая минимальный интервал между запросами.
+        """
+        with self.rate_lock:
+            delay = self.last_request + self.min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.last_request = time.time()
+        return self.account.get_orders_page(state, continue_token)
+
+    def crawl(self, state: str, stop_at: str | None = None, pending: set[str] | None = None,
+              pending_lock: threading.Lock | None = None) -> list[str]:
+        """
+        Обходит страницы заказов с указанным фильтром и сохраняет заказы.
+
+        :param state: фильтр страницы заказов (ключ STATES).
+
+        :param stop_at: чекпоинт: ID заказа, после страницы с которым обход можно остановить.
+
+        :param pending: ID заказов, новые статусы которых нужно найти (найденные ID удаляются из множества).
+        Обход не останавливается на чекпоинте, пока множество не пусто.
+
+        :param pending_lock: блокировка для pending (если pending используется несколькими потоками).
+
+        :return: ID всех полученных заказов (от новых к старым).
+        """
+        pending_lock = pending_lock or threading.Lock()
+        order_ids = []
+        reached_checkpoint = False
+        continue_token = None
+        while True:
+            orders, continue_token = self.get_page(state, continue_token)
+            self.store.save_orders(orders)
+            page_ids = [i.id for i in orders]
+            order_ids.extend(page_ids)
+            logger.debug(f"Получена страница заказов ({state}): {len(orders)} заказов.")
+
+            if stop_at is not None and stop_at in page_ids:
+                reached_checkpoint = True
+            if pending is not None:
+                with pending_lock:
+                    pending.difference_update(page_ids)
+                    pending_left = bool(pending)
+            else:
+                pending_left = False
+
+            if not continue_token or (reached_checkpoint and not pending_left):
+                return order_ids
+
+    def sync(self) -> dict[str, int]:
+        """
+        Синхронизирует локальное хранилище с историей заказов FunPay.
+
+        :return: кол-во полученных заказов по фильтрам {"фильтр": кол-во заказов}.
+        """
+        with self.sync_lock:
+            outstanding_before = self.store.get_ids(OrderStatuses.OUTSTANDING)
+            paid_ids = self.crawl("paid")
+            result = {"paid": len(paid_ids)}
+
+            pending = outstanding_before - set(paid_ids)
+            pending_lock = threading.Lock()
+            states = [i for i in STATES if i != "paid"]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {state: executor.submit(self.crawl, state, self.store.get_checkpoint(state), pending,
+                                                  pending_lock)
+                           for state in states}
+
+            for state, future in futures.items():
+                order_ids = future.result()
+                result[state] = len(order_ids)
+                if order_ids:
+                    self.store.set_checkpoint(state, order_ids[0])
+
+            if pending:
+                # Заказы пропали из активных, но не нашлись ни в закрытых, ни в возвращенных. Их статус неизвестен,
+                # поэтому удаляем их, чтобы каждая следующая синхронизация не обходила всю историю заново.
+                logger.warning(f"Не удалось найти новые статусы заказов: {', '.join(pending)}.")
+                self.store.delete_orders(pending)
+            logger.info(f"История заказов синхронизирована: {result}. Всего заказов в хранилище: "
+                        f"{self.store.count()}.")
+            return result
@@ -0,0 +1,287 @@
+"""
+В данном модуле написана очередь исходящих сообщений FunPay: сообщения одного чата отправляются строго по очереди
+(с сохранением порядка частей), сообщения разных чатов - параллельно, общим пулом потоков. Несколько ожидающих
+сообщений одного чата могут быть объединены в меньшее кол-во запросов (короткие сообщения отправляются одной частью,
+но сообщения не разрываются и не перемешиваются).
+"""
+
+from __future__ import annotations
+from typing import Callable
+from concurrent.futures import Future
+from collections import deque
+import threading
+import logging
+import time
+
+from FunPayAPI import retry
+from FunPayAPI.types import Message
+
+
+logger = logging.getLogger("FPC.outbox")
+
+
+MAX_LINES = 20
+"""Максимальное кол-во строк в одной части сообщения."""
+
+
+def split_text(text: str, max_lines: int = MAX_LINES) -> list[str]:
+    """
+    Подготавливает текст к отправке и разбивает его на части: убирает пробелы по краям строк, заменяет пустые строки
+    на [a][/a] (иначе FunPay их вырежет) и делит текст на части по max_lines строк. Части, состоящие только из
+    [a][/a], не отправляются.
+
+    :param text: текст сообщения.
+
+    :param max_lines: максимальное кол-во строк в одной части.
+
+    :return: список частей сообщения.
+    """
+    text = "\n".join(i.strip() for i in text.split("\n"))
+    while "\n\n" in text:
+        text = text.replace("\n\n", "\n[a][/a]\n")
+    lines = text.split("\n")
+
+    parts = []
+    for i in range(0, len(lines), max_lines):
+        part = "\n".join(lines[i:i + max_lines])
+        if part.strip() != "[a][/a]":
+            parts.append(part)
+    return parts
+
+
+class DeliveryReceipt:
+    """
+    Квитанция о доставке сообщения.
+    """
+    def __init__(self, node_id: int, parts: list[str], sent: int, requests: int, coalesced: int,
+                 queued_at: float, finished_at: float, error: Exception | None = None):
+        """
+        :param node_id: ID чата.
+
+        :param parts: части сообщения.
+
+        :param sent: кол-во отправленных частей сообщения.
+
+        :param requests: кол-во запросов к FunPay (с учетом повторных попыток).
+
+        :param coalesced: кол-во сообщений, объединенных в одну пачку с этим сообщением (включая само сообщение).
+
+        :param queued_at: временная метка постановки сообщения в очередь.
+
+        :param finished_at: временная метка завершения отправки.
+
+        :param error: исключение, из-за которого сообщение не было доставлено (полностью).
+        """
+        self.node_id = node_id
+        self.parts = parts
+        self.sent = sent
+        self.requests = requests
+        self.coalesced = coalesced
+        self.queued_at = queued_at
+        self.finished_at = finished_at
+        self.error = error
+
+    @property
+    def delivered(self) -> bool:
+        """
+        Доставлены ли все части сообщения.
+        """
+        return self.error is None and self.sent == len(self.parts)
+
+    def __bool__(self) -> bool:
+        return self.delivered
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений. У каждого чата (node_id) своя очередь; свободный поток пула забирает все ожидающие
+    сообщения первого свободного чата и отправляет их по частям, по порядку.
+    """
+    def __init__(self, send_part: Callable[[Message], None], workers: int = 2, coalesce: bool = True,
+                 max_lines: int = MAX_LINES, policy: retry.RetryPolicy | None = None):
+        """
+        :param send_part: функция, отправляющая одну часть сообщения (райзит исключение, если часть не доставлена).
+
+        :param workers: кол-во потоков-отправителей.
+
+        :param coalesce: объединять ли ожидающие сообщения одного чата (идущие подряд сообщения из одной части
+        отправляются одной частью, если в ней не больше max_lines строк).
+
+        :param max_lines: максимальное кол-во строк в одной части.
+
+        :param policy: политика повторных попыток отправки одной части.
+        """
+        self.send_part = send_part
+        self.workers = max(1, workers)
+        self.coalesce = coalesce
+        self.max_lines = max_lines
+        self.policy = policy or retry.RetryPolicy(3, base_delay=0.5, max_delay=4.0, deadline=30.0)
+
+        self.condition = threading.Condition()
+        # {node_id: очередь (сообщение, части, время добавления, кол-во попыток, можно ли объединять, future)}
+        self.queues: dict[int, deque[tuple[Message, list[str], float, int | None, bool, Future]]] = {}
+        self.ready: deque[int] = deque()  # Чаты, у которых есть сообщения и которые не обрабатываются.
+        self.busy: set[int] = set()  # Чаты, сообщения которых сейчас отправляются.
+        self.threads: list[threading.Thread] = []
+
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.requests = 0
+
+    def start(self) -> None:
+        """
+        Запускает потоки-отправители.
+        """
+        with self.condition:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.loop, daemon=True, name=f"Outbox-{len(self.threads)}")
+                self.threads.append(thread)
+                thread.start()
+
+    def submit(self, message: Message, attempts: int | None = None, coalesce: bool = True) -> Future:
+        """
+        Ставит сообщение в очередь чата.
+
+        :param message: сообщение.
+
+        :param attempts: кол-во попыток отправки каждой части (None - согласно политике Outbox).
+
+        :param coalesce: можно ли объединять сообщение с другими сообщениями чата (например, выдачу товара лучше
+        отправлять отдельно, чтобы по квитанции было видно, какие части с товаром доставлены).
+
+        :return: future, результат которого - DeliveryReceipt.
+        """
+        if not self.threads:
+            self.start()
+        future = Future()
+        parts = split_text(message.text, self.max_lines)
+        with self.condition:
+            if message.node_id not in self.queues:
+                self.queues[message.node_id] = deque()
+                if message.node_id not in self.busy:
+                    self.ready.append(message.node_id)
+            self.queues[message.node_id].append((message, parts, time.time(), attempts, coalesce, future))
+            self.submitted += 1
+            self.condition.notify()
+        return future
+
+    def send(self, message: Message, attempts: int | None = None, timeout: float | None = None,
+             coalesce: bool = True) -> DeliveryReceipt:
+        """
+        Ставит сообщение в очередь и ждет окончания отправки.
+
+        :return: квитанция о доставке.
+        """
+        return self.submit(message, attempts, coalesce).result(timeout)
+
+    def _take(self) -> tuple[int, list[tuple[Message, list[str], float, int | None, bool, Future]]]:
+        """
+        Ждет и забирает сообщения первого свободного чата: все ожидающие сообщения, которые можно объединять, если
+        включено объединение, иначе одно.
+
+        :return: (node_id, сообщения).
+        """
+        with self.condition:
+            while not self.ready:
+                self.condition.wait()
+            node_id = self.ready.popleft()
+            queue = self.queues[node_id]
+            batch = [queue.popleft()]
+            while self.coalesce and batch[0][4] and queue and queue[0][4]:
+                batch.append(queue.popleft())
+            if not queue:
+                del self.queues[node_id]
+            self.busy.add(node_id)
+            return node_id, batch
+
+    def _release(self, node_id: int) -> None:
+        with self.condition:
+            self.busy.discard(node_id)
+            if node_id in self.queues:
+                self.ready.append(node_id)
+                self.condition.notify()
+
+    def _send_batch(self, node_id: int,
+                    batch: list[tuple[Message, list[str], float, int | None, bool, Future]]) -> None:
+        """
+        Отправляет пачку сообщений одного чата и устанавливает результаты их future.
+        """
+        # Части запросов [текст, индексы сообщений пачки, можно ли дописать в часть следующее сообщение].
+        chunks = []
+        for index, (_, parts, *_) in enumerate(batch):
+            if len(parts) == 1 and chunks and chunks[-1][2] and \
+                    chunks[-1][0].count("\n") + parts[0].count("\n") + 2 <= self.max_lines:
+                chunks[-1][0] += "\n" + parts[0]
+                chunks[-1][1].append(index)
+                continue
+            chunks.extend([part, [index], len(parts) == 1] for part in parts)
+
+        attempts = [i[3] for i in batch if i[3] is not None]
+        policy = self.policy
+        if attempts:
+            policy = retry.RetryPolicy(max(attempts), policy.base_delay, policy.max_delay, policy.multiplier,
+                                       policy.jitter, policy.deadline, policy.retry_on, policy.give_up_on)
+
+        first = batch[0][0]
+        requests = 0
+        sent = [0] * len(batch)
+        error = None
+
+        def send_part(part: Message) -> None:
+            nonlocal requests
+            requests += 1
+            self.send_part(part)
+
+        for text, indexes, _ in chunks:
+            part = Message(text, node_id, first.chat_with, first.unread)
+            try:
+                policy.call(send_part, part, on_retry=retry.log_retry(f"отправить сообщение в чат {node_id}", logger))
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение в чат $YELLOW{node_id}$RESET: {e}")
+                logger.debug("------TRACEBACK------", exc_info=True)
+                error = e
+                break
+            for index in indexes:
+                sent[index] += 1
+
+        finished_at = time.time()
+        receipts = [DeliveryReceipt(node_id, parts, sent[index], requests, len(batch), queued_at, finished_at,
+                                    error if sent[index] < len(parts) else None)
+                    for index, (_, parts, queued_at, *_) in enumerate(batch)]
+        with self.condition:
+            self.requests += requests
+            self.delivered += sum(i.delivered for i in receipts)
+            self.failed += sum(not i.delivered for i in receipts)
+        for (*_, future), receipt in zip(batch, receipts):
+            future.set_result(receipt)
+
+    def loop(self) -> None:
+        while True:
+            node_id, batch = self._take()
+            try:
+                self._send_batch(node_id, batch)
+            except Exception as e:
+                logger.error("Произошла ошибка при отправке сообщений. Подробнее в файле logs/log.log.")
+                logger.debug("------TRACEBACK------", exc_info=True)
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self._release(node_id)
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        :return: метрики очереди: кол-во потоков, ожидающих сообщений, чатов в процессе отправки, полученных /
+        доставленных / недоставленных сообщений и запросов к FunPay.
+        """
+        with self.condition:
+            return {
+                "workers": self.workers,
+                "queue_size": sum(len(i) for i in self.queues.values()),
+                "busy": len(self.busy),
+                "submitted": self.submitted,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "requests": self.requests
+            }
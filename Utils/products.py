@@ -0,0 +1,858 @@
+"""
+В данном модуле написано хранилище товаров автовыдачи. Товары хранятся в обычных .txt файлах (по товару на строку),
+но выдаются с начала файла за O(1): вместо перезаписи всего файла сдвигается смещение "головы" (все строки до
+смещения считаются выданными), а кол-во оставшихся товаров хранится рядом с ним. Сразу после выдачи выданные строки
+удаляются из файла уплотнением (копированием оставшейся части), поэтому файл, который видит пользователь, содержит
+только невыданные товары (и строки незавершенных выдач). Если уплотнить файл не удалось (например, на Windows файл
+открыт другим процессом), выданные строки удаляются при следующей выдаче.
+
+Товары можно зарезервировать за заказом (ProductStore.reserve) и после отправки подтвердить выдачу
+(ProductStore.commit) или вернуть их на исходное место (ProductStore.rollback). Резервы хранятся в журнале
+(в состоянии файла, вместе с текстами товаров), а состояние меняется только под межпроцессной блокировкой файла,
+поэтому ни параллельные выдачи, ни падение бота посреди выдачи не приводят к повторной выдаче или потере товара.
+
+Кол-во товаров кэшируется в памяти вместе с подписью файла и его состояния (inode, размер, время изменения).
+Пока запущен ProductsWatcher (inotify, а если он недоступен - периодический обход папок), кэш считается актуальным
+до уведомления об изменении файла, и получение кол-ва товаров не требует ни одного обращения к диску.
+"""
+
+from __future__ import annotations
+from typing import IO, Generator
+import ctypes.util
+import threading
+import ctypes
+import struct
+import shutil
+import mmap
+import hashlib
+import logging
+import psutil
+import json
+import time
+import sys
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+import Utils.exceptions
+
+
+logger = logging.getLogger("FPC.products")
+
+
+PRODUCTS_DIR = "storage/products"
+"""Папка с файлами товаров."""
+
+STATE_DIR = "storage/cache/products"
+"""Папка, в которой хранятся состояния файлов с товарами."""
+
+CHUNK_SIZE = 16 * 1024 * 1024
+"""Размер куска (в байтах), которыми читаются файлы с товарами при подсчете и копировании."""
+
+HEAD_CHECK_BYTES = 64
+"""Сколько байт перед смещением головы сверяется, чтобы заметить замену / редактирование файла."""
+
+
+def count_lines(data: bytes) -> int:
+    """
+    :return: кол-во непустых строк.
+    """
+    if not data:
+        return 0
+    if b"\r" not in data:
+        blank_lines = b"\n\n" in data or data.startswith(b"\n")
+    else:
+        blank_lines = b"\n\n" in data or b"\n\r\n" in data or b"\r\r" in data or \
+            data.startswith((b"\n", b"\r\n")) or data.endswith(b"\n\r") or data == b"\r"
+    if blank_lines:
+        # Есть пустые строки: считаем построчно.
+        return sum(1 for i in data.split(b"\n") if i.strip(b"\r"))
+    return data.count(b"\n") + (not data.endswith(b"\n"))
+
+
+def map_file(f: IO[bytes]) -> mmap.mmap | None:
+    """
+    :return: отображение файла в память (только для чтения) или None, если файл пуст.
+    """
+    if not os.fstat(f.fileno()).st_size:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_chunks(f: IO[bytes], start: int = 0, end: int | None = None,
+                chunk_size: int = CHUNK_SIZE) -> Generator[bytes, None, None]:
+    """
+    Читает часть файла кусками по ~chunk_size байт, не разрывая строки (кусок может быть больше chunk_size, только
+    если в нем одна строка длиннее chunk_size).
+
+    :param f: файл, открытый в режиме rb.
+
+    :param start: смещение начала.
+
+    :param end: смещение конца (None - до конца файла).
+
+    :param chunk_size: размер куска.
+    """
+    mm = map_file(f)
+    if mm is None:
+        return
+    with mm:
+        end = len(mm) if end is None else min(end, len(mm))
+        madvise = hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL") and hasattr(mmap, "MADV_DONTNEED")
+        if madvise:
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        released = start - start % mmap.PAGESIZE
+        while start < end:
+            cut = mm.find(b"\n", min(start + chunk_size, end) - 1, end)
+            cut = end if cut == -1 else cut + 1
+            yield mm[start:cut]
+            start = cut
+            if madvise and start - start % mmap.PAGESIZE > released:
+                # Прочитанные страницы больше не нужны: освобождаем их, чтобы память процесса не росла с размером
+                # файла.
+                boundary = start - start % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, released, boundary - released)
+                released = boundary
+
+
+def count_file_lines(f: IO[bytes], start: int = 0, end: int | None = None) -> int:
+    """
+    :return: кол-во непустых строк в части файла (файл читается кусками по CHUNK_SIZE байт).
+    """
+    return sum(count_lines(i) for i in iter_chunks(f, start, end))
+
+
+def read_lines(mm: mmap.mmap, start: int, end: int, amount: int) -> tuple[list[str], int]:
+    """
+    Читает первые amount непустых строк части файла, не декодируя остальные.
+
+    :param mm: отображение файла в память.
+
+    :param start: смещение начала.
+
+    :param end: смещение конца.
+
+    :param amount: кол-во строк.
+
+    :return: (строки, смещение после последней прочитанной строки).
+    """
+    lines = []
+    while start < end and len(lines) < amount:
+        stop = mm.find(b"\n", start, end)
+        line = mm[start:end if stop == -1 else stop]
+        start = end if stop == -1 else stop + 1
+        if line.strip(b"\r"):
+            lines.append(line.decode("utf-8"))
+    return lines, start
+
+
+def get_owner() -> list[int | float]:
+    """
+    :return: идентификатор текущего процесса [PID, время запуска процесса] (PID может быть переиспользован).
+    """
+    return [os.getpid(), psutil.Process().create_time()]
+
+
+def is_owner_alive(owner: list[int | float]) -> bool:
+    """
+    :return: работает ли процесс, создавший резерв.
+    """
+    try:
+        return psutil.Process(owner[0]).create_time() == owner[1]
+    except (psutil.Error, ValueError, IndexError, TypeError):
+        return False
+
+
+class FileLock:
+    """
+    Реентерабельная блокировка, общая для потоков и процессов (через блокировку файла).
+    """
+    def __init__(self, path: str, on_acquire=None):
+        """
+        :param path: путь до файла блокировки.
+
+        :param on_acquire: функция, вызываемая после получения блокировки (не вложенного).
+        """
+        self.path = path
+        self.on_acquire = on_acquire
+        self.thread_lock = threading.RLock()
+        self.file: IO | None = None
+        self.depth = 0
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.file = open(self.path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            self.file.seek(0)
+                            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+            except:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        if self.depth == 1 and self.on_acquire is not None:
+            self.on_acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+
+class Reservation:
+    """
+    Резерв товаров за заказом.
+    """
+    def __init__(self, store: ProductStore, order_id: str, products: list[str], left: int):
+        """
+        :param store: хранилище товаров.
+
+        :param order_id: ID заказа.
+
+        :param products: зарезервированные товары.
+
+        :param left: кол-во свободных товаров после резервирования.
+        """
+        self.store = store
+        self.order_id = order_id
+        self.products = products
+        self.left = left
+
+    def commit(self) -> None:
+        """
+        Подтверждает выдачу товаров.
+        """
+        self.store.commit(self.order_id)
+
+    def rollback(self) -> None:
+        """
+        Возвращает товары на исходное место.
+        """
+        self.store.rollback(self.order_id)
+
+
+class ProductStore:
+    """
+    Хранилище товаров одного файла. Состояние (смещение головы, кол-во товаров, размер файла, журнал резервов)
+    хранится в STATE_DIR/<имя файла>.json. Если файл был заменен или отредактирован вне хранилища, состояние
+    пересчитывается (все его строки считаются свободными товарами); если в файл дописали товары - пересчитывается
+    только дописанная часть.
+
+    Свободные товары - строки после головы и строки возвращенных резервов (они выдаются первыми, т.к. стояли в
+    файле раньше головы). Строки резервов и возвращенных резервов не удаляются при уплотнении.
+    """
+    def __init__(self, path: str, state_dir: str = STATE_DIR):
+        """
+        :param path: путь до файла с товарами.
+
+        :param state_dir: папка, в которой хранится состояние файла.
+        """
+        self.path = path
+        self.state_path = os.path.join(state_dir, f"{os.path.basename(path)}.json")
+        # Папки файла и его состояния (для ProductsWatcher).
+        self.directories = (os.path.dirname(os.path.abspath(path)), os.path.abspath(state_dir))
+        self.lock = FileLock(os.path.join(state_dir, f"{os.path.basename(path)}.lock"), self._invalidate)
+
+        self.offset = 0  # Смещение головы (в байтах).
+        self.count = 0  # Кол-во свободных товаров.
+        self.size = 0  # Размер файла при последней синхронизации.
+        self.ino = 0  # inode файла при последней синхронизации.
+        self.mtime = 0  # Время изменения файла (в наносекундах) при последней синхронизации.
+        self.head_hash = ""  # Хэш HEAD_CHECK_BYTES байт перед смещением головы.
+        self.tail_hash = ""  # Хэш последних HEAD_CHECK_BYTES байт файла при последней синхронизации.
+        # Журнал резервов {ID заказа: {"products": [...], "ranges": [[начало, конец], ...], "owner": [...],
+        # "time": ...}}. Если ranges пуст - исходное место товаров неизвестно (файл заменен / процесс завершился).
+        self.reservations: dict[str, dict] = {}
+        self.returned: list[list[int]] = []  # Возвращенные резервы [[начало, конец, кол-во товаров], ...]
+        self.compacting: list[int] | None = None  # Незавершенное уплотнение [смещение начала, старый размер].
+        # Поколение файла (меняется, если файл заменен / отредактирован вне хранилища) и кол-во байт, удаленных из
+        # начала файла уплотнениями. Вместе позволяют отслеживать позицию в файле между уплотнениями
+        # (см. Utils.products_index.HashIndex).
+        self.generation = ""
+        self.removed = 0
+        self.loaded = False
+
+        # Кэш кол-ва товаров: ((подпись файла, подпись состояния), кол-во). Подпись - (inode, размер, время изменения).
+        self.cached: tuple[tuple, int] | None = None
+        self.version = 0  # Увеличивается ProductsWatcher при изменении файла или его состояния.
+        self.checked_version = -1  # Версия, при которой подпись была сверена с диском.
+
+    @staticmethod
+    def _read_hash(f, offset: int) -> str:
+        """
+        :return: хэш HEAD_CHECK_BYTES байт перед offset.
+        """
+        start = max(0, offset - HEAD_CHECK_BYTES)
+        f.seek(start)
+        return hashlib.blake2b(f.read(offset - start), digest_size=8).hexdigest()
+
+    @staticmethod
+    def _find_line_start(f, position: int, lower: int) -> int:
+        """
+        :return: позиция начала строки, в которой находится байт position - 1 (но не меньше lower).
+        """
+        while position > lower:
+            start = max(lower, position - 4096)
+            f.seek(start)
+            chunk = f.read(position - start)
+            index = chunk.rfind(b"\n")
+            if index != -1:
+                return start + index + 1
+            position = start
+        return lower
+
+    def _invalidate(self) -> None:
+        # Состояние могло быть изменено другим процессом, пока блокировка была свободна.
+        self.loaded = False
+
+    def _load_state(self) -> None:
+        self.loaded = True
+        self.reservations, self.returned, self.compacting = {}, [], None
+        if not os.path.exists(self.state_path):
+            self.size = -1
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.loads(f.read())
+            self.offset, self.count, self.size, self.mtime = (state["offset"], state["count"], state["size"],
+                                                              state["mtime"])
+            self.head_hash, self.tail_hash = state["head_hash"], state["tail_hash"]
+            self.ino = state.get("ino", 0)
+            self.generation, self.removed = state.get("generation", ""), state.get("removed", 0)
+            self.reservations = state.get("reservations", {})
+            self.returned = state.get("returned", [])
+            self.compacting = state.get("compacting")
+        except (OSError, ValueError, KeyError):
+            logger.warning(f"Состояние файла с товарами {self.path} повреждено, пересчитываю товары.")
+            self.size = -1
+            return
+
+        changed = False
+        if self.compacting is not None:
+            self._finish_compaction()
+            changed = True
+        for order_id, reservation in self.reservations.items():
+            if reservation["ranges"] and not is_owner_alive(reservation["owner"]):
+                # Процесс завершился посреди выдачи: неизвестно, отправлен ли товар. Товары не возвращаются
+                # в продажу (чтобы не выдать их повторно), но остаются в журнале.
+                logger.warning(f"Незавершенная выдача товаров из файла {self.path} для заказа {order_id}: "
+                               f"{len(reservation['products'])} шт. Товары сохранены в {self.state_path}.")
+                reservation["ranges"] = []
+                changed = True
+        if changed:
+            self._save_state()
+
+    def _save_state(self) -> None:
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(f"{self.state_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps({"offset": self.offset, "count": self.count, "size": self.size, "mtime": self.mtime,
+                                "ino": self.ino, "generation": self.generation, "removed": self.removed,
+                                "head_hash": self.head_hash, "tail_hash": self.tail_hash,
+                                "reservations": self.reservations, "returned": self.returned,
+                                "compacting": self.compacting}, ensure_ascii=False))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+        self._cache_count()
+
+    def _get_state_signature(self) -> tuple[int, int, int]:
+        stat = os.stat(self.state_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _cache_count(self) -> None:
+        """
+        Кэширует кол-во товаров. Подпись файла берется из последней синхронизации (а не с диска), поэтому изменения,
+        сделанные вне хранилища после синхронизации, не попадут в кэш незамеченными.
+        """
+        self.cached = ((self.ino, self.size, self.mtime), self._get_state_signature()), self.count
+
+    def get_cached_count(self) -> int | None:
+        """
+        :return: кол-во свободных товаров из кэша или None, если кэш устарел.
+        """
+        cached = self.cached
+        if cached is None:
+            return None
+        version = self.version
+        if version != self.checked_version or not is_watched(self):
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns), self._get_state_signature()
+            except OSError:
+                return None
+            if signature != cached[0]:
+                return None
+            self.checked_version = version
+        return cached[1]
+
+    def invalidate(self) -> None:
+        """
+        Помечает кэш кол-ва товаров как требующий сверки с диском.
+        """
+        self.version += 1
+
+    def _sync(self) -> None:
+        """
+        Сверяет состояние с файлом: пересчитывает товары, если файл был заменен / отредактирован, или досчитывает
+        товары, дописанные в конец файла.
+
+        :raises FileNotFoundError: если файла нет.
+        """
+        if not self.loaded:
+            self._load_state()
+        stat = os.stat(self.path)
+        if stat.st_size == self.size and stat.st_mtime_ns == self.mtime and stat.st_ino == self.ino:
+            return
+
+        with open(self.path, "rb") as f:
+            if self.size < 0 or stat.st_size <= self.size or self.offset > self.size or \
+                    self._read_hash(f, self.offset) != self.head_hash or \
+                    self._read_hash(f, self.size) != self.tail_hash:
+                # Файл заменен или отредактирован: все его строки - свободные товары.
+                self.offset, self.count = 0, count_file_lines(f)
+                self.head_hash = self._read_hash(f, 0)
+                self.generation, self.removed = os.urandom(8).hex(), 0
+                self.returned = []
+                for reservation in self.reservations.values():
+                    reservation["ranges"] = []
+            else:
+                # В конец файла дописаны товары. Последняя строка до дописывания могла быть продолжена,
+                # поэтому она пересчитывается заново.
+                line_start = self._find_line_start(f, self.size, self.offset)
+                f.seek(line_start)
+                old_last_line = f.read(self.size - line_start)
+                self.count += count_file_lines(f, line_start) - count_lines(old_last_line)
+            self._update_size(f)
+        self._save_state()
+
+    def _update_size(self, f) -> None:
+        """
+        Запоминает размер, время изменения и хэш конца файла.
+        """
+        stat = os.fstat(f.fileno())
+        self.size, self.mtime, self.ino = stat.st_size, stat.st_mtime_ns, stat.st_ino
+        self.tail_hash = self._read_hash(f, self.size)
+
+    def _take(self, amount: int) -> tuple[list[str], list[list[int]]]:
+        """
+        Забирает свободные товары: сначала из возвращенных резервов, затем с головы файла.
+
+        :return: (товары, занятые ими диапазоны файла).
+        """
+        if not self.count:
+            raise Utils.exceptions.NoProductsError(self.path)
+        if self.count < amount:
+            raise Utils.exceptions.NotEnoughProductsError(self.path, self.count, amount)
+
+        products = []
+        ranges = []
+        returned = [list(i) for i in self.returned]
+        with open(self.path, "rb") as f:
+            mm = map_file(f) or b""
+            try:
+                size = min(len(mm), self.size)
+                while returned and len(products) < amount:
+                    start, end, left = returned[0]
+                    lines, position = read_lines(mm, start, min(end, size), min(amount - len(products), left))
+                    products.extend(lines)
+                    ranges.append([start, position])
+                    if position >= end or len(lines) >= left:
+                        returned.pop(0)
+                    else:
+                        returned[0] = [position, end, left - len(lines)]
+
+                offset = self.offset
+                if len(products) < amount:
+                    lines, offset = read_lines(mm, self.offset, size, amount - len(products))
+                    products.extend(lines)
+                    ranges.append([self.offset, offset])
+            finally:
+                if isinstance(mm, mmap.mmap):
+                    mm.close()
+
+        if len(products) < amount:
+            # Состояние не соответствует файлу (например, файл изменен без изменения размера и времени изменения).
+            logger.error(f"В файле {self.path} меньше товаров, чем указано в его состоянии.")
+            raise Utils.exceptions.NotEnoughProductsError(self.path, len(products), amount)
+        if offset != self.offset:
+            with open(self.path, "rb") as f:
+                self.head_hash = self._read_hash(f, offset)
+        self.offset = offset
+        self.returned = returned
+        self.count -= amount
+        return products, ranges
+
+    def get(self, amount: int = 1) -> tuple[list[str], int]:
+        """
+        Забирает товары (без резервирования).
+
+        :param amount: кол-во товара.
+
+        :return: (товары, оставшееся кол-во товара).
+        """
+        with self.lock:
+            self._sync()
+            products, _ = self._take(amount)
+            self._save_state()
+            self._compact_if_needed()
+            return products, self.count
+
+    def reserve(self, order_id: str, amount: int = 1) -> Reservation:
+        """
+        Резервирует товары за заказом. Повторный вызов с тем же ID заказа возвращает тот же резерв.
+
+        :param order_id: ID заказа.
+
+        :param amount: кол-во товара.
+
+        :return: резерв.
+        """
+        with self.lock:
+            self._sync()
+            if order_id in self.reservations:
+                return Reservation(self, order_id, self.reservations[order_id]["products"], self.count)
+            products, ranges = self._take(amount)
+            self.reservations[order_id] = {"products": products, "ranges": ranges, "owner": get_owner(),
+                                           "time": int(time.time())}
+            self._save_state()
+            return Reservation(self, order_id, products, self.count)
+
+    def commit(self, order_id: str) -> None:
+        """
+        Подтверждает выдачу зарезервированных товаров (удаляет резерв из журнала).
+
+        :param order_id: ID заказа.
+        """
+        with self.lock:
+            self._sync()
+            if self.reservations.pop(order_id, None) is None:
+                return
+            self._save_state()
+            self._compact_if_needed()
+
+    def rollback(self, order_id: str) -> None:
+        """
+        Возвращает зарезервированные товары на исходное место (если оно известно, иначе - в конец файла).
+
+        :param order_id: ID заказа.
+        """
+        with self.lock:
+            self._sync()
+            reservation = self.reservations.pop(order_id, None)
+            if reservation is None:
+                return
+            if not reservation["ranges"]:
+                self._save_state()
+                self.add(reservation["products"])
+                return
+            with open(self.path, "rb") as f:
+                for start, end in reservation["ranges"]:
+                    f.seek(start)
+                    self.returned.append([start, end, count_lines(f.read(end - start))])
+            self.returned.sort()
+            self.count += len(reservation["products"])
+            self._save_state()
+
+    def get_reservations(self) -> dict[str, list[str]]:
+        """
+        :return: незавершенные резервы {ID заказа: товары}.
+        """
+        with self.lock:
+            self._sync()
+            return {k: list(v["products"]) for k, v in self.reservations.items()}
+
+    def add(self, products: list[str]) -> None:
+        """
+        Дописывает товары в конец файла.
+
+        :param products: товары.
+        """
+        with self.lock:
+            self._sync()
+            data = "\n".join(products).encode("utf-8")
+            with open(self.path, "a+b") as f:
+                if self.size:
+                    f.seek(self.size - 1)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write(data)
+            with open(self.path, "rb") as f:
+                self._update_size(f)
+            self.count += count_lines(data)
+            self._save_state()
+
+    def open_unsold(self) -> tuple[IO[bytes], int]:
+        """
+        Открывает файл для чтения невыданных товаров. Смещение берется под блокировкой вместе с открытием файла,
+        поэтому уплотнение после открытия (замена файла) не сдвигает его.
+
+        :return: (файл, открытый в режиме rb, смещение первой невыданной строки).
+        """
+        with self.lock:
+            self._sync()
+            f = open(self.path, "rb")
+            return f, self._get_base()
+
+    def sync(self) -> None:
+        """
+        Сверяет состояние с файлом (см. ProductStore._sync).
+        """
+        with self.lock:
+            self._sync()
+
+    def get_count(self) -> int:
+        """
+        :return: кол-во свободных товаров.
+        """
+        count = self.get_cached_count()
+        if count is not None:
+            return count
+        os.stat(self.path)  # Чтобы не создавать блокировку для несуществующего файла.
+        with self.lock:
+            self._sync()
+            self._cache_count()
+            return self.count
+
+    def _get_base(self) -> int:
+        """
+        :return: смещение первой строки, которую нельзя удалить при уплотнении.
+        """
+        positions = [self.offset] + [i[0] for i in self.returned] + \
+                    [i[0] for r in self.reservations.values() for i in r["ranges"]]
+        return min(positions)
+
+    def _compact_if_needed(self) -> None:
+        """
+        Уплотняет файл, если в его начале есть выданные строки (вызывается после выдачи под блокировкой файла).
+        """
+        if self._get_base():
+            try:
+                self.compact()
+            except OSError:
+                # Например, на Windows файл нельзя заменить, пока он открыт другим процессом / отображен в память.
+                logger.warning(f"Не удалось уплотнить файл с товарами {self.path}.")
+                logger.debug("------TRACEBACK------", exc_info=True)
+
+    def compact(self) -> None:
+        """
+        Уплотняет файл: удаляет из него выданные строки.
+        """
+        with self.lock:
+            self._sync()
+            base = self._get_base()
+            if not base:
+                return
+            with open(self.path, "rb") as f, open(f"{self.path}.tmp", "wb") as new_file:
+                if self.count or base != self.offset:
+                    f.seek(base)
+                    shutil.copyfileobj(f, new_file, CHUNK_SIZE)
+                new_file.flush()
+                os.fsync(new_file.fileno())
+            # Отметка в журнале: если бот упадет между заменой файла и сохранением новых смещений, смещения будут
+            # пересчитаны при загрузке состояния.
+            self.compacting = [base, self.size]
+            self._save_state()
+            try:
+                os.replace(f"{self.path}.tmp", self.path)
+            except OSError:
+                self.compacting = None
+                self._save_state()
+                os.remove(f"{self.path}.tmp")
+                raise
+            self._finish_compaction()
+            self._save_state()
+            logger.debug(f"Файл с товарами {self.path} уплотнен.")
+
+    def _finish_compaction(self) -> None:
+        """
+        Завершает уплотнение: сдвигает смещения, если файл уже заменен, иначе отменяет уплотнение.
+        """
+        base, old_size = self.compacting[:2]
+        self.compacting = None
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == old_size:
+            return
+        shift = lambda position: max(0, position - base)
+        self.offset = shift(self.offset)
+        self.returned = [[shift(i[0]), shift(i[1]), i[2]] for i in self.returned]
+        for reservation in self.reservations.values():
+            reservation["ranges"] = [[shift(i[0]), shift(i[1])] for i in reservation["ranges"]]
+        with open(self.path, "rb") as f:
+            self.head_hash = self._read_hash(f, self.offset)
+            self._update_size(f)
+        self.removed += old_size - self.size
+
+
+_stores: dict[str, ProductStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str) -> ProductStore:
+    """
+    :return: хранилище товаров файла (одно на файл для всех потоков).
+    """
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ProductStore(path)
+        return _stores[key]
+
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+
+
+class ProductsWatcher:
+    """
+    Следит за изменениями в папках с товарами и их состояниями и сбрасывает кэш кол-ва товаров измененных файлов.
+    На Linux использует inotify, в остальных случаях (или если inotify недоступен) - обходит папки раз в interval
+    секунд.
+    """
+    def __init__(self, directories: list[str], interval: float = 5.0):
+        """
+        :param directories: папки, за которыми необходимо следить.
+
+        :param interval: интервал обхода папок (в секундах), если inotify недоступен.
+        """
+        self.directories = [os.path.abspath(i) for i in directories]
+        self.interval = interval
+        self.alive = False  # Актуальны ли уведомления (кэш можно не сверять с диском).
+        self.backend = None
+
+    def start(self) -> None:
+        threading.Thread(target=self.loop, daemon=True, name="ProductsWatcher").start()
+
+    def notify(self, name: str | None = None) -> None:
+        """
+        Сбрасывает кэш хранилищ, которым принадлежит файл name (None - кэш всех хранилищ).
+        """
+        for store in list(_stores.values()):
+            if name is None or name in (os.path.basename(store.path), os.path.basename(store.state_path)):
+                store.invalidate()
+
+    def loop(self) -> None:
+        if sys.platform.startswith("linux"):
+            try:
+                self.inotify_loop()
+            except Exception:
+                logger.warning("Не удалось отслеживать изменения файлов с товарами через inotify, "
+                               "перехожу на периодическую проверку.")
+                logger.debug("------TRACEBACK------", exc_info=True)
+            self.alive = False
+            self.notify()
+        self.polling_loop()
+
+    def inotify_loop(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        try:
+            mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+                IN_DELETE_SELF | IN_MOVE_SELF
+            for directory in self.directories:
+                os.makedirs(directory, exist_ok=True)
+                if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                    raise OSError(ctypes.get_errno(), "inotify_add_watch", directory)
+            # Изменения, сделанные до начала наблюдения, не должны остаться незамеченными.
+            self.notify()
+            self.backend = "inotify"
+            self.alive = True
+            while True:
+                data = os.read(fd, 65536)
+                position = 0
+                while position < len(data):
+                    _, event_mask, _, length = struct.unpack_from("iIII", data, position)
+                    name = data[position + 16:position + 16 + length].rstrip(b"\0")
+                    position += 16 + length
+                    if event_mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                        raise OSError("Папка, за которой велось наблюдение, удалена или перемещена.")
+                    self.notify(os.fsdecode(name) if name and not event_mask & IN_Q_OVERFLOW else None)
+        finally:
+            os.close(fd)
+
+    def _scan(self) -> dict[str, tuple[int, int, int]]:
+        files = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        return files
+
+    def polling_loop(self) -> None:
+        self.backend = "polling"
+        files = self._scan()
+        self.notify()
+        self.alive = True
+        while True:
+            time.sleep(self.interval)
+            new_files = self._scan()
+            for name in files.keys() | new_files.keys():
+                if files.get(name) != new_files.get(name):
+                    self.notify(name)
+            files = new_files
+
+
+_watcher: ProductsWatcher | None = None
+
+
+def start_watcher(directories: list[str] | None = None, interval: float = 5.0) -> ProductsWatcher:
+    """
+    Запускает наблюдение за файлами с товарами (если оно еще не запущено).
+
+    :param directories: папки, за которыми необходимо следить (по умолчанию - PRODUCTS_DIR и STATE_DIR).
+
+    :param interval: интервал обхода папок (в секундах), если inotify недоступен.
+
+    :return: наблюдатель.
+    """
+    global _watcher
+    with _stores_lock:
+        if _watcher is None:
+            _watcher = ProductsWatcher(directories or [PRODUCTS_DIR, STATE_DIR], interval)
+            _watcher.start()
+        return _watcher
+
+
+def is_watched(store: ProductStore) -> bool:
+    """
+    :return: отслеживаются ли изменения файла хранилища и его состояния.
+    """
+    watcher = _watcher
+    return watcher is not None and watcher.alive and all(i in watcher.directories for i in store.directories)
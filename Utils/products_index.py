@@ -0,0 +1,338 @@
+"""
+В данном модуле написан потоковый импорт товаров с опциональной проверкой на дубликаты. Если проверка включена,
+товары, которые уже есть в наличии (свободные и зарезервированные строки файла, без уже выданных), и повторы внутри
+загрузки пропускаются, поэтому повторная загрузка той же пачки товаров не пополняет склад повторно, а выданный
+товар можно загрузить снова.
+
+Индекс наличия строится в памяти при каждом импорте (выданные строки меняются с каждой выдачей): отсортированный
+массив 64-битных хэшей и, опционально, фильтр Блума, который отсеивает заведомо новые товары без поиска по массиву.
+"""
+
+from __future__ import annotations
+from typing import IO, Callable, Iterable, Generator
+from array import array
+import threading
+import bisect
+import hashlib
+import logging
+import time
+import os
+
+from Utils import products
+
+
+logger = logging.getLogger("FPC.products_index")
+
+
+MAX_PRODUCT_LENGTH = 10000
+"""Максимальная длина товара (в символах). Более длинные строки отклоняются при импорте."""
+
+BATCH_SIZE = 10000
+"""Кол-во товаров, которое проверяется и дописывается в файл за один захват блокировки файла."""
+
+BLOOM_BITS = 16
+"""Кол-во бит фильтра Блума на один хэш."""
+
+BLOOM_HASHES = 4
+"""Кол-во хэш-функций фильтра Блума."""
+
+
+def normalize_product(line: bytes | str) -> str:
+    """
+    Нормализует строку товара: декодирует UTF-8, убирает пробельные символы и BOM по краям.
+
+    :param line: строка.
+
+    :return: товар ("" - пустая строка).
+
+    :raises ValueError: если строка не является корректным текстом UTF-8 или длиннее MAX_PRODUCT_LENGTH символов.
+    """
+    text = line.decode("utf-8") if isinstance(line, bytes) else line
+    text = text.strip().strip("\ufeff").strip()
+    if len(text) > MAX_PRODUCT_LENGTH:
+        raise ValueError(f"Длина товара превышает {MAX_PRODUCT_LENGTH} символов.")
+    return text
+
+
+def hash_product(text: str) -> int:
+    """
+    :return: 64-битный хэш товара.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Generator[bytes, None, None]:
+    """
+    Разбивает поток байт (например, скачиваемый файл) на строки.
+
+    :param chunks: куски потока.
+    """
+    rest = b""
+    for chunk in chunks:
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+class BloomFilter:
+    """
+    Фильтр Блума для 64-битных хэшей.
+    """
+    def __init__(self, capacity: int, data: bytearray | None = None):
+        """
+        :param capacity: кол-во хэшей, на которое рассчитан фильтр.
+
+        :param data: биты фильтра (если фильтр загружен из файла, capacity игнорируется).
+        """
+        bits = len(data) * 8 if data else 1 << max(16, (capacity * BLOOM_BITS - 1).bit_length())
+        self.capacity = bits // BLOOM_BITS
+        self.mask = bits - 1
+        self.data = data or bytearray(bits // 8)
+
+    def add(self, value: int) -> None:
+        data, mask = self.data, self.mask
+        low, high = value & 0xFFFFFFFF, (value >> 32) | 1
+        for i in range(BLOOM_HASHES):
+            position = (low + i * high) & mask
+            data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: int) -> bool:
+        data, mask = self.data, self.mask
+        low, high = value & 0xFFFFFFFF, (value >> 32) | 1
+        for i in range(BLOOM_HASHES):
+            position = (low + i * high) & mask
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class HashIndex:
+    """
+    Индекс хэшей товаров, которые есть в наличии в файле. Хэши, добавленные после построения индекса, хранятся в
+    отдельном множестве.
+
+    Индекс помнит поколение файла и проиндексированную позицию (с учетом байт, удаленных уплотнениями, см.
+    Utils.products.ProductStore), поэтому товары, дописанные в файл во время импорта в обход него, тоже попадают в
+    индекс, а при замене файла индекс строится заново.
+    """
+    def __init__(self, bloom: bool = False):
+        """
+        :param bloom: использовать ли фильтр Блума.
+        """
+        self.hashes = array("Q")
+        self.new: set[int] = set()
+        self.bloom: BloomFilter | None = None
+        self.use_bloom = bloom
+        self.generation = ""
+        self.position = 0  # Проиндексированная позиция (смещение в файле + байты, удаленные уплотнениями).
+
+    def __contains__(self, value: int) -> bool:
+        if self.bloom is not None and value not in self.bloom:
+            return False
+        if value in self.new:
+            return True
+        index = bisect.bisect_left(self.hashes, value)
+        return index < len(self.hashes) and self.hashes[index] == value
+
+    def add(self, value: int) -> None:
+        self.new.add(value)
+        if self.bloom is not None:
+            self.bloom.add(value)
+
+    @staticmethod
+    def _iter_hashes(f: IO[bytes], start: int, end: int) -> Generator[int, None, None]:
+        """
+        Хэширует непустые товары части файла.
+        """
+        for chunk in products.iter_chunks(f, start, end):
+            for line in chunk.split(b"\n"):
+                try:
+                    text = normalize_product(line)
+                except ValueError:
+                    continue
+                if text:
+                    yield hash_product(text)
+
+    def build(self, f: IO[bytes], generation: str, removed: int, size: int, ranges: list[tuple[int, int]]) -> None:
+        """
+        Строит индекс товаров, которые есть в наличии.
+
+        :param f: файл с товарами, открытый в режиме rb.
+
+        :param generation: поколение файла.
+
+        :param removed: кол-во байт, удаленных из начала файла уплотнениями.
+
+        :param size: размер файла.
+
+        :param ranges: части файла с товарами в наличии [(начало, конец), ...].
+        """
+        self.hashes = array("Q", sorted({value for start, end in ranges for value in self._iter_hashes(f, start, end)}))
+        self.new = set()
+        if self.use_bloom:
+            self.bloom = BloomFilter(len(self.hashes) * 2)
+            for value in self.hashes:
+                self.bloom.add(value)
+        self.generation, self.position = generation, removed + size
+
+    def catch_up(self, store: products.ProductStore) -> None:
+        """
+        Индексирует товары, дописанные в файл после последней индексации (или строит индекс заново, если файл был
+        заменен). Вызывается под блокировкой хранилища после синхронизации.
+
+        :param store: хранилище товаров файла.
+        """
+        with open(store.path, "rb") as f:
+            if store.generation != self.generation:
+                self.build(f, store.generation, store.removed, store.size, get_stock_ranges(store))
+                return
+            for value in self._iter_hashes(f, max(0, self.position - store.removed), store.size):
+                if value not in self:
+                    self.add(value)
+        self.position = store.removed + store.size
+
+
+def get_stock_ranges(store: products.ProductStore) -> list[tuple[int, int]]:
+    """
+    :return: части файла с товарами в наличии (свободными и зарезервированными) [(начало, конец), ...].
+    Вызывается под блокировкой хранилища после синхронизации.
+    """
+    ranges = [(i[0], i[1]) for i in store.returned]
+    ranges.extend((i[0], i[1]) for reservation in store.reservations.values() for i in reservation["ranges"])
+    ranges.append((store.offset, store.size))
+    return ranges
+
+
+class ImportReport:
+    """
+    Отчет об импорте товаров.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: путь до файла с товарами.
+        """
+        self.path = path
+        self.lines = 0  # Обработано строк.
+        self.added = 0  # Добавлено товаров.
+        self.duplicates = 0  # Пропущено дубликатов (уже есть в наличии или повторяются в загрузке).
+        self.rejected = 0  # Отклонено строк (не UTF-8 или слишком длинные).
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self.error: Exception | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+
+_import_locks: dict[str, threading.Lock] = {}
+_import_locks_lock = threading.Lock()
+
+
+def _add_batch(store: products.ProductStore, index: HashIndex | None, batch: list[str],
+               report: ImportReport) -> None:
+    """
+    Дописывает в файл товары пачки (если передан индекс - только те, которых нет в наличии).
+    """
+    with store.lock:
+        store.sync()
+        if index is None:
+            new = batch
+        else:
+            index.catch_up(store)
+            new = []
+            for text in batch:
+                value = hash_product(text)
+                if value in index:
+                    report.duplicates += 1
+                    continue
+                index.add(value)
+                new.append(text)
+        if new:
+            store.add(new)
+            report.added += len(new)
+        if index is not None:
+            index.position = store.removed + store.size
+
+
+def import_products(path: str, lines: Iterable[bytes | str], deduplicate: bool = False, bloom: bool = False,
+                    on_progress: Callable[[ImportReport], None] | None = None,
+                    progress_interval: float = 2.0) -> ImportReport:
+    """
+    Импортирует товары в файл: нормализует строки, отклоняет некорректные и дописывает товары в конец файла
+    (если включена проверка на дубликаты - только те, которых нет в наличии и которые еще не встречались в загрузке).
+    Строки обрабатываются потоком, пачками по BATCH_SIZE, поэтому блокировка файла (и выдача товаров из него) не
+    задерживается на все время импорта. Если файла нет - он будет создан.
+
+    :param path: путь до файла с товарами.
+
+    :param lines: строки (например, Utils.products_index.iter_lines от скачиваемого файла).
+
+    :param deduplicate: пропускать ли дубликаты.
+
+    :param bloom: использовать ли фильтр Блума при поиске дубликатов.
+
+    :param on_progress: функция, вызываемая с отчетом не чаще, чем раз в progress_interval секунд (и в конце
+    импорта).
+
+    :param progress_interval: интервал вызова on_progress (в секундах).
+
+    :return: отчет об импорте.
+    """
+    with _import_locks_lock:
+        import_lock = _import_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with import_lock:
+        return _import_products(path, lines, deduplicate, bloom, on_progress, progress_interval)
+
+
+def _import_products(path: str, lines: Iterable[bytes | str], deduplicate: bool, bloom: bool,
+                     on_progress: Callable[[ImportReport], None] | None, progress_interval: float) -> ImportReport:
+    if not os.path.exists(path):
+        with open(path, "wb"):
+            pass
+    store = products.get_store(path)
+    report = ImportReport(path)
+
+    index = None
+    if deduplicate:
+        # Индекс строится без блокировки хранилища (чтобы не задерживать выдачу товаров): открытый файл остается
+        # прежним, даже если его заменит уплотнение. Под блокировкой индексируются только товары, дописанные во время
+        # импорта. Товары, выданные во время импорта, остаются в индексе до его окончания.
+        index = HashIndex(bloom)
+        with store.lock:
+            store.sync()
+            generation, removed, size, ranges = store.generation, store.removed, store.size, get_stock_ranges(store)
+            f = open(path, "rb")
+        with f:
+            index.build(f, generation, removed, size, ranges)
+
+    last_progress = time.time()
+    batch = []
+    try:
+        for line in lines:
+            report.lines += 1
+            try:
+                text = normalize_product(line)
+            except ValueError:
+                report.rejected += 1
+                continue
+            if text:
+                batch.append(text)
+            if len(batch) >= BATCH_SIZE:
+                _add_batch(store, index, batch, report)
+                batch = []
+            if on_progress is not None and time.time() - last_progress >= progress_interval:
+                last_progress = time.time()
+                on_progress(report)
+        if batch:
+            _add_batch(store, index, batch, report)
+    except Exception as e:
+        report.error = e
+        raise
+    finally:
+        report.finished_at = time.time()
+        if on_progress is not None:
+            on_progress(report)
+    return report
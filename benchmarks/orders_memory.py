@@ -0,0 +1,120 @@
+"""
+Сравнение памяти, занимаемой заказами, в прежней модели (экземпляры с __dict__, HTML код строки заказа хранится,
+строки не интернируются) и в текущей (FunPayAPI.types.Order: __slots__, без HTML, интернированные названия и
+никнеймы).
+
+Строки каждого заказа создаются заново (как при парсинге страницы заказов), поэтому одинаковые названия и никнеймы
+разных заказов - разные объекты, пока их не интернирует модель.
+
+Запуск из корня репозитория: python benchmarks/orders_memory.py [кол-во заказов]
+"""
+
+from __future__ import annotations
+from typing import Callable
+import tracemalloc
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FunPayAPI.types import Order, OrderStatuses
+
+
+ORDERS = 10000
+BUYERS = 2000
+"""Кол-во разных покупателей."""
+
+TITLES = ["Steam Random Key, 1 шт.", "Аккаунт Genshin Impact AR 55, Европа, 1 шт.",
+          "Robux 800 R$, Пополнение по логину и паролю", "Telegram Premium 3 месяца, подарком",
+          "Золото WoW Classic, Пламегор, Альянс, 1000 шт."]
+
+ROW_TEMPLATE = """<a href="https://funpay.com/orders/{id}/" class="tc-item">
+    <div class="tc-date">
+        <div class="tc-date-time">8 января, 12:34</div><div class="tc-date-left">1 день назад</div>
+    </div>
+    <div class="tc-order">#{id}</div>
+    <div class="order-desc"><div>{title}</div><div class="text-muted">Прочее</div></div>
+    <div class="tc-user"><div class="media media-user offline"><div class="media-left">
+        <div class="avatar-photo pseudo-a" tabindex="0" data-href="https://funpay.com/users/{buyer_id}/"
+             style="background-image: url(https://s.funpay.com/s/avatar/6d/h3/6dh3m89zv8k90kwlj9bg.jpg);"></div>
+    </div><div class="media-body"><div class="media-user-name">
+        <span class="pseudo-a" tabindex="0" data-href="https://funpay.com/users/{buyer_id}/">{buyer}</span>
+    </div><div class="media-user-status">был 2 часа назад</div></div></div></div>
+    <div class="tc-status text-success">Закрыт</div>
+    <div class="tc-price text-nowrap tc-seller-sum">{price} <span class="unit">₽</span></div>
+</a>"""
+"""Строка таблицы заказов (~1000 символов, как на странице заказов)."""
+
+
+class LegacyOrder:
+    """
+    Заказ в прежней модели (без __slots__ и интернирования).
+    """
+    def __init__(self, html: str | None, id_: str, title: str, price: float, buyer_username: str, buyer_id: int,
+                 status: OrderStatuses, date: int | None = None):
+        self.html = html
+        self.id = id_
+        self.title = title
+        self.price = price
+        self.buyer_username = buyer_username
+        self.buyer_id = buyer_id
+        self.status = status
+        self.date = date
+
+
+def generate_rows(count: int) -> list[dict]:
+    """
+    :return: данные строк таблицы заказов.
+    """
+    rnd = random.Random(0)
+    rows = []
+    for i in range(count):
+        buyer_id = rnd.randrange(BUYERS)
+        rows.append({"id": f"{i:08X}", "title": rnd.choice(TITLES), "price": round(rnd.uniform(10, 5000), 2),
+                     "buyer": f"buyer{buyer_id}", "buyer_id": 100000 + buyer_id,
+                     "status": OrderStatuses.COMPLETED, "date": 1700000000 + i * 60})
+    return rows
+
+
+def build(rows: list[dict], factory: Callable, keep_html: bool) -> list:
+    """
+    Создает заказы. Названия и никнеймы собираются заново ("".join), чтобы каждый заказ получил собственные строки
+    (как после парсинга).
+    """
+    orders = []
+    for row in rows:
+        html = ROW_TEMPLATE.format(**row) if keep_html else None
+        orders.append(factory(html, "#" + row["id"], "".join(row["title"]), row["price"], "".join(row["buyer"]),
+                              row["buyer_id"], row["status"], row["date"]))
+    return orders
+
+
+def measure(rows: list[dict], factory: Callable, keep_html: bool) -> int:
+    """
+    :return: кол-во байт, занятых заказами.
+    """
+    tracemalloc.start()
+    orders = build(rows, factory, keep_html)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del orders
+    return size
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ORDERS
+    rows = generate_rows(count)
+    variants = {
+        "прежняя модель, с HTML": (LegacyOrder, True),
+        "прежняя модель, без HTML": (LegacyOrder, False),
+        "текущая модель (Order)": (Order, False)
+    }
+    print(f"Заказов: {count}.")
+    for name, (factory, keep_html) in variants.items():
+        size = measure(rows, factory, keep_html)
+        print(f"{name}: {size / 1024 / 1024:.2f} МиБ ({size / count:.0f} байт/заказ)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Сверка и замер скорости классификатора системных сообщений (FunPayAPI.types.get_system_message_type) с прежним
+классификатором (отдельные регулярные выражения SystemMessageRes, проверяемые по очереди).
+
+Корпус (system_messages.json): тексты сообщений с ожидаемым типом ("type"). Если прежний классификатор
+определял тип иначе (например, находил фразу системного сообщения в середине обычного сообщения), прежний тип
+указан в "legacy_type".
+
+Запуск из корня репозитория: python benchmarks/system_messages.py
+"""
+
+from __future__ import annotations
+import timeit
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FunPayAPI.types import SystemMessageTypes, SystemMessageRes, Message, get_system_message_type
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_messages.json")
+
+ORDINARY_SHARE = 0.8
+"""Доля обычных сообщений в замере скорости."""
+
+
+def legacy_get_system_type(text: str) -> SystemMessageTypes:
+    """
+    Прежний классификатор (Message.get_system_type до объединения регулярных выражений).
+    """
+    res = SystemMessageRes
+    if text == res.DISCORD:
+        return SystemMessageTypes.DISCORD
+
+    if res.ORDER_PURCHASED_RE_1.findall(text) and res.ORDER_PURCHASED_RE_2.findall(text):
+        return SystemMessageTypes.ORDER_PURCHASED
+
+    if res.ORDER_ID_RE.search(text) is None:
+        return SystemMessageTypes.NON_SYSTEM
+
+    sys_msg_types = {
+        SystemMessageTypes.ORDER_CONFIRMED: res.ORDER_CONFIRMED_RE,
+        SystemMessageTypes.NEW_FEEDBACK: res.NEW_FEEDBACK_RE,
+        SystemMessageTypes.NEW_FEEDBACK_ANSWER: res.NEW_FEEDBACK_ANSWER_RE,
+        SystemMessageTypes.FEEDBACK_CHANGED: res.FEEDBACK_CHANGED_RE,
+        SystemMessageTypes.FEEDBACK_DELETED: res.FEEDBACK_DELETED_RE,
+        SystemMessageTypes.REFUND: res.REFUND_RE,
+        SystemMessageTypes.FEEDBACK_ANSWER_CHANGED: res.FEEDBACK_ANSWER_CHANGED_RE,
+        SystemMessageTypes.FEEDBACK_ANSWER_DELETED: res.FEEDBACK_ANSWER_DELETED_RE,
+        SystemMessageTypes.ORDER_CONFIRMED_BY_ADMIN: res.ORDER_CONFIRMED_BY_ADMIN_RE,
+        SystemMessageTypes.PARTIAL_REFUND: res.PARTIAL_REFUND_RE,
+        SystemMessageTypes.ORDER_REOPENED: res.ORDER_REOPENED_RE
+    }
+    for i in sys_msg_types:
+        if sys_msg_types[i].search(text):
+            return i
+    return SystemMessageTypes.NON_SYSTEM
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_parity(corpus: list[dict]) -> list[str]:
+    """
+    Сверяет оба классификатора с ожидаемыми типами и проверяет, что в корпусе есть все типы сообщений.
+
+    :return: список расхождений (пустой, если все совпало).
+    """
+    errors = []
+    for sample in corpus:
+        text, expected = sample["text"], SystemMessageTypes[sample["type"]]
+        legacy_expected = SystemMessageTypes[sample.get("legacy_type", sample["type"])]
+        new, legacy = get_system_message_type(text), legacy_get_system_type(text)
+        if new is not expected:
+            errors.append(f"новый классификатор: {new.name} вместо {expected.name}: {text!r}")
+        if legacy is not legacy_expected:
+            errors.append(f"прежний классификатор: {legacy.name} вместо {legacy_expected.name}: {text!r}")
+
+    missing = set(SystemMessageTypes) - {SystemMessageTypes[i["type"]] for i in corpus}
+    if missing:
+        errors.append(f"в корпусе нет сообщений типов: {', '.join(sorted(i.name for i in missing))}")
+    return errors
+
+
+def get_mix(corpus: list[dict], size: int = 10000) -> list[str]:
+    """
+    :return: выборка текстов с долей обычных сообщений ORDINARY_SHARE.
+    """
+    system = [i["text"] for i in corpus if i["type"] != "NON_SYSTEM"]
+    ordinary = [i["text"] for i in corpus if i["type"] == "NON_SYSTEM"]
+    ordinary_count = int(size * ORDINARY_SHARE)
+    return [ordinary[i % len(ordinary)] for i in range(ordinary_count)] + \
+        [system[i % len(system)] for i in range(size - ordinary_count)]
+
+
+def benchmark(texts: list[str], repeat: int = 5) -> dict[str, float]:
+    """
+    :return: лучшее время классификации одного сообщения (в микросекундах) {"вариант": время}.
+    """
+    variants = {
+        "прежний": lambda: [legacy_get_system_type(i) for i in texts],
+        "новый": lambda: [get_system_message_type(i) for i in texts],
+        "новый, Message.sys_type читается": lambda: [Message(i, 1, "user", set_sys_type=True).sys_type
+                                                     for i in texts],
+        "новый, Message.sys_type не читается": lambda: [Message(i, 1, "user", set_sys_type=True) for i in texts]
+    }
+    return {name: min(timeit.repeat(func, number=1, repeat=repeat)) / len(texts) * 1e6
+            for name, func in variants.items()}
+
+
+def main() -> int:
+    corpus = load_corpus()
+    errors = check_parity(corpus)
+    for error in errors:
+        print(f"РАСХОЖДЕНИЕ: {error}")
+    print(f"Сверено сообщений: {len(corpus)}, расхождений: {len(errors)}.")
+
+    for name, value in benchmark(get_mix(corpus)).items():
+        print(f"{name}: {value:.2f} мкс/сообщение")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,7 @@ from uuid import UUID
 import importlib.util
 import configparser
 import requests
+import hashlib
 import datetime
 import logging
 import random
@@ -21,12 +22,18 @@ import sys
 import os
 
 import FunPayAPI
+from FunPayAPI import retry
 import handlers
 
 from Utils import cardinal_tools
+from Utils import products as products_store
+from Utils.orders_history import OrdersStore, OrdersCrawler
+from Utils.dispatcher import EventDispatcher
+from Utils.outbox import Outbox
 import tg_bot.bot
 
-from threading import Thread
+from threading import Thread, Lock, RLock
+from concurrent.futures import Future
 
 
 logger = logging.getLogger("FPC")
@@ -108,12 +115,45 @@ class Cardinal(object):
                     if not check_proxy(self.proxy):
                         sys.exit()
 
+        # Выбираем самый быстрый бэкенд парсера, результаты которого совпадают с html.parser на сохраненных
+        # страницах. Если сохраненных страниц нет или быстрые бэкенды не установлены - используется html.parser
+        # (см. README, "Быстрые бэкенды парсера").
+        parser_backend = FunPayAPI.parser.select_backend("storage/cache/parser_pages")
+        logger.debug(f"Бэкенд парсера: {parser_backend}.")
+
         self.account = FunPayAPI.account.Account(self.MAIN_CFG["FunPay"]["golden_key"],
                                                  self.MAIN_CFG["FunPay"]["user_agent"],
                                                  proxy=self.proxy)
-        self.runner = FunPayAPI.runner.Runner(self.account)
+        self.runner = FunPayAPI.runner.Runner(self.account,
+                                              max_saved_chats=self.MAIN_CFG["Other"].getint("savedChatsLimit",
+                                                                                            fallback=2000),
+                                              max_saved_orders=self.MAIN_CFG["Other"].getint("savedOrdersLimit",
+                                                                                             fallback=5000),
+                                              legacy_initial_events=self.MAIN_CFG["Other"].getboolean(
+                                                  "legacyInitialEvents", fallback=False),
+                                              piggyback_messages=self.MAIN_CFG["Other"].getboolean(
+                                                  "piggybackMessages", fallback=False),
+                                              watched_chats=self.MAIN_CFG["Other"].getint("watchedChats", fallback=20))
+        # Политика повторных попыток для запросов, которые нужно повторять, пока FunPay не ответит.
+        self.account_retry = retry.RetryPolicy(attempts=None, base_delay=2.0, max_delay=60.0)
         self.telegram: tg_bot.bot.TGBot | None = None
 
+        # Локальная история заказов (все страницы /orders/trade).
+        self.orders_store = OrdersStore("storage/cache/orders.sqlite")
+        self.orders_crawler = OrdersCrawler(self.account, self.orders_store)
+
+        # Диспетчер событий: события разных чатов обрабатываются параллельно, одного чата - по очереди,
+        # заказы - раньше команд, команды - раньше остальных сообщений.
+        self.dispatcher = EventDispatcher(self.handle_event,
+                                          workers=self.MAIN_CFG["Other"].getint("eventWorkers", fallback=4),
+                                          max_queue=self.MAIN_CFG["Other"].getint("eventQueueSize", fallback=1000),
+                                          is_command=self.is_command,
+                                          aging=self.MAIN_CFG["Other"].getfloat("eventAging", fallback=5.0))
+        # Очередь исходящих сообщений: сообщения одного чата отправляются по очереди, разных чатов - параллельно.
+        self.outbox = Outbox(self.__send_message_part,
+                             workers=self.MAIN_CFG["Other"].getint("outboxWorkers", fallback=2),
+                             coalesce=self.MAIN_CFG["Other"].getboolean("outboxCoalesce", fallback=True))
+
         self.running = False
         self.run_id = 0
         self.start_time = int(time.time())
@@ -126,9 +166,14 @@ class Cardinal(object):
         self.current_lots: list[FunPayAPI.types.Lot] = []  # Текущий список лотов (для восстановления / деактивации)
         # Тег последнего event'а, после которого обновлялся self.current_lots
         self.current_lots_last_tag: str | None = None
+        # Блокировка self.current_lots и тегов обновления состояния лотов (события обрабатываются параллельно).
+        self.current_lots_lock = Lock()
+        # Тег новых заказов, выданных до обновления self.current_lots (состояние лотов обновится после него).
+        self.lots_states_pending_tag: str | None = None
         # Тег последнего event'а, после которого обновлялось состояние лотов.
         self.last_state_change_tag: str | None = None
         self.block_list: list[str] = []  # ЧС.
+        self.chats_directory_version = 0  # Версия справочника чатов аккаунта, сохраненная в кэш.
 
         # Хэндлеры
         self.pre_init_handlers = []
@@ -138,6 +183,7 @@ class Cardinal(object):
         self.pre_stop_handlers = []
         self.post_stop_handlers = []
 
+        self.init_snapshot_handlers = []
         self.init_message_handlers = []
         self.messages_list_changed_handlers = []
         self.new_message_handlers = []
@@ -159,6 +205,7 @@ class Cardinal(object):
             "BIND_TO_POST_START": self.post_start_handlers,
             "BIND_TO_PRE_STOP": self.pre_stop_handlers,
             "BIND_TO_POST_STOP": self.post_stop_handlers,
+            "BIND_TO_INITIAL_SNAPSHOT": self.init_snapshot_handlers,
             "BIND_TO_INIT_MESSAGE": self.init_message_handlers,
             "BIND_TO_MESSAGES_LIST_CHANGED": self.messages_list_changed_handlers,
             "BIND_TO_NEW_MESSAGE": self.new_message_handlers,
@@ -174,28 +221,125 @@ class Cardinal(object):
 
         self.plugins: dict[str, PluginData] = {}
         self.disabled_plugins = cardinal_tools.load_disabled_plugins()
+        # Блокировки плагинов, хэндлеры которых не рассчитаны на параллельное выполнение {UUID плагина: блокировка}.
+        self.plugin_locks: dict[str, RLock] = {}
 
     def __init_account(self) -> None:
         """
         Инициализирует класс аккаунта (self.account)
         """
-        while True:
-            try:
-                self.account.get()
-                greeting_text = cardinal_tools.create_greetings(self.account)
-                for line in greeting_text.split("\n"):
-                    logger.info(line)
-                break
-            except TimeoutError:
-                logger.error("Не удалось загрузить данные об аккаунте: превышен тайм-аут ожидания.")
-            except (FunPayAPI.exceptions.StatusCodeIsNot200, FunPayAPI.exceptions.AccountDataNotfound) as e:
-                logger.error(e)
-            except:
-                logger.error("Произошла непредвиденная ошибка при получении данных аккаута. "
-                             "Подробнее а файле logs/log.log")
-                logger.debug("------TRACEBACK------", exc_info=True)
-            logger.warning("Повторю попытку через 2 секунды...")
-            time.sleep(2)
+        self.account_retry.call(self.account.get, on_retry=retry.log_retry("загрузить данные об аккаунте", logger))
+        greeting_text = cardinal_tools.create_greetings(self.account)
+        for line in greeting_text.split("\n"):
+            logger.info(line)
+
+    def __warm_start(self) -> bool:
+        """
+        Восстанавливает состояние кардинала из снимка, сохраненного перед перезапуском (Cardinal.save_snapshot).
+        Снимок только проверяется (одним запросом данных аккаунта с сохраненным PHPSESSID), а не собирается заново.
+
+        :return: True, если состояние восстановлено, False, если снимка нет / он устарел / не прошел проверку.
+        """
+        if not self.MAIN_CFG["Other"].getboolean("warmStart", fallback=True):
+            return False
+        try:
+            snapshot = cardinal_tools.load_snapshot(self.MAIN_CFG["Other"].getint("snapshotMaxAge", fallback=600))
+        except:
+            logger.warning("Не удалось загрузить снимок состояния. Подробнее в файле logs/log.log.")
+            logger.debug("------TRACEBACK------", exc_info=True)
+            return False
+        if snapshot is None:
+            return False
+
+        logger.info("Обнаружен снимок состояния, проверяю его...")
+        try:
+            if snapshot["golden_key_hash"] != hashlib.sha256(self.account.golden_key.encode()).hexdigest():
+                raise Exception("Снимок состояния принадлежит другому аккаунту.")
+            self.account.session_id = snapshot["session_id"]
+            self.account.get()
+            if self.account.id != snapshot["account_id"]:
+                raise Exception("Снимок состояния принадлежит другому аккаунту.")
+
+            categories = [FunPayAPI.types.Category.from_tuple(i) for i in snapshot["categories"]]
+            lots = [FunPayAPI.types.Lot.from_tuple(i) for i in snapshot["lots"]]
+            self.runner.set_state(snapshot["runner"])
+        except Exception as e:
+            logger.warning(f"Снимок состояния не прошел проверку ({e}), выполняю полную инициализацию.")
+            logger.debug("------TRACEBACK------", exc_info=True)
+            self.account.session_id = None
+            return False
+
+        self.categories = categories
+        self.lots = lots
+        self.current_lots = lots
+        self.lots_ids = [i.id for i in lots]
+        self.telegram_lots = lots
+        self.last_telegram_lots_update = datetime.datetime.now()
+        self.raise_time = {int(k): v for k, v in snapshot["raise_time"].items()}
+        greeting_text = cardinal_tools.create_greetings(self.account)
+        for line in greeting_text.split("\n"):
+            logger.info(line)
+        logger.info(f"$MAGENTAСостояние восстановлено из снимка: категорий $YELLOW{len(categories)}$MAGENTA, "
+                    f"лотов $YELLOW{len(lots)}$MAGENTA.")
+        return True
+
+    def save_snapshot(self, timeout: float = 10.0) -> None:
+        """
+        Сохраняет снимок состояния кардинала для быстрого перезапуска: ID аккаунта и PHPSESSID, категории и лоты,
+        время поднятия категорий и состояние Runner'а. Останавливает получение событий (вызывается перед
+        перезапуском / выключением) и сохраняет снимок только после обработки всех полученных событий. Если события
+        не обработаны за timeout секунд, снимок не сохраняется (при следующем запуске выполняется полная
+        инициализация).
+
+        :param timeout: максимальное время ожидания обработки событий.
+        """
+        if not self.account.is_authorized():
+            return
+        with self.runner.state_lock:
+            # Пока удерживается state_lock, Runner.listen не отдает события, поэтому все события уже полученной
+            # пачки переданы диспетчеру.
+            self.run_id += 1
+            self.runner.stop()
+        # state_lock не удерживается во время ожидания: хэндлеры, отправляющие сообщения, не ждут запроса runner'а
+        # (после Runner.stop сообщения отправляются отдельными запросами), а новые события не получаются.
+        if self.runner.orders_refresher is None:
+            runner_state = self.__get_runner_state(timeout)
+        else:
+            # Пока удерживается блокировка, стадия обновления заказов не меняет состояние Runner'а.
+            with self.runner.orders_refresher.lock:
+                for event in self.runner.orders_refresher.get_events():
+                    self.dispatcher.submit(event)
+                runner_state = self.__get_runner_state(timeout)
+        if runner_state is None:
+            return
+        snapshot = {
+            "golden_key_hash": hashlib.sha256(self.account.golden_key.encode()).hexdigest(),
+            "account_id": self.account.id,
+            "session_id": self.account.session_id,
+            "categories": [i.to_tuple() for i in self.categories],
+            "lots": [i.to_tuple() for i in self.lots],
+            "raise_time": self.raise_time,
+            "runner": runner_state
+        }
+        try:
+            cardinal_tools.cache_snapshot(snapshot)
+            logger.info("Снимок состояния сохранен.")
+        except:
+            logger.error("Не удалось сохранить снимок состояния. Подробнее в файле logs/log.log.")
+            logger.debug("------TRACEBACK------", exc_info=True)
+
+    def __get_runner_state(self, timeout: float) -> dict:
+        """
+        Ждет обработки полученных событий и возвращает состояние Runner'а.
+
+        :param timeout: максимальное время ожидания обработки событий.
+
+        :return: состояние Runner'а или None, если не все события обработаны за timeout секунд.
+        """
+        if not self.dispatcher.join(timeout):
+            logger.warning(f"Не все полученные события обработаны за {timeout} сек., снимок состояния не сохранен.")
+            return None
+        return self.runner.get_state()
 
     def __init_lots_and_categories(self, infinite_polling: bool = True, attempts: int = 0,
                                    update_telegram_lots: bool = True,
@@ -216,43 +360,24 @@ class Cardinal(object):
         :return: True, если информация обновлена, False, если превышено макс. кол-во попыток.
         """
         logger.info("Получаю данные о лотах и категориях...")
-        if infinite_polling:
-            count = 1
-        else:
-            count = attempts
-        # Получаем категории аккаунта.
-        while count:
-            try:
-                user_lots_info = self.account.get_user(self.account.id)
-                categories = user_lots_info.categories
-                lots = user_lots_info.lots
-                logger.info(f"$MAGENTAПолучил информацию о лотах аккаунта. Всего категорий: $YELLOW{len(categories)}.")
-                logger.info(f"$MAGENTAВсего лотов: $YELLOW{len(lots)}")
-                break
-            except TimeoutError:
-                logger.error("Не удалось загрузить данные о категориях аккаунта: превышен тайм-аут ожидания.")
-                logger.warning("Повторю попытку через 2 секунды...")
-                time.sleep(2)
-                if not infinite_polling:
-                    count -= 1
-            except FunPayAPI.exceptions.StatusCodeIsNot200 as e:
-                logger.error(e)
-                logger.warning("Повторю попытку через 2 секунды...")
-                time.sleep(2)
-                if not infinite_polling:
-                    count -= 1
-            except:
-                logger.error("Произошла непредвиденная ошибка при получении данных о лотах и категориях. "
-                             "Подробнее а файле logs/log.log")
-                logger.debug("------TRACEBACK------", exc_info=True)
-                logger.warning("Повторю попытку через 2 секунды...")
-                time.sleep(2)
-                if not infinite_polling:
-                    count -= 1
-        else:
+        if not infinite_polling and attempts < 1:
             logger.error(f"Произошло ошибка при получении данных о лотах и категориях: "
                          f"превышено кол-во попыток ({attempts}).")
             return False
+        policy = self.account_retry if infinite_polling else retry.RetryPolicy(attempts, 2.0, 30.0)
+
+        # Получаем категории аккаунта.
+        try:
+            user_lots_info = policy.call(self.account.get_user, self.account.id,
+                                         on_retry=retry.log_retry("загрузить данные о категориях аккаунта", logger))
+        except Exception as e:
+            logger.error(f"Произошло ошибка при получении данных о лотах и категориях: {e}")
+            logger.debug("------TRACEBACK------", exc_info=True)
+            return False
+        categories = user_lots_info.categories
+        lots = user_lots_info.lots
+        logger.info(f"$MAGENTAПолучил информацию о лотах аккаунта. Всего категорий: $YELLOW{len(categories)}.")
+        logger.info(f"$MAGENTAВсего лотов: $YELLOW{len(lots)}")
 
         # Привязываем к каждой категории её game_id. Если категория кэширована - берем game_id из кэша,
         # если нет - делаем запрос к FunPay.
@@ -273,48 +398,22 @@ class Cardinal(object):
 
             logger.warning(f"Доп. данные о категории \"{cat.title}\" не найдены в кэше.")
             logger.info("Отправляю запрос к FunPay...")
-            if infinite_polling:
-                count = 1
-            else:
-                count = attempts
-            while count:
-                try:
-                    game_id = self.account.get_category_game_id(cat)
-                    categories[index].game_id = game_id
-                    # Присваиваем game_id каждому лоту этой категории.
-                    category_lots = [(ind, lot) for ind, lot in enumerate(lots) if lot.category_id == cat.id]
-                    for lot_tuple in category_lots:
-                        lots[lot_tuple[0]].game_id = game_id
-                    logger.info(f"Доп. данные о категории \"{cat.title}\" получены!")
-                    time.sleep(0.2)
-                    break
-                except TimeoutError:
-                    logger.error(f"Не удалось получить ID игры, к которой относится категория \"{cat.title}\": "
-                                 f"превышен тайм-аут ожидания.")
-                    logger.warning("Повторю попытку через 2 секунды...")
-                    time.sleep(2)
-                    if not infinite_polling:
-                        count -= 1
-                except FunPayAPI.exceptions.StatusCodeIsNot200 as e:
-                    logger.error(e)
-                    logger.warning("Повторю попытку через 2 секунды...")
-                    time.sleep(2)
-                    if not infinite_polling:
-                        count -= 1
-                except:
-                    logger.error(f"Не удалось получить ID игры, к которой относится категория \"{cat.title}\": "
-                                 f"неизвестная ошибка.")
-                    logger.debug("------TRACEBACK------", exc_info=True)
-                    logger.warning("Повторю попытку через 2 секунды...")
-                    time.sleep(2)
-                    if not infinite_polling:
-                        count -= 1
-
-            if not count:
-                logger.error(f"Не удалось получить ID игры, к которой относится категория \"{cat.title}\": "
-                             f"превышено кол-во попыток ({attempts}).")
+            try:
+                game_id = policy.call(self.account.get_category_game_id, cat,
+                                      on_retry=retry.log_retry(f"получить ID игры, к которой относится категория "
+                                                               f"\"{cat.title}\"", logger))
+            except Exception as e:
+                logger.error(f"Не удалось получить ID игры, к которой относится категория \"{cat.title}\": {e}")
+                logger.debug("------TRACEBACK------", exc_info=True)
                 return False
 
+            categories[index].game_id = game_id
+            # Присваиваем game_id каждому лоту этой категории.
+            category_lots = [(ind, lot) for ind, lot in enumerate(lots) if lot.category_id == cat.id]
+            for lot_tuple in category_lots:
+                lots[lot_tuple[0]].game_id = game_id
+            logger.info(f"Доп. данные о категории \"{cat.title}\" получены!")
+
         if update_cardinal_lots:
             self.categories = categories
             self.lots = lots
@@ -363,12 +462,11 @@ class Cardinal(object):
 
             # В любом другом случае пытаемся поднять лоты всех категорий, относящихся к игре cat.game_id
             try:
-                time.sleep(0.5)
                 result = self.account.raise_game_categories(cat)
             except Exception as e:
                 if isinstance(e, FunPayAPI.exceptions.StatusCodeIsNot200) and e.status_code == 429:
-                    logger.warning(f"Ошибка 429 при поднятии категории \"{cat.title}\". Пауза на 10 сек...")
-                    time.sleep(10)
+                    # Пауза после 429 выдерживается ограничителем частоты запросов (Account.transport.limiter).
+                    logger.warning(f"Ошибка 429 при поднятии категории \"{cat.title}\".")
                     next_time = int(time.time()) + 1
                 else:
                     logger.error(f"Произошла непредвиденная ошибка при попытке поднять категорию \"{cat.title}. "
@@ -400,54 +498,45 @@ class Cardinal(object):
 
     def send_message(self, msg: FunPayAPI.types.Message, attempts: int = 3) -> bool:
         """
-        Отправляет сообщение в чат FunPay.
+        Отправляет сообщение в чат FunPay и ждет окончания отправки.
 
         :param msg: объект MessageEvent.
 
-        :param attempts: кол-во попыток на отправку сообщения.
+        :param attempts: кол-во попыток на отправку каждой части сообщения.
 
         :return: True, если сообщение доставлено, False, если нет.
         """
+        return self.queue_message(msg, attempts).result().delivered
+
+    def queue_message(self, msg: FunPayAPI.types.Message, attempts: int | None = None,
+                      coalesce: bool = True) -> Future:
+        """
+        Ставит сообщение в очередь отправки чата (см. Utils.outbox.Outbox) и сразу возвращает управление.
+
+        :param msg: объект MessageEvent.
+
+        :param attempts: кол-во попыток на отправку каждой части сообщения.
+
+        :param coalesce: можно ли объединять сообщение с другими сообщениями чата.
+
+        :return: future, результат которого - квитанция о доставке (Utils.outbox.DeliveryReceipt).
+        """
         if self.MAIN_CFG["Other"].get("watermark"):
             msg.text = f"{self.MAIN_CFG['Other']['watermark']}\n" + msg.text
+        return self.outbox.submit(msg, attempts, coalesce)
 
-        lines = [i.strip() for i in msg.text.split("\n")]
-        msg.text = "\n".join(lines)
-        while "\n\n" in msg.text:
-            msg.text = msg.text.replace("\n\n", "\n[a][/a]\n")
-        lines = msg.text.split("\n")
+    def __send_message_part(self, mes: FunPayAPI.types.Message) -> None:
+        """
+        Отправляет одну часть сообщения (вместе с запросом runner'а, если включен piggybackMessages) и проверяет
+        ответ FunPay.
 
-        split_messages = []
-        while lines:
-            text = "\n".join(lines[:20])
-            if text.strip() == "[a][/a]":
-                continue
-            msg_obj = FunPayAPI.types.Message(text, msg.node_id, msg.chat_with, msg.unread)
-            split_messages.append(msg_obj)
-            lines = lines[20:]
-
-        for mes in split_messages:
-            current_attempts = attempts
-            while current_attempts:
-                try:
-                    response = self.account.send_message(mes)
-                    if response.get("response") and response.get("response").get("error") is None:
-                        self.runner.update_saved_message(mes)
-                        logger.info(f"Отправил сообщение в чат $YELLOW{msg.node_id}.")
-                        break
-                except:
-                    logger.debug("------TRACEBACK------", exc_info=True)
-                # if error in response
-                logger.warning(f"Произошла ошибка при отправке сообщения в чат $YELLOW{msg.node_id}.$RESET "
-                               f"Подробнее в файле logs/log.log")
-                logger.info(f"Осталось попыток: {current_attempts}.")
-                current_attempts -= 1
-                time.sleep(1)
-            else:
-                logger.error(f"Не удалось отправить сообщение в чат $YELLOW{msg.node_id}$RESET: "
-                             f"превышено кол-во попыток.")
-                return False
-        return True
+        :param mes: часть сообщения.
+        """
+        response = self.runner.send_message(mes)
+        if not response.get("response") or response.get("response").get("error") is not None:
+            raise FunPayAPI.exceptions.MessageNotDelivered(response)
+        self.runner.update_saved_message(mes)
+        logger.info(f"Отправил сообщение в чат $YELLOW{mes.node_id}.")
 
     def update_session(self, attempts: int = 3) -> bool:
         """
@@ -457,33 +546,56 @@ class Cardinal(object):
 
         :return: True, если удалось обновить данные, False - если нет.
         """
-        while attempts:
-            try:
-                self.account.get(update_session_id=True)
-                logger.info("Данные аккаунта обновлены.")
-                return True
-            except TimeoutError:
-                logger.warning("Не удалось загрузить данные об аккаунте: превышен тайм-аут ожидания.")
-            except (FunPayAPI.exceptions.StatusCodeIsNot200, FunPayAPI.exceptions.AccountDataNotfound) as e:
-                logger.error(e)
-            except:
-                logger.error("Произошла непредвиденная ошибка при получении данных аккаута. "
-                             "Подробнее а файле logs/log.log")
-                logger.debug("------TRACEBACK------", exc_info=True)
-            attempts -= 1
-            logger.warning("Повторю попытку через 2 секунды...")
-            time.sleep(2)
-        else:
-            logger.error("Не удалось обновить данные об аккаунте: превышено кол-во попыток.")
+        try:
+            retry.RetryPolicy(attempts, base_delay=2.0, max_delay=30.0).call(
+                self.account.get, update_session_id=True,
+                on_retry=retry.log_retry("загрузить данные об аккаунте", logger))
+        except Exception as e:
+            logger.error(f"Не удалось обновить данные об аккаунте: {e}")
+            logger.debug("------TRACEBACK------", exc_info=True)
             return False
+        logger.info("Данные аккаунта обновлены.")
+        return True
 
     # Бесконечные циклы
     def process_events(self):
         """
-        Запускает хэндлеры, привязанные к тому или иному событию.
+        Получает события и передает их в диспетчер событий, который запускает привязанные к ним хэндлеры.
         """
         instance_id = self.run_id
+        for event in self.runner.listen(delay=int(self.MAIN_CFG["Other"]["requestsDelay"]),
+                                        adaptive_delay=self.get_adaptive_delay()):
+            if instance_id != self.run_id:
+                break
+            if self.chats_directory_version != self.account.chats_directory_version:
+                self.save_chats_directory()
+            if event.type is FunPayAPI.types.EventTypes.INITIAL_SNAPSHOT:
+                # Хэндлеры снимка (например, сохранение существующих чатов) должны выполниться до обработки
+                # новых событий.
+                self.handle_event(event)
+                continue
+            self.dispatcher.submit(event)
+
+    def save_chats_directory(self) -> None:
+        """
+        Сохраняет справочник чатов аккаунта (никнейм собеседника -> node_id) в кэш.
+        """
+        version = self.account.chats_directory_version
+        try:
+            cardinal_tools.cache_chats_directory(dict(self.account.chats_directory))
+            self.chats_directory_version = version
+        except:
+            logger.error("Не удалось сохранить справочник чатов. Подробнее в файле logs/log.log.")
+            logger.debug("------TRACEBACK------", exc_info=True)
+
+    def handle_event(self, event: FunPayAPI.types.Event) -> None:
+        """
+        Запускает хэндлеры, привязанные к событию (вызывается в потоках диспетчера событий).
+
+        :param event: событие.
+        """
         events_handlers = {
+            FunPayAPI.types.EventTypes.INITIAL_SNAPSHOT: self.init_snapshot_handlers,
             FunPayAPI.types.EventTypes.INITIAL_MESSAGE: self.init_message_handlers,
             FunPayAPI.types.EventTypes.MESSAGES_LIST_CHANGED: self.messages_list_changed_handlers,
             FunPayAPI.types.EventTypes.NEW_MESSAGE: self.new_message_handlers,
@@ -493,11 +605,30 @@ class Cardinal(object):
             FunPayAPI.types.EventTypes.NEW_ORDER: self.new_order_handlers,
             FunPayAPI.types.EventTypes.ORDER_STATUS_CHANGED: self.order_status_changed_handlers,
         }
+        self.run_handlers(events_handlers[event.type], (self, event))
 
-        for event in self.runner.listen(delay=int(self.MAIN_CFG["Other"]["requestsDelay"])):
-            if instance_id != self.run_id:
-                break
-            self.run_handlers(events_handlers[event.type], (self, event))
+    def is_command(self, text: str) -> bool:
+        """
+        Проверяет, является ли текст сообщения командой (автоответа или !автовыдача).
+
+        :param text: текст сообщения.
+        """
+        return text.strip().lower() in self.AR_CFG or text.startswith("!автовыдача")
+
+    def get_adaptive_delay(self) -> FunPayAPI.runner.AdaptiveDelay | None:
+        """
+        Создает адаптивную задержку между запросами runner'а по настройкам из секции [Other] основного конфига
+        (adaptiveDelay, minRequestsDelay, maxRequestsDelay, activityWindow). Если настройки отсутствуют -
+        адаптивная задержка выключена.
+
+        :return: адаптивная задержка или None, если она выключена.
+        """
+        other = self.MAIN_CFG["Other"]
+        if not other.getboolean("adaptiveDelay", fallback=False):
+            return None
+        return FunPayAPI.runner.AdaptiveDelay(min_delay=other.getfloat("minRequestsDelay", fallback=0.5),
+                                              max_delay=other.getfloat("maxRequestsDelay", fallback=30.0),
+                                              active_window=other.getfloat("activityWindow", fallback=30.0))
 
     def lots_raise_loop(self):
         """
@@ -536,6 +667,9 @@ class Cardinal(object):
         self.add_handlers()
 
         self.block_list = cardinal_tools.load_block_list()
+        self.account.chats_directory.update(cardinal_tools.load_chats_directory())
+        self.chats_directory_version = self.account.chats_directory_version
+        products_store.start_watcher()
 
         if self.MAIN_CFG["Telegram"].getboolean("enabled"):
             self.__init_telegram()
@@ -549,8 +683,9 @@ class Cardinal(object):
             self.telegram.setup_commands()
             Thread(target=self.telegram.run, daemon=True).start()
 
-        self.__init_account()
-        self.__init_lots_and_categories()
+        if not self.__warm_start():
+            self.__init_account()
+            self.__init_lots_and_categories()
         self.run_handlers(self.post_init_handlers, (self, ))
 
     def run(self):
@@ -661,10 +796,17 @@ class Cardinal(object):
         """
         Добавляет хэндлеры из плагина.
 
+        События обрабатываются в нескольких потоках, поэтому хэндлеры одного плагина выполняются по очереди (под
+        общей блокировкой плагина), если плагин не объявил CONCURRENT_HANDLERS = True (хэндлеры рассчитаны на
+        параллельное выполнение). Встроенные хэндлеры выполняются параллельно.
+
         :param plugin: модуль (плагин).
 
         :param uuid: UUID плагина (None для встроенных хэндлеров).
         """
+        lock = None
+        if uuid is not None and not getattr(plugin, "CONCURRENT_HANDLERS", False):
+            lock = self.plugin_locks.setdefault(uuid, RLock())
         for name in self.handler_bind_var_names:
             try:
                 functions = getattr(plugin, name)
@@ -672,6 +814,7 @@ class Cardinal(object):
                 continue
             for func in functions:
                 func.plugin_uuid = uuid
+                func.plugin_lock = lock
             self.handler_bind_var_names[name].extend(functions)
         logger.info(f"Хэндлеры из $YELLOW{plugin.__name__}.py$RESET зарегистрированы.")
 
@@ -691,7 +834,12 @@ class Cardinal(object):
         for func in handlers_list:
             try:
                 if getattr(func, "plugin_uuid") is None or self.plugins[getattr(func, "plugin_uuid")].enabled:
-                    func(*args)
+                    lock = getattr(func, "plugin_lock", None)
+                    if lock is None:
+                        func(*args)
+                    else:
+                        with lock:
+                            func(*args)
             except:
                 logger.error("Произошла ошибка при выполнении хэндлера. Подробнее в файле logs/log.log.")
                 logger.debug("------TRACEBACK------", exc_info=True)
@@ -43,7 +43,25 @@ default_config = {
 
     "Other": {
         "watermark": "[👾 FunPay Cardinal 👻]",
-        "requestsDelay": "6"
+        "requestsDelay": "6",
+        "adaptiveDelay": "1",
+        "minRequestsDelay": "0.5",
+        "maxRequestsDelay": "30",
+        "activityWindow": "30",
+        "eventWorkers": "4",
+        "eventQueueSize": "1000",
+        "eventAging": "5",
+        "savedChatsLimit": "2000",
+        "savedOrdersLimit": "5000",
+        "warmStart": "1",
+        "snapshotMaxAge": "600",
+        "legacyInitialEvents": "0",
+        "outboxWorkers": "2",
+        "outboxCoalesce": "1",
+        "piggybackMessages": "0",
+        "watchedChats": "20",
+        "importDeduplicate": "0",
+        "importBloomFilter": "0"
     }
 }
 
@@ -10,11 +10,11 @@ if TYPE_CHECKING:
 
 from FunPayAPI.types import (SystemMessageTypes, NewMessageEvent, NewOrderEvent, OrdersListChangedEvent,
                              RaiseResponse, Message, Order)
+from FunPayAPI import retry
 import FunPayAPI.users
 
 from Utils import cardinal_tools
 import configparser
-import time
 import logging
 from threading import Thread
 
@@ -24,6 +24,9 @@ from tg_bot import utils, keyboards
 
 logger = logging.getLogger("FPC.handlers")
 
+# Политика повторных попыток запросов к FunPay из хэндлеров.
+HANDLERS_RETRY = retry.RetryPolicy(attempts=3, base_delay=1.0, max_delay=8.0, deadline=20.0)
+
 
 ORDER_HTML_TEMPLATE = """<a href="https://funpay.com/orders/DELIVERY_TEST/" class="tc-item info">
     <div class="tc-date">
@@ -48,6 +51,7 @@ ORDER_HTML_TEMPLATE = """<a href="https://funpay.com/orders/DELIVERY_TEST/" clas
             </div>
             <div class="media-user-status">был миллион лет назад</div>
         </div>
+    </div>
     </div>
         <div class="tc-status text-primary">Оплачен</div>
         <div class="tc-price text-nowrap tc-seller-sum">999999.0<span class="unit">₽</span></div>
@@ -213,20 +217,21 @@ def check_lot_products_count(config_obj: configparser.SectionProxy) -> int:
 
 def update_current_lots_handler(cardinal: Cardinal, event: OrdersListChangedEvent):
     logger.info("Получаю информацию о лотах...")
-    attempts = 3
-    while attempts:
-        try:
-            cardinal.current_lots = cardinal.account.get_user(cardinal.account.id).lots
+    try:
+        current_lots = HANDLERS_RETRY.call(cardinal.account.get_user, cardinal.account.id,
+                                           on_retry=retry.log_retry("получить информацию о лотах", logger)).lots
+        with cardinal.current_lots_lock:
+            cardinal.current_lots = current_lots
             cardinal.current_lots_last_tag = event.tag
-            break
-        except:
-            logger.error("Произошла ошибка при получении информации о лотах.")
-            logger.debug("------TRACEBACK------", exc_info=True)
-            attempts -= 1
-            time.sleep(2)
-    if not attempts:
-        logger.error("Не удалось получить информацию о лотах: превышено кол-во попыток.")
+            # Заказы с этим тегом уже выданы - обновляем состояние лотов сейчас.
+            update_states = cardinal.lots_states_pending_tag == event.tag and \
+                claim_lots_states_update(cardinal, event.tag)
+    except Exception as e:
+        logger.error(f"Не удалось получить информацию о лотах: {e}")
+        logger.debug("------TRACEBACK------", exc_info=True)
         return
+    if update_states:
+        Thread(target=update_lots_states, args=(cardinal, event), daemon=True).start()
 
 
 # Новый ордер (REGISTER_TO_NEW_ORDER)
@@ -252,7 +257,7 @@ def send_new_order_notification_handler(cardinal: Cardinal, event: NewOrderEvent
 <b><i>Сумма:</i></b>  <code>{event.order.price}</code>
 <b><i>Лот:</i></b>  <code>{utils.escape(event.order.title)}</code>"""
 
-    node_id = cardinal.account.get_node_id_by_username(event.order.buyer_username)
+    node_id = cardinal.account.get_node_id_by_username(event.order.buyer_username, force_request=True)
 
     keyboard = keyboards.new_order(event.order.id[1:], event.order.buyer_username, node_id)
     Thread(target=cardinal.telegram.send_notification, args=(text, keyboard, utils.NotificationTypes.new_order),
@@ -267,7 +272,7 @@ def deliver_product(cardinal: Cardinal, event: NewOrderEvent, delivery_obj: conf
     :return: результат выполнения. None - если лота нет в конфиге.
     [Результат выполнения, текст товара, оставшееся кол-во товара] - в любом другом случае.
     """
-    node_id = cardinal.account.get_node_id_by_username(event.order.buyer_username)
+    node_id = cardinal.account.get_node_id_by_username(event.order.buyer_username, force_request=True)
     response_text = cardinal_tools.format_order_text(delivery_obj["response"], event.order)
 
     # Проверяем, есть ли у лота файл с товарами. Если нет, то просто отправляем response лота.
@@ -278,29 +283,51 @@ def deliver_product(cardinal: Cardinal, event: NewOrderEvent, delivery_obj: conf
             logger.error(f"Не удалось отправить товар для ордера $YELLOW{event.order.id}$RESET. ")
         return result, response_text, -1
 
-    # Получаем товар.
-    file_name = delivery_obj.get("productsFileName")
-    products = []
+    # Резервируем товар за заказом.
+    path = f"storage/products/{delivery_obj.get('productsFileName')}"
+    reservation = None
     if cardinal.MAIN_CFG["FunPay"].getboolean("multiDelivery") and not delivery_obj.getboolean("disableMultiDelivery"):
         result = AMOUNT_EXPRESSION.findall(event.order.title)
         if result:
             amount = int(result[0].split(" ")[0])
-            products = cardinal_tools.get_product(f"storage/products/{file_name}", amount)
-    if not products:
-        products = cardinal_tools.get_product(f"storage/products/{file_name}")
+            reservation = cardinal_tools.reserve_products(path, event.order.id, amount)
+    if reservation is None:
+        reservation = cardinal_tools.reserve_products(path, event.order.id)
 
-    product_text = "\n".join(products[0]).replace("\\n", "\n")
+    product_text = "\n".join(reservation.products).replace("\\n", "\n")
     response_text = response_text.replace("$product", product_text)
 
-    # Отправляем товар.
+    # Отправляем товар (отдельно от других сообщений чата, чтобы по квитанции было видно, какие части доставлены).
     new_msg_obj = Message(response_text, node_id, None)
-    result = cardinal.send_message(new_msg_obj)
-
-    # Если произошла какая-либо ошибка при отправлении товара, возвращаем товар обратно в файл с товарами.
-    if not result:
-        cardinal_tools.add_products(f"storage/products/{file_name}", [product_text])
+    try:
+        future = cardinal.queue_message(new_msg_obj, 3, coalesce=False)
+    except:
+        reservation.rollback()
+        raise
+    try:
+        receipt = future.result()
+    except:
+        # Неизвестно, какие части сообщения отправлены: товар остается в журнале резервов.
+        logger.error(f"Неизвестно, выдан ли товар для ордера $YELLOW{event.order.id}$RESET. "
+                     f"Товар сохранен в журнале резервов файла {path}.")
+        raise
+
+    # Если отправлена хотя бы одна часть с товаром - подтверждаем выдачу, иначе возвращаем товар на его место
+    # в файле с товарами.
+    markers = [line.strip() for i in reservation.products for line in i.replace("\\n", "\n").split("\n")
+               if line.strip()]
+    product_parts = [index for index, part in enumerate(receipt.parts) if any(i in part for i in markers)]
+    first_part = product_parts[0] if product_parts else len(receipt.parts) - 1
+    result = receipt.sent > first_part
+    if result:
+        reservation.commit()
+        if not receipt.delivered:
+            logger.warning(f"Товар для ордера $YELLOW{event.order.id}$RESET отправлен, но сообщение доставлено "
+                           f"не полностью ({receipt.sent}/{len(receipt.parts)} частей).")
+    else:
+        reservation.rollback()
         logger.error(f"Не удалось отправить товар для ордера $YELLOW{event.order.id}$RESET. ")
-    return result, response_text, cardinal_tools.count_products(f"storage/products/{file_name}")
+    return result, response_text, cardinal_tools.count_products(path)
 
 
 def deliver_product_handler(cardinal: Cardinal, event: NewOrderEvent, *args) -> None:
@@ -388,34 +415,41 @@ def update_lot_state(cardinal: Cardinal, lot: FunPayAPI.types.Lot, task: int) ->
 
     :return: результат выполнения.
     """
-    attempts = 3
-    while attempts:
-        try:
-            lot_info = cardinal.account.get_lot_info(lot.id, lot.game_id)
-            if task == 1:
-                cardinal.account.save_lot(lot_info, active=True)
-                logger.info(f"Восстановил лот $YELLOW{lot.title}$RESET.")
-            elif task == -1:
-                cardinal.account.save_lot(lot_info, active=False)
-                logger.info(f"Деактивировал лот $YELLOW{lot.title}$RESET.")
-            return True
-        except:
-            logger.error(f"Произошла ошибка при изменении состояния лота $YELLOW{lot.title}$RESET."
-                         "Подробнее в файле logs/log.log")
-            logger.debug("------TRACEBACK------", exc_info=True)
-            attempts -= 1
-            time.sleep(2)
-    logger.error(f"Не удалось изменить состояние лота $YELLOW{lot.title}$RESET: превышено кол-во попыток.")
-    return False
+    def save_lot_state():
+        lot_info = cardinal.account.get_lot_info(lot.id, lot.game_id)
+        cardinal.account.save_lot(lot_info, active=task == 1)
+
+    try:
+        HANDLERS_RETRY.call(save_lot_state, on_retry=retry.log_retry(f"изменить состояние лота {lot.title}", logger))
+    except Exception as e:
+        logger.error(f"Не удалось изменить состояние лота $YELLOW{lot.title}$RESET: {e}")
+        logger.debug("------TRACEBACK------", exc_info=True)
+        return False
+
+    if task == 1:
+        logger.info(f"Восстановил лот $YELLOW{lot.title}$RESET.")
+    elif task == -1:
+        logger.info(f"Деактивировал лот $YELLOW{lot.title}$RESET.")
+    return True
 
 
-def update_lots_states(cardinal: Cardinal, event: NewOrderEvent):
+def claim_lots_states_update(cardinal: Cardinal, tag: str) -> bool:
+    """
+    Отмечает, что состояние лотов после событий с тегом tag обновляется (вызывается под
+    cardinal.current_lots_lock).
+
+    :return: True, если состояние лотов после событий с этим тегом еще не обновлялось.
+    """
     if not any([cardinal.MAIN_CFG["FunPay"].getboolean("autoRestore"),
                 cardinal.MAIN_CFG["FunPay"].getboolean("autoDisable")]):
-        return
-    if cardinal.current_lots_last_tag != event.tag or cardinal.last_state_change_tag == event.tag:
-        return
+        return False
+    if cardinal.last_state_change_tag == tag:
+        return False
+    cardinal.last_state_change_tag = tag
+    return True
+
 
+def update_lots_states(cardinal: Cardinal, event: NewOrderEvent | OrdersListChangedEvent):
     lots_ids = [i.id for i in cardinal.current_lots]
     deactivated = []
     restored = []
@@ -464,7 +498,6 @@ def update_lots_states(cardinal: Cardinal, event: NewOrderEvent):
                     deactivated.append(lot.title)
                 elif current_task == 1:
                     restored.append(lot.title)
-            time.sleep(0.5)
 
     if deactivated:
         lots = "\n".join(deactivated)
@@ -480,10 +513,17 @@ def update_lots_states(cardinal: Cardinal, event: NewOrderEvent):
 <code>{lots}</code>"""
         Thread(target=cardinal.telegram.send_notification, args=(text,),
                kwargs={"notification_type": utils.NotificationTypes.lots_restore}, daemon=True).start()
-    cardinal.last_state_change_tag = event.tag
 
 
 def update_lots_state_handler(cardinal: Cardinal, event: NewOrderEvent, *args):
+    # Список лотов обновляется хэндлером события OrdersListChangedEvent, который выполняется параллельно. Если он
+    # еще не обновлен - состояние лотов обновит он (поток не ждет другое событие).
+    with cardinal.current_lots_lock:
+        if cardinal.current_lots_last_tag != event.tag:
+            cardinal.lots_states_pending_tag = event.tag
+            return
+        if not claim_lots_states_update(cardinal, event.tag):
+            return
     Thread(target=update_lots_states, args=(cardinal, event), daemon=True).start()
 
 
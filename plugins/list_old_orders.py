@@ -3,12 +3,12 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from cardinal import Cardinal
 
-from bs4 import BeautifulSoup
-from FunPayAPI import exceptions
-from FunPayAPI.account import Account
+from FunPayAPI.types import OrderStatuses
+from threading import Thread, Lock, Event
+import logging
+import time
 
 import telebot
-import requests
 from tg_bot import utils
 
 
@@ -21,37 +21,57 @@ UUID = "a31cfa24-5ac8-4efb-8c61-7dec3544aa32"
 SETTINGS_PAGE = False
 
 
-def get_orders(acc: Account) -> list[str]:
+logger = logging.getLogger(f"FPC.{__name__}")
+SYNC_LOCK = Lock()
+SYNCED = Event()  # Установлен после первой успешной синхронизации.
+SYNC_WAIT_TIMEOUT = 15
+"""Сколько секунд /old_orders ждет окончания идущей синхронизации, пока история заказов не синхронизирована."""
+
+
+def sync_orders(cardinal: Cardinal) -> None:
+    """
+    Синхронизирует локальную историю заказов (если синхронизация уже идет - ничего не делает).
+    """
+    if not SYNC_LOCK.acquire(blocking=False):
+        return
+    try:
+        cardinal.orders_crawler.sync()
+        SYNCED.set()
+    except:
+        logger.error("Не удалось синхронизировать историю заказов. Подробнее в файле logs/log.log.")
+        logger.debug("------TRACEBACK------", exc_info=True)
+    finally:
+        SYNC_LOCK.release()
+
+
+def start_sync(cardinal: Cardinal, *args):
+    """
+    Запускает синхронизацию истории заказов в отдельном потоке.
     """
-    Получает список ордеров на аккаунте.
+    Thread(target=sync_orders, args=(cardinal,), daemon=True).start()
+
 
-    :return: Список с заказами.
+def wait_for_sync() -> bool:
     """
-    headers = {"cookie": f"golden_key={acc.golden_key}; PHPSESSID={acc.session_id};",
-               "user-agent": acc.user_agent}
-    response = requests.get("https://funpay.com/orders/trade?id=&buyer=&state=paid&game=",
-                            headers=headers, timeout=acc.timeout, proxies=acc.proxy)
-    if response.status_code != 200:
-        raise exceptions.StatusCodeIsNot200(response.status_code)
+    Если история заказов еще не синхронизирована, а синхронизация идет - ждет ее окончания (не более
+    SYNC_WAIT_TIMEOUT секунд).
 
-    html_response = response.content.decode()
-    soup = BeautifulSoup(html_response, "html.parser")
+    :return: True, если история заказов синхронизирована.
+    """
+    if not SYNCED.is_set() and SYNC_LOCK.locked():
+        SYNCED.wait(SYNC_WAIT_TIMEOUT)
+    return SYNCED.is_set()
 
-    check_user = soup.find("div", {"class": "user-link-name"})
-    if check_user is None:
-        raise exceptions.AccountDataNotfound()
 
-    order_divs = soup.find_all("a", {"class": "tc-item"})
-    if order_divs is None:
-        return []
-    orders_list = []
+def get_orders(cardinal: Cardinal) -> list[str]:
+    """
+    Получает из локальной истории заказов открытые заказы, которым более 24 часов (и заказы, дату которых не удалось
+    распознать).
 
-    for div in order_divs:
-        time = div.find("div", {"class": "tc-date-left"}).text
-        if any(map(time.__contains__, ["сек", "мин", "час", "тол"])):
-            continue
-        orders_list.append(div.find("div", {"class": "tc-order"}).text)
-    return orders_list
+    :return: Список с ID заказов.
+    """
+    orders = cardinal.orders_store.find(status=OrderStatuses.OUTSTANDING, date_to=int(time.time()) - 24 * 3600)
+    return [i.id for i in orders]
 
 
 def init_commands(cardinal: Cardinal, *args):
@@ -59,22 +79,26 @@ def init_commands(cardinal: Cardinal, *args):
         return
     tg = cardinal.telegram
     bot = tg.bot
-    acc = cardinal.account
 
     def send_orders(m: telebot.types.Message):
+        synced = wait_for_sync()
+        warning = "" if synced else "\n\n⚠️ История заказов еще синхронизируется, список может быть неполным."
         try:
-            orders = get_orders(acc)
+            orders = get_orders(cardinal)
         except:
             bot.send_message(m.chat.id, "❌ Не удалось получить список заказов.")
             return
+        finally:
+            # Ответ берется из локальной истории, а синхронизация идет в фоне и обновит ее к следующему запросу.
+            start_sync(cardinal)
 
         if not orders:
-            bot.send_message(m.chat.id, "❌ Просроченных заказов нет.")
+            bot.send_message(m.chat.id, f"❌ Просроченных заказов нет.{warning}")
             return
 
         orders_text = ", ".join(orders)
         text = f"Здравствуйте!\n\nПрошу подтвердить выполнение следующих заказов:\n{orders_text}"
-        bot.send_message(m.chat.id, f"<code>{utils.escape(text)}</code>", parse_mode="HTML")
+        bot.send_message(m.chat.id, f"<code>{utils.escape(text)}</code>{warning}", parse_mode="HTML")
 
     tg.msg_handler(send_orders, commands=["old_orders"])
     cardinal.add_telegram_commands(UUID, [
@@ -83,4 +107,5 @@ def init_commands(cardinal: Cardinal, *args):
 
 
 BIND_TO_PRE_INIT = [init_commands]
+BIND_TO_POST_INIT = [start_sync]
 BIND_TO_DELETE = None
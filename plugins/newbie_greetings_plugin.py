@@ -11,7 +11,7 @@ from tg_bot import utils, keyboards, CBT
 import telebot
 import datetime
 from telebot.types import InlineKeyboardButton as Button, InlineKeyboardMarkup as Keyboard
-from FunPayAPI.types import NewMessageEvent, InitialMessageEvent, Message, SystemMessageTypes
+from FunPayAPI.types import NewMessageEvent, InitialMessageEvent, InitialSnapshotEvent, Message, SystemMessageTypes
 
 
 NAME = "Newbie Greetings Plugin"
@@ -101,6 +101,20 @@ def save_already_exists_chat(cardinal: Cardinal, event: InitialMessageEvent):
         cache_old_users()
 
 
+def save_already_exists_chats(cardinal: Cardinal, event: InitialSnapshotEvent):
+    """
+    Добавляет в список "не первых" всех пользователей, чаты с которыми уже есть на аккаунте (кэш сохраняется
+    один раз).
+    """
+    if not SETTINGS["add_initial_chats"]:
+        return
+    old_users = set(OLD_USERS)
+    new_users = [i.chat_with for i in event.messages if i.chat_with not in old_users]
+    if new_users:
+        OLD_USERS.extend(dict.fromkeys(new_users))
+        cache_old_users()
+
+
 def send_newbie_notification(cardinal: Cardinal, event: NewMessageEvent):
     if cardinal.telegram and SETTINGS["send_notification"]:
         cardinal.telegram.send_notification(
@@ -223,5 +237,6 @@ logger.info("Загрузил пользователей, которые уже
 
 BIND_TO_PRE_INIT = [init_settings_menu]
 BIND_TO_NEW_MESSAGE = [send_newbie_message]
+BIND_TO_INITIAL_SNAPSHOT = [save_already_exists_chats]
 BIND_TO_INIT_MESSAGE = [save_already_exists_chat]
 BIND_TO_DELETE = delete_plugin_folder
@@ -1,4 +1,5 @@
 from pip._internal.cli.main import main
+import sys
 
 
 common_packages = [
@@ -12,6 +13,12 @@ common_packages = [
     "aiohttp>=3.8.3"
 ]
 
+fast_parser_packages = [
+    "lxml>=4.9.1",
+    "selectolax>=0.3.12"
+]
+"""Необязательные бэкенды парсера (python setup.py --fast-parser), см. FunPayAPI.parser."""
+
 
 def install_packages(packages_list: list[str]):
     for pkg in packages_list:
@@ -20,3 +27,5 @@ def install_packages(packages_list: list[str]):
 
 if __name__ == '__main__':
     install_packages(common_packages)
+    if "--fast-parser" in sys.argv:
+        install_packages(fast_parser_packages)
@@ -226,7 +226,7 @@ offset: int - смещение списка файлов с товарами.
 
 UPLOAD_PRODUCTS_FILE = "21"
 """
-Callback для активации режима выгрузки файла с товарами.
+Callback для активации режима выгрузки файла с товарами (файл с таким же названием будет заменен).
 
 
 User-state: ожидается сообщение с файлом с товарами.
@@ -568,4 +568,43 @@ offset: int - смещение списка плагинов.
 User-state: ожидается файл-плагин.
 data:
 offset: int - смещение списка плагинов.
-"""
\ No newline at end of file
+"""
+
+
+ROLLBACK_RESERVATION = "53"
+"""
+Callback для возврата товаров незавершенного резерва в файл с товарами.
+Использование: CBT.ROLLBACK_RESERVATION:file_index:order_id
+
+file_index: int - числовой индекс файла с товарами.
+order_id: str - ID заказа.
+"""
+
+
+COMMIT_RESERVATION = "54"
+"""
+Callback для подтверждения выдачи товаров незавершенного резерва (товары удаляются из журнала резервов).
+Использование: CBT.COMMIT_RESERVATION:file_index:order_id
+
+file_index: int - числовой индекс файла с товарами.
+order_id: str - ID заказа.
+"""
+
+
+REDELIVER_RESERVATION = "55"
+"""
+Callback для повторной отправки товаров незавершенного резерва покупателю заказа.
+Использование: CBT.REDELIVER_RESERVATION:file_index:order_id
+
+file_index: int - числовой индекс файла с товарами.
+order_id: str - ID заказа.
+"""
+
+
+IMPORT_PRODUCTS_FILE = "56"
+"""
+Callback для активации режима импорта файла с товарами (товары дописываются в файл с таким же названием).
+
+
+User-state: ожидается сообщение с файлом с товарами.
+"""
@@ -15,9 +15,10 @@ from telebot.types import InlineKeyboardButton as Button
 from telebot import types
 
 from Utils import cardinal_tools
+import FunPayAPI.types
 
-import itertools
 import random
+import io
 import string
 import logging
 import os
@@ -26,6 +27,10 @@ import os
 logger = logging.getLogger("TGBot")
 
 
+PRODUCTS_FILE_PART_SIZE = 20 * 1024 * 1024
+"""Максимальный размер части (в байтах), которыми файл с товарами отправляется в Telegram."""
+
+
 def init_auto_delivery_cp(cardinal: Cardinal, *args):
     tg = cardinal.telegram
     bot = tg.bot
@@ -598,7 +603,6 @@ $product""")
             return
 
         file_name = files[file_index]
-        products = list(itertools.filterfalse(lambda el: not el, m.text.strip().split("\n")))
 
         if prev_page == 0:
             back_btn = Button("◀️ Назад", callback_data=f"{CBT.EDIT_PRODUCTS_FILE}:{file_index}:{offset}")
@@ -611,26 +615,30 @@ $product""")
         add_more_btn = Button("➕ Добавить еще",
                               callback_data=f"{CBT.ADD_PRODUCTS_TO_FILE}:{file_index}:{el_index}:{offset}:{prev_page}")
 
-        products_text = "\n".join(products)
-
         try:
-            with open(f"storage/products/{file_name}", "a", encoding="utf-8") as f:
-                f.write("\n")
-                f.write(products_text)
+            report = cardinal_tools.import_products(
+                f"storage/products/{file_name}", m.text.strip().split("\n"),
+                cardinal.MAIN_CFG["Other"].getboolean("importDeduplicate", fallback=False),
+                cardinal.MAIN_CFG["Other"].getboolean("importBloomFilter", fallback=False))
         except:
             logger.debug("------TRACEBACK------", exc_info=True)
             keyboard = types.InlineKeyboardMarkup().row(back_btn, try_again_btn)
             bot.reply_to(m, f"❌ Не удалось добавить товары в файл. Подробнее в файле <code>logs/log.log</code>",
                          allow_sending_without_reply=True, parse_mode="HTML", reply_markup=keyboard)
+            return
 
         logger.info(f"Пользователь $MAGENTA@{m.from_user.username} (id: {m.from_user.id})$RESET добавил "
-                    f"$CYAN{len(products)}$RESET товар(-a, -oв) в файл $YELLOWstorage/products/{file_name}$RESET.")
+                    f"$CYAN{report.added}$RESET товар(-a, -oв) в файл $YELLOWstorage/products/{file_name}$RESET "
+                    f"(дубликатов: $CYAN{report.duplicates}$RESET, отклонено: $CYAN{report.rejected}$RESET).")
 
         keyboard = types.InlineKeyboardMarkup().row(back_btn, add_more_btn)
 
-        bot.reply_to(m, f"✅ В файл <code>storage/products/{file_name}</code> добавлен(-о) "
-                        f"<code>{len(products)}</code> товар(-а / -ов).",
-                     allow_sending_without_reply=True, parse_mode="HTML", reply_markup=keyboard)
+        text = f"✅ В файл <code>storage/products/{file_name}</code> добавлен(-о) " \
+               f"<code>{report.added}</code> товар(-а / -ов)."
+        if report.duplicates or report.rejected:
+            text += f"\n\nПропущено дубликатов: <code>{report.duplicates}</code>, " \
+                    f"отклонено строк: <code>{report.rejected}</code>."
+        bot.reply_to(m, text, allow_sending_without_reply=True, parse_mode="HTML", reply_markup=keyboard)
 
     def send_products_file(c: types.CallbackQuery):
         """
@@ -648,19 +656,118 @@ $product""")
             .add(types.InlineKeyboardButton("◀️ Назад",
                                             callback_data=f"{CBT.EDIT_PRODUCTS_FILE}:{file_index}:{offset}"))
 
-        with open(f"storage/products/{file_name}", "r", encoding="utf-8") as f:
-            data = f.read().strip()
-            if not data:
-                bot.send_message(c.message.chat.id, f"❌ Файл <code>storage/products/{file_name}</code> пуст.",
-                                 parse_mode="HTML", reply_markup=back_button)
-                bot.answer_callback_query(c.id)
+        path = f"storage/products/{file_name}"
+        try:
+            cardinal_tools.compact_products(path)
+        except OSError:
+            # Например, на Windows файл нельзя заменить, пока он открыт другим процессом: уже выданные строки
+            # пропускаются при чтении файла (см. cardinal_tools.iter_products_file).
+            logger.warning(f"Не удалось уплотнить файл с товарами {path}.")
+            logger.debug("------TRACEBACK------", exc_info=True)
+        if not cardinal_tools.count_products(path):
+            bot.send_message(c.message.chat.id, f"❌ Файл <code>storage/products/{file_name}</code> пуст.",
+                             parse_mode="HTML", reply_markup=back_button)
+            bot.answer_callback_query(c.id)
+            return
+
+        logger.info(f"Пользователь $MAGENTA@{c.from_user.username} (id: {c.from_user.id})$RESET запросил "
+                    f"файл с товарами $YELLOWstorage/products/{file_name}$RESET.")
+        # Большие файлы отправляются частями (не разрывая строки), чтобы не загружать их в память целиком.
+        parts = os.path.getsize(path) > PRODUCTS_FILE_PART_SIZE
+        for index, data in enumerate(cardinal_tools.iter_products_file(path, PRODUCTS_FILE_PART_SIZE), start=1):
+            document = io.BytesIO(data)
+            document.name = f"{os.path.splitext(file_name)[0]}_{index}.txt" if parts else file_name
+            bot.send_document(c.message.chat.id, document)
+        bot.answer_callback_query(c.id)
+
+    # Незавершенные резервы.
+    def get_reservation(c: types.CallbackQuery) -> tuple[str, str, list[str]] | None:
+        """
+        Получает незавершенный резерв из callback'а кнопки уведомления.
+        Если файла с товарами или резерва нет - отвечает на callback и убирает кнопки уведомления.
+
+        :return: (путь до файла с товарами, ID заказа, товары) или None.
+        """
+        split = c.data.split(":")
+        file_index, order_id = int(split[1]), split[2]
+        files = [i for i in os.listdir("storage/products") if i.endswith(".txt")]
+        products = None
+        if file_index < len(files):
+            path = f"storage/products/{files[file_index]}"
+            products = cardinal_tools.get_unfinished_reservations().get(files[file_index], {}).get(order_id)
+        if products is None:
+            bot.edit_message_reply_markup(c.message.chat.id, c.message.id, reply_markup=None)
+            bot.answer_callback_query(c.id, f"❌ Резерв для заказа {order_id} не найден.", show_alert=True)
+            return None
+        return path, order_id, products
+
+    def finish_reservation(c: types.CallbackQuery, text: str) -> None:
+        bot.edit_message_reply_markup(c.message.chat.id, c.message.id, reply_markup=None)
+        bot.reply_to(c.message, text, allow_sending_without_reply=True, parse_mode="HTML")
+        bot.answer_callback_query(c.id)
+
+    def rollback_reservation(c: types.CallbackQuery):
+        """
+        Возвращает товары незавершенного резерва в файл с товарами.
+        """
+        reservation = get_reservation(c)
+        if reservation is None:
+            return
+        path, order_id, products = reservation
+        cardinal_tools.rollback_reservation(path, order_id)
+        logger.info(f"Пользователь $MAGENTA@{c.from_user.username} (id: {c.from_user.id})$RESET вернул "
+                    f"$CYAN{len(products)}$RESET товар(-a, -oв) заказа $YELLOW{order_id}$RESET в файл "
+                    f"$YELLOW{path}$RESET.")
+        finish_reservation(c, f"↩️ Товар заказа <code>{utils.escape(order_id)}</code> возвращен в файл "
+                              f"<code>{utils.escape(path)}</code>.")
+
+    def commit_reservation(c: types.CallbackQuery):
+        """
+        Подтверждает выдачу товаров незавершенного резерва.
+        """
+        reservation = get_reservation(c)
+        if reservation is None:
+            return
+        path, order_id, products = reservation
+        cardinal_tools.commit_reservation(path, order_id)
+        logger.info(f"Пользователь $MAGENTA@{c.from_user.username} (id: {c.from_user.id})$RESET подтвердил "
+                    f"выдачу товара заказа $YELLOW{order_id}$RESET из файла $YELLOW{path}$RESET.")
+        finish_reservation(c, f"✅ Выдача товара заказа <code>{utils.escape(order_id)}</code> подтверждена.")
+
+    def redeliver_reservation(c: types.CallbackQuery):
+        """
+        Повторно отправляет товары незавершенного резерва покупателю заказа.
+        """
+        reservation = get_reservation(c)
+        if reservation is None:
+            return
+        path, order_id, products = reservation
+        try:
+            order = cardinal.orders_store.get_order(order_id)
+            if order is None:
+                order = next((i for i in cardinal.account.get_orders() if i.id == order_id), None)
+            if order is None:
+                bot.answer_callback_query(c.id, f"❌ Заказ {order_id} не найден.", show_alert=True)
                 return
+            node_id = cardinal.account.get_node_id_by_username(order.buyer_username, force_request=True)
+            text = "\n".join(products).replace("\\n", "\n")
+            receipt = cardinal.queue_message(FunPayAPI.types.Message(text, node_id, order.buyer_username), 3,
+                                             coalesce=False).result()
+        except:
+            logger.debug("------TRACEBACK------", exc_info=True)
+            bot.answer_callback_query(c.id, f"❌ Не удалось выдать товар заказа {order_id}. "
+                                            f"Подробнее в файле logs/log.log", show_alert=True)
+            return
 
-            logger.info(f"Пользователь $MAGENTA@{c.from_user.username} (id: {c.from_user.id})$RESET запросил "
-                        f"файл с товарами $YELLOWstorage/products/{file_name}$RESET.")
-            f.seek(0)
-            bot.send_document(c.message.chat.id, f)
-            bot.answer_callback_query(c.id)
+        if not receipt.sent:
+            bot.answer_callback_query(c.id, f"❌ Не удалось отправить товар заказа {order_id}. "
+                                            f"Подробнее в файле logs/log.log", show_alert=True)
+            return
+        cardinal_tools.commit_reservation(path, order_id)
+        logger.info(f"Пользователь $MAGENTA@{c.from_user.username} (id: {c.from_user.id})$RESET повторно выдал "
+                    f"товар заказа $YELLOW{order_id}$RESET покупателю $YELLOW{order.buyer_username}$RESET.")
+        finish_reservation(c, f"📨 Товар заказа <code>{utils.escape(order_id)}</code> повторно отправлен "
+                              f"покупателю <code>{utils.escape(order.buyer_username)}</code>.")
 
     def ask_del_products_file(c: types.CallbackQuery):
         """
@@ -755,6 +862,11 @@ $product""")
     tg.cbq_handler(add_ad_to_lot, lambda c: c.data.startswith(f"{CBT.ADD_AD_TO_LOT}:"))
     tg.cbq_handler(update_funpay_lots_list, lambda c: c.data.startswith("update_funpay_lots:"))
 
+    # Незавершенные резервы.
+    tg.cbq_handler(rollback_reservation, lambda c: c.data.startswith(f"{CBT.ROLLBACK_RESERVATION}:"))
+    tg.cbq_handler(commit_reservation, lambda c: c.data.startswith(f"{CBT.COMMIT_RESERVATION}:"))
+    tg.cbq_handler(redeliver_reservation, lambda c: c.data.startswith(f"{CBT.REDELIVER_RESERVATION}:"))
+
     # Меню управления файлов с товарами.
     tg.cbq_handler(open_products_file_action, lambda c: c.data.startswith(f"{CBT.EDIT_PRODUCTS_FILE}:"))
 
@@ -767,4 +879,37 @@ $product""")
     tg.cbq_handler(del_products_file, lambda c: c.data.startswith("confirm_del_products_file:"))
 
 
+def send_unfinished_reservations_notification(cardinal: Cardinal, *args):
+    """
+    Отправляет уведомления о незавершенных резервах товаров (например, если бот упал посреди выдачи товара), чтобы
+    продавец решил, выдан ли товар: вернуть его в файл, подтвердить выдачу или выдать товар повторно.
+    """
+    if not cardinal.telegram:
+        return
+    try:
+        reservations = cardinal_tools.get_unfinished_reservations()
+    except:
+        logger.error("Не удалось проверить журналы резервов товаров.")
+        logger.debug("------TRACEBACK------", exc_info=True)
+        return
+
+    files = [i for i in os.listdir("storage/products") if i.endswith(".txt")] if reservations else []
+    for file_name, orders in reservations.items():
+        for order_id, products in orders.items():
+            products_text = "\n".join(products)
+            if len(products_text) > 3000:  # Ограничение Telegram на длину сообщения - 4096 символов.
+                products_text = f"{products_text[:3000]}..."
+            products_text = utils.escape(products_text)
+            text = f"""⚠️ Незавершенная выдача товара для заказа <code>{utils.escape(order_id)}</code>.
+
+Неизвестно, получил ли покупатель товар из файла <code>storage/products/{utils.escape(file_name)}</code>. \
+Товар не возвращен в продажу до вашего решения.
+
+<b><i>Товар:</i></b>
+<code>{products_text}</code>"""
+            keyboard = keyboards.unfinished_reservation(files.index(file_name), order_id)
+            cardinal.telegram.send_notification(text, keyboard, utils.NotificationTypes.delivery)
+
+
 BIND_TO_PRE_INIT = [init_auto_delivery_cp]
+BIND_TO_POST_INIT = [send_unfinished_reservations_notification]
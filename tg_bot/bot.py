@@ -15,6 +15,7 @@ import psutil
 import telebot
 import logging
 import FunPayAPI.types
+from FunPayAPI import retry
 
 from telebot import types
 
@@ -24,6 +25,9 @@ from Utils import cardinal_tools
 
 logger = logging.getLogger("TGBot")
 
+# Политика повторных попыток возврата средств.
+REFUND_RETRY = retry.RetryPolicy(attempts=3, base_delay=1.0, max_delay=4.0, deadline=15.0)
+
 
 class TGBot:
     def __init__(self, cardinal: Cardinal):
@@ -448,6 +452,11 @@ class TGBot:
         run_time = current_time - self.cardinal.start_time
 
         ram = psutil.virtual_memory()
+        events = self.cardinal.dispatcher.get_metrics()
+        outbox = self.cardinal.outbox.get_metrics()
+        classes = "\n".join(f"    {i.name}:  <code>{m['queue_size']}</code> в очереди, ожидание "
+                            f"<code>{m['avg_wait']:.2f}</code> / <code>{m['max_wait']:.2f} сек.</code>"
+                            for i, m in events["classes"].items())
         cpu_usage = "\n".join(
             f"    CPU {i}:  <code>{l}%</code>" for i, l in enumerate(psutil.cpu_percent(percpu=True)))
         self.bot.send_message(msg.chat.id, f"""<b><u>Сводка данных</u></b>
@@ -462,6 +471,22 @@ class TGBot:
     Свободно:  <code>{ram.free // 1048576} MB</code>
     Используется ботом:  <code>{psutil.Process().memory_info().rss // 1048576} MB</code>
 
+<b>События:</b>
+    Потоков:  <code>{events["workers"]}</code> (занято: <code>{events["busy"]}</code>)
+    В очереди:  <code>{events["queue_size"]}/{events["queue_limit"]}</code>
+    Макс. очередь:  <code>{events["max_queue_size"]}</code>
+    Обработано:  <code>{events["processed"]}/{events["submitted"]}</code>
+    Ожидание:  <code>{events["avg_wait"]:.2f} сек.</code>
+    Обработка:  <code>{events["avg_handling"]:.2f} сек.</code>
+{classes}
+
+<b>Исходящие сообщения:</b>
+    Потоков:  <code>{outbox["workers"]}</code> (чатов: <code>{outbox["busy"]}</code>)
+    В очереди:  <code>{outbox["queue_size"]}</code>
+    Доставлено:  <code>{outbox["delivered"]}/{outbox["submitted"]}</code>
+    Не доставлено:  <code>{outbox["failed"]}</code>
+    Запросов:  <code>{outbox["requests"]}</code>
+
 <b>Бот:</b>
     Аптайм:  <code>{cardinal_tools.time_to_str(run_time)}</code>
     Чат:  <code>{msg.chat.id}</code>""", parse_mode="HTML")
@@ -471,6 +496,7 @@ class TGBot:
         Перезапускает кардинал.
         """
         self.bot.send_message(msg.chat.id, "Перезагружаюсь...")
+        self.cardinal.save_snapshot()
         cardinal_tools.restart_program()
 
     def ask_power_off(self, msg: types.Message):
@@ -505,6 +531,7 @@ class TGBot:
         if state == 6:
             self.bot.edit_message_text("Ладно, ладно, выключаюсь...", call.message.chat.id, call.message.id)
             self.bot.answer_callback_query(call.id)
+            self.cardinal.save_snapshot()
             cardinal_tools.shut_down()
             return
 
@@ -601,26 +628,24 @@ class TGBot:
         split = call.data.split(":")
         order_id, node_id, username = split[1], int(split[2]), split[3]
         new_msg = False
-        attempts = 3
-        while attempts:
-            try:
-                self.cardinal.account.refund_order(order_id)
-                break
-            except:
-                if not new_msg:
-                    new_msg = self.bot.send_message(call.message.chat.id,
-                                                    f"❌ Не удалось вернуть средства по заказу <code>#{order_id}</code>."
-                                                    f"\nОсталось попыток: <code>{attempts}</code>.",
-                                                    parse_mode="HTML")
-                else:
-                    self.bot.edit_message_text(f"❌ Не удалось вернуть средства по заказу <code>#{order_id}</code>."
-                                               f"\nОсталось попыток: <code>{attempts}</code>.",
-                                               new_msg.chat.id, new_msg.id, parse_mode="HTML")
-                attempts -= 1
-                time.sleep(1)
-                continue
 
-        if attempts:
+        def on_retry(error: Exception, attempt: int, delay: float):
+            nonlocal new_msg
+            text = f"❌ Не удалось вернуть средства по заказу <code>#{order_id}</code>." \
+                   f"\nОсталось попыток: <code>{REFUND_RETRY.attempts - attempt}</code>."
+            if not new_msg:
+                new_msg = self.bot.send_message(call.message.chat.id, text, parse_mode="HTML")
+            else:
+                self.bot.edit_message_text(text, new_msg.chat.id, new_msg.id, parse_mode="HTML")
+
+        try:
+            REFUND_RETRY.call(self.cardinal.account.refund_order, order_id, on_retry=on_retry)
+            refunded = True
+        except Exception:
+            logger.debug("------TRACEBACK------", exc_info=True)
+            refunded = False
+
+        if refunded:
             if not new_msg:
                 self.bot.send_message(call.message.chat.id,
                                       f"✅ Средства по заказу <code>#{order_id}</code> возвращены.", parse_mode="HTML")
@@ -633,8 +658,13 @@ class TGBot:
             self.bot.answer_callback_query(call.id)
             return
 
-        self.bot.edit_message_text(f"❌ Не удалось вернуть средства по заказу <code>#{order_id}</code>.",
-                                   new_msg.chat.id, new_msg.id, parse_mode="HTML")
+        if not new_msg:
+            self.bot.send_message(call.message.chat.id,
+                                  f"❌ Не удалось вернуть средства по заказу <code>#{order_id}</code>.",
+                                  parse_mode="HTML")
+        else:
+            self.bot.edit_message_text(f"❌ Не удалось вернуть средства по заказу <code>#{order_id}</code>.",
+                                       new_msg.chat.id, new_msg.id, parse_mode="HTML")
 
         keyboard = keyboards.new_order(order_id, username, node_id)
         self.bot.edit_message_reply_markup(call.message.chat.id, call.message.id, reply_markup=keyboard)
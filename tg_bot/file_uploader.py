@@ -3,15 +3,17 @@
 """
 
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Generator
 if TYPE_CHECKING:
     from cardinal import Cardinal
     from tg_bot.bot import TGBot
 
-from Utils import config_loader as cfg_loader, exceptions as excs, cardinal_tools
+from Utils import config_loader as cfg_loader, exceptions as excs, cardinal_tools, products_index
 from telebot.types import InlineKeyboardButton as Button
 from tg_bot import utils, keyboards, CBT
-from telebot import types
+from telebot import types, apihelper
+from threading import Thread
+import requests
 import logging
 import os
 
@@ -19,6 +21,10 @@ import os
 logger = logging.getLogger("TGBot")
 
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+"""Размер куска (в байтах), которыми скачиваются файлы из Telegram."""
+
+
 def check_file(tg: TGBot, msg: types.Message) -> bool:
     """
     Проверяет выгруженный файл. Чистит состояние пользователя. Отправляет сообщение в TG в зависимости от ошибки.
@@ -42,6 +48,20 @@ def check_file(tg: TGBot, msg: types.Message) -> bool:
     return True
 
 
+def iter_file_chunks(tg: TGBot, msg: types.Message) -> Generator[bytes, None, None]:
+    """
+    Скачивает выгруженный файл по кускам (не загружая его в память целиком).
+
+    :param tg: экземпляр TG бота.
+
+    :param msg: экземпляр сообщения.
+    """
+    url = tg.bot.get_file_url(msg.document.file_id)
+    with requests.get(url, stream=True, proxies=apihelper.proxy, timeout=30) as response:
+        response.raise_for_status()
+        yield from response.iter_content(DOWNLOAD_CHUNK_SIZE)
+
+
 def download_file(tg: TGBot, msg: types.Message, file_name: str = "temp_file.txt",
                   custom_path: str = "") -> bool:
     """
@@ -58,18 +78,17 @@ def download_file(tg: TGBot, msg: types.Message, file_name: str = "temp_file.txt
     :return: True, если все ок, False, при ошибке.
     """
     tg.bot.send_message(msg.chat.id, "⏬ Загружаю файл...")
+    path = f"storage/cache/{file_name}" if not custom_path else os.path.join(custom_path, file_name)
     try:
-        file_info = tg.bot.get_file(msg.document.file_id)
-        file = tg.bot.download_file(file_info.file_path)
+        with open(f"{path}.tmp", "wb") as new_file:
+            for chunk in iter_file_chunks(tg, msg):
+                new_file.write(chunk)
+        os.replace(f"{path}.tmp", path)
     except:
         tg.bot.send_message(msg.chat.id, "❌ Произошла ошибка при загрузке файла. Подробнее в файле "
                                          "<code>logs/log.log</code>.", parse_mode="HTML")
         logger.debug("------TRACEBACK------", exc_info=True)
         return False
-
-    path = f"storage/cache/{file_name}" if not custom_path else os.path.join(custom_path, file_name)
-    with open(path, "wb") as new_file:
-        new_file.write(file)
     return True
 
 
@@ -85,7 +104,7 @@ def init_uploader(cardinal: Cardinal):
 
     def upload_products_file(m: types.Message):
         """
-        Загружает файл с товарами.
+        Загружает файл с товарами (заменяет файл с таким же названием).
         """
         tg.clear_user_state(m.chat.id, m.from_user.id, True)
         if not check_file(tg, m):
@@ -94,8 +113,10 @@ def init_uploader(cardinal: Cardinal):
                              custom_path=f"storage/products"):
             return
 
+        path = f"storage/products/{m.document.file_name}"
         try:
-            products_count = cardinal_tools.count_products(f"storage/products/{utils.escape(m.document.file_name)}")
+            cardinal_tools.invalidate_products_count(path)
+            products_count = cardinal_tools.count_products(path)
         except:
             bot.send_message(m.chat.id,
                              "❌ Произошла ошибка при подсчете товаров. Подробнее в файле "
@@ -112,7 +133,64 @@ def init_uploader(cardinal: Cardinal):
                     f"загрузил в бота файл с товарами $YELLOWstorage/products/{m.document.file_name}$RESET.")
 
         bot.send_message(m.chat.id,
-                         f"✅ Файл с товарами <code>storage/products/{m.document.file_name}</code> успешно загружен. "
+                         f"✅ Файл с товарами <code>storage/products/{utils.escape(m.document.file_name)}</code> "
+                         f"успешно загружен. Товаров в файле: <code>{products_count}.</code>",
+                         parse_mode="HTML", reply_markup=keyboard)
+
+    def act_import_products_file(c: types.CallbackQuery):
+        result = bot.send_message(c.message.chat.id, "Отправьте мне файл с товарами, которые нужно добавить в файл "
+                                                     "с таким же названием.",
+                                  parse_mode="HTML", reply_markup=keyboards.CLEAR_STATE_BTN)
+        tg.set_user_state(c.message.chat.id, result.id, c.from_user.id, CBT.IMPORT_PRODUCTS_FILE)
+        bot.answer_callback_query(c.id)
+
+    def upload_products_to_import(m: types.Message):
+        """
+        Импортирует товары из файла: дописывает их в файл с товарами с таким же названием (или создает его).
+        Импорт выполняется в отдельном потоке, прогресс отображается в сообщении.
+        """
+        tg.clear_user_state(m.chat.id, m.from_user.id, True)
+        if not check_file(tg, m):
+            return
+        Thread(target=import_products_file, args=(m, ), daemon=True).start()
+
+    def import_products_file(m: types.Message):
+        file_name = m.document.file_name
+        path = f"storage/products/{file_name}"
+        progress_msg = bot.send_message(m.chat.id, "⏬ Загружаю файл...")
+
+        def show_progress(report: products_index.ImportReport):
+            try:
+                bot.edit_message_text(utils.generate_import_report_text(report), progress_msg.chat.id,
+                                      progress_msg.id, parse_mode="HTML")
+            except:
+                logger.debug("------TRACEBACK------", exc_info=True)
+
+        try:
+            report = cardinal_tools.import_products(
+                path, products_index.iter_lines(iter_file_chunks(tg, m)),
+                cardinal.MAIN_CFG["Other"].getboolean("importDeduplicate", fallback=False),
+                cardinal.MAIN_CFG["Other"].getboolean("importBloomFilter", fallback=False), show_progress)
+            products_count = cardinal_tools.count_products(path)
+        except:
+            bot.send_message(m.chat.id,
+                             "❌ Произошла ошибка при загрузке товаров. Подробнее в файле "
+                             "<code>logs/log.log</code>.", parse_mode="HTML")
+            logger.debug("------TRACEBACK------", exc_info=True)
+            return
+
+        file_number = os.listdir("storage/products").index(file_name)
+
+        keyboard = types.InlineKeyboardMarkup() \
+            .add(Button("✏️ Редактировать файл", callback_data=f"{CBT.EDIT_PRODUCTS_FILE}:{file_number}:0"))
+
+        logger.info(f"Пользователь $MAGENTA@{m.from_user.username} (id: {m.from_user.id})$RESET "
+                    f"импортировал товары в файл $YELLOWstorage/products/{file_name}$RESET: "
+                    f"добавлено $CYAN{report.added}$RESET, дубликатов $CYAN{report.duplicates}$RESET, "
+                    f"отклонено $CYAN{report.rejected}$RESET.")
+
+        bot.send_message(m.chat.id,
+                         f"✅ Товары импортированы в файл <code>storage/products/{utils.escape(file_name)}</code>. "
                          f"Товаров в файле: <code>{products_count}.</code>",
                          parse_mode="HTML", reply_markup=keyboard)
 
@@ -265,11 +343,13 @@ def init_uploader(cardinal: Cardinal):
                          parse_mode="HTML", reply_markup=keyboard)
 
     tg.cbq_handler(act_upload_products_file, lambda c: c.data == CBT.UPLOAD_PRODUCTS_FILE)
+    tg.cbq_handler(act_import_products_file, lambda c: c.data == CBT.IMPORT_PRODUCTS_FILE)
     tg.cbq_handler(act_upload_auto_response_config, lambda c: c.data == "upload_auto_response_config")
     tg.cbq_handler(act_upload_auto_delivery_config, lambda c: c.data == "upload_auto_delivery_config")
     tg.cbq_handler(act_upload_main_config, lambda c: c.data == "upload_main_config")
 
     tg.file_handler(CBT.UPLOAD_PRODUCTS_FILE, upload_products_file)
+    tg.file_handler(CBT.IMPORT_PRODUCTS_FILE, upload_products_to_import)
     tg.file_handler("upload_auto_response_config", upload_auto_response_config)
     tg.file_handler("upload_auto_delivery_config", upload_auto_delivery_config)
     tg.file_handler("upload_main_config", upload_main_config)
@@ -177,7 +177,8 @@ def ad_settings() -> types.InlineKeyboardMarkup:
         .add(Button("➕ Добавить автовыдачу лоту", callback_data=f"{CBT.FP_LOTS_LIST}:0"))\
         .add(Button("📋 Редактировать товарные файлы", callback_data=f"{CBT.PRODUCTS_FILES_LIST}:0"))\
         .row(Button("⤴️ Выгрузить товарный файл", callback_data=CBT.UPLOAD_PRODUCTS_FILE),
-             Button("➕ Новый товарный файл", callback_data=CBT.CREATE_PRODUCTS_FILE))\
+             Button("📥 Дополнить товарный файл", callback_data=CBT.IMPORT_PRODUCTS_FILE))\
+        .add(Button("➕ Новый товарный файл", callback_data=CBT.CREATE_PRODUCTS_FILE))\
         .add(Button("◀️ Назад", callback_data=CBT.MAIN))
     return keyboard
 
@@ -318,6 +319,23 @@ def products_file_edit(file_number: int, offset: int, confirmation: bool = False
     return keyboard
 
 
+def unfinished_reservation(file_number: int, order_id: str) -> types.InlineKeyboardMarkup:
+    """
+    Создает клавиатуру уведомления о незавершенном резерве товаров.
+
+    :param file_number: номер файла с товарами.
+
+    :param order_id: ID заказа.
+
+    :return: экземпляр клавиатуры.
+    """
+    keyboard = types.InlineKeyboardMarkup()\
+        .add(Button("📨 Выдать повторно", callback_data=f"{CBT.REDELIVER_RESERVATION}:{file_number}:{order_id}"))\
+        .row(Button("↩️ Вернуть в файл", callback_data=f"{CBT.ROLLBACK_RESERVATION}:{file_number}:{order_id}"),
+             Button("✅ Товар выдан", callback_data=f"{CBT.COMMIT_RESERVATION}:{file_number}:{order_id}"))
+    return keyboard
+
+
 def lots_list(cardinal: Cardinal, offset: int) -> types.InlineKeyboardMarkup:
     """
     Создает клавиатуру со списком лотов (lots:<offset>).
@@ -6,6 +6,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from FunPayAPI.account import Account
+    from Utils.products_index import ImportReport
 
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton as Button
 import configparser
@@ -188,6 +189,32 @@ def generate_profile_text(account: Account) -> str:
 <i>Обновлено:</i>  <code>{time.strftime('%H:%M:%S', time.localtime(account.last_update))}</code>"""
 
 
+def generate_import_report_text(report: ImportReport) -> str:
+    """
+    Генерирует текст отчета об импорте товаров.
+
+    :param report: отчет об импорте.
+
+    :return: сгенерированный текст отчета.
+    """
+    if report.error is not None:
+        status = "❌ Импорт товаров прерван из-за ошибки. Подробнее в файле <code>logs/log.log</code>."
+    elif report.finished:
+        status = "✅ Импорт товаров завершен."
+    else:
+        status = "⏳ Импортирую товары..."
+    finished_at = report.finished_at if report.finished_at is not None else time.time()
+    return f"""{status}
+
+<b><i>Файл:</i></b> <code>{escape(report.path)}</code>
+<b><i>Обработано строк:</i></b> <code>{report.lines}</code>
+<b><i>Добавлено:</i></b> <code>{report.added}</code>
+<b><i>Дубликатов:</i></b> <code>{report.duplicates}</code>
+<b><i>Отклонено:</i></b> <code>{report.rejected}</code>
+
+<i>Время:</i> <code>{finished_at - report.started_at:.1f} сек.</code>"""
+
+
 def generate_lot_info_text(lot_obj: configparser.SectionProxy) -> str:
     """
     Генерирует текст с информацией о лоте.